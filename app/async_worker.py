@@ -0,0 +1,116 @@
+"""在单个进程中并发执行LLM类任务的异步worker
+
+审阅和结构化提取任务绝大部分时间在等待模型的流式响应，每个任务占用一个fork出的
+RQ worker进程（加载litellm后约300MB）非常浪费。异步worker从 async- 前缀的队列中取出任务，
+在同一个进程中最多同时执行 concurrency 个：
+
+- 任务代码在线程池中运行，数据库读写保持同步的SQLAlchemy会话；
+- 所有模型调用通过 LLMClient 转交到本进程的事件循环，由 litellm.acompletion 执行，
+  网络等待在事件循环中复用，不再为每个请求阻塞一个进程。
+
+CPU密集的文档转换仍由进程型worker（worker.py）执行。
+"""
+import asyncio
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from redis import Redis
+from rq import Queue
+from rq.exceptions import DequeueTimeout
+from rq.registry import FailedJobRegistry
+
+from .llm_client import LLMClient
+from .queues import WeightedRoundRobin
+
+class AsyncTaskWorker:
+    """从RQ队列中取出任务并在事件循环的控制下并发执行"""
+
+    def __init__(
+        self,
+        queues: List[Queue],
+        connection: Redis,
+        llm_client: LLMClient,
+        concurrency: int = 32,
+        weights: Optional[Dict[str, int]] = None,
+        dequeue_timeout: int = 5
+    ):
+        """初始化
+
+        Args:
+            queues: 监听的队列，按优先级从高到低排列
+            connection: Redis连接
+            llm_client: 需要绑定到本worker事件循环的LLM调用入口
+            concurrency: 同时执行的任务数上限
+            weights: 各队列的出队权重
+            dequeue_timeout: 队列为空时每次阻塞等待的秒数
+        """
+        self.queues = {q.name: q for q in queues}
+        self.connection = connection
+        self.llm_client = llm_client
+        self.concurrency = max(1, int(concurrency))
+        self.round_robin = WeightedRoundRobin([q.name for q in queues], weights or {})
+        self.dequeue_timeout = max(1, int(dequeue_timeout))
+        self._stopping = False
+
+    def request_stop(self):
+        """停止取新任务，等待已开始的任务执行完毕后退出"""
+        logging.info("异步worker收到停止请求，等待执行中的任务完成")
+        self._stopping = True
+
+    def _dequeue(self):
+        """按加权轮询顺序从队列中取出一个任务，超时返回None"""
+        ordered = [self.queues[name] for name in self.round_robin.next_order()]
+        try:
+            return Queue.dequeue_any(ordered, self.dequeue_timeout, connection=self.connection)
+        except DequeueTimeout:
+            return None
+
+    async def _perform(self, loop, executor, job, queue, slots: asyncio.Semaphore):
+        """在线程池中执行一个任务，结束后释放并发名额"""
+        try:
+            await loop.run_in_executor(executor, job.perform)
+            await loop.run_in_executor(executor, job.delete)
+        except Exception:
+            # 任务状态已由execute_task写入数据库，这里只保留RQ的失败记录便于排查
+            logging.exception(f"异步worker执行任务 {job.id} 失败")
+            exc_string = traceback.format_exc()
+            await loop.run_in_executor(
+                executor,
+                lambda: FailedJobRegistry(queue=queue).add(job, exc_string=exc_string)
+            )
+        finally:
+            slots.release()
+
+    async def run(self):
+        """持续取出并执行任务，直到收到停止请求"""
+        loop = asyncio.get_running_loop()
+        self.llm_client.attach_loop(loop)
+        # 额外一个线程用于阻塞等待出队
+        executor = ThreadPoolExecutor(max_workers=self.concurrency + 1, thread_name_prefix="async-task")
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        logging.info(f"异步worker开始监听 {list(self.queues)}，并发上限 {self.concurrency}")
+        try:
+            while not self._stopping:
+                await slots.acquire()
+                try:
+                    dequeued = await loop.run_in_executor(executor, self._dequeue)
+                except Exception:
+                    slots.release()
+                    logging.exception("异步worker出队失败，稍后重试")
+                    await asyncio.sleep(self.dequeue_timeout)
+                    continue
+                if dequeued is None:
+                    slots.release()
+                    continue
+                job, queue = dequeued
+                task = asyncio.create_task(self._perform(loop, executor, job, queue, slots))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        finally:
+            self.llm_client.attach_loop(None)
+            executor.shutdown(wait=False)
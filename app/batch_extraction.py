@@ -0,0 +1,48 @@
+"""批量结构化数据提取
+
+结构化提取通常只需从每份审阅报告中取出评分、等级等几个字段，逐篇调用时每次都要重复发送
+相同的系统提示词。批量模式把多份报告放进同一次请求，每份报告前加上带文章ID的分隔标记，
+要求模型按相同的标记逐份返回结果，再按文章ID拆分。模型漏掉或无法拆分的条目由调用方逐篇重新提取。
+"""
+import re
+from typing import Dict, Iterable, List, Tuple
+
+BATCH_INSTRUCTIONS = """
+下面会给出多份审阅报告，每份报告以一行“<<<报告 编号>>>”开头。
+请对每一份报告分别按上述要求提取，并按以下格式依次返回所有报告的结果，不要遗漏，也不要合并：
+
+<<<结果 编号>>>
+```yaml
+（该报告的提取结果）
+```
+
+其中编号与对应报告的编号完全一致。
+"""
+
+_RESULT_RE = re.compile(r"^\s*<<<\s*结果\s*(\d+)\s*>>>\s*$", re.MULTILINE)
+
+def build_batch_extraction_messages(system_prompt: str, items: Iterable[Tuple[int, str]]) -> List[Dict]:
+    """构建批量提取的消息
+
+    Args:
+        system_prompt: 单篇提取使用的系统提示词
+        items: (文章ID, 审阅报告内容) 列表
+    """
+    reports = "\n\n".join(f"<<<报告 {item_id}>>>\n{content.strip()}" for item_id, content in items)
+    return [
+        {"role": "system", "content": system_prompt + BATCH_INSTRUCTIONS},
+        {"role": "user", "content": reports}
+    ]
+
+def split_batch_response(content: str, item_ids: Iterable[int]) -> Dict[int, str]:
+    """按结果标记拆分批量响应，只返回请求中包含且内容非空的条目"""
+    expected = set(item_ids)
+    results = {}
+    matches = list(_RESULT_RE.finditer(content or ""))
+    for i, match in enumerate(matches):
+        item_id = int(match.group(1))
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(content)
+        body = content[match.end():end].strip()
+        if item_id in expected and body and item_id not in results:
+            results[item_id] = body
+    return results
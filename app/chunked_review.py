@@ -0,0 +1,113 @@
+"""长文档的分段审阅（map-reduce）
+
+论文全文常常超过十万字，整篇放进一次请求会被截断、拒绝或非常慢。分段审阅时：
+
+1. 按Markdown标题把全文切成不超过token预算的片段；
+2. map：并发审阅各片段，得到每段的审阅笔记；
+3. reduce：把所有笔记交给模型，按项目配置的审阅提示词（评分标准和输出格式）生成最终报告。
+
+在 [tasks.process_with_llm.default_config] 中配置：
+    review_mode       single 整篇审阅；chunked 总是分段；auto 超过chunk_max_tokens时分段
+    chunk_max_tokens  每个片段的token预算
+    map_fan_out       同时审阅的片段数
+    map_max_tokens    每段审阅笔记的最大输出token数
+"""
+import re
+from typing import Dict, List, Optional
+
+from .llm_governor import estimate_text_tokens
+
+DEFAULT_MAP_PROMPT = """你正在分段审阅一篇长文档，下面是其中的第{index}部分（共{total}部分）。
+请只针对这一部分做审阅笔记，包括：
+- 本部分的主要内容（项目背景、理论、设计过程、成果、总结等）；
+- 写得好的地方；
+- 存在的问题，如缺少数据支撑、论证不充分、逻辑不清等。
+笔记要简明，不要给出总体评价或评分。
+"""
+
+DEFAULT_REDUCE_PROMPT = """以下是同一篇文档各部分的分段审阅笔记，文档全文因篇幅过长未直接提供。
+请综合所有笔记，按照要求的格式对整篇文档给出审阅结果。
+"""
+
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_FENCE_RE = re.compile(r"^(```|~~~)")
+
+def _split_sections(text: str) -> List[str]:
+    """在Markdown标题处切分，代码块中的#行不视为标题"""
+    sections = []
+    current = []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING_RE.match(line) and current:
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections
+
+def _split_oversized(section: str, max_tokens: int) -> List[str]:
+    """把超出预算的章节按段落切分，单个段落仍超出时按长度硬切"""
+    max_chars = max(1, max_tokens * 2)
+    pieces = []
+    for paragraph in re.split(r"(?<=\n\n)", section):
+        while len(paragraph) > max_chars:
+            pieces.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if paragraph:
+            pieces.append(paragraph)
+    return pieces
+
+def split_markdown(text: str, max_tokens: int) -> List[str]:
+    """按标题把Markdown切分为不超过token预算的片段
+
+    相邻的小章节会合并到同一片段中，单个章节超出预算时再按段落切分。
+    """
+    pieces = []
+    for section in _split_sections(text or ""):
+        if estimate_text_tokens(section) > max_tokens:
+            pieces.extend(_split_oversized(section, max_tokens))
+        else:
+            pieces.append(section)
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and estimate_text_tokens(current + piece) > max_tokens:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def plan_review_chunks(text: str, task_config: Dict) -> List[str]:
+    """根据任务配置决定是否分段，返回待审阅的片段，只有一个片段时按整篇审阅"""
+    mode = task_config.get("review_mode", "auto")
+    max_tokens = int(task_config.get("chunk_max_tokens", 6000))
+    if mode == "single":
+        return [text]
+    if mode == "auto" and estimate_text_tokens(text) <= max_tokens:
+        return [text]
+    return split_markdown(text, max_tokens) or [text]
+
+def build_map_messages(chunk: str, index: int, total: int, map_prompt: Optional[str] = None) -> List[Dict]:
+    """构建审阅单个片段的消息，index从1开始"""
+    prompt = (map_prompt or DEFAULT_MAP_PROMPT).format(index=index, total=total)
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": chunk}
+    ]
+
+def build_reduce_messages(system_prompt: str, notes: List[str], reduce_prompt: Optional[str] = None) -> List[Dict]:
+    """构建汇总审阅笔记的消息，沿用项目的审阅提示词以保持报告格式"""
+    sections = [
+        f"## 第{i}部分审阅笔记\n\n{note.strip()}"
+        for i, note in enumerate(notes, start=1)
+    ]
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": (reduce_prompt or DEFAULT_REDUCE_PROMPT) + "\n" + "\n\n".join(sections)}
+    ]
@@ -0,0 +1,297 @@
+"""按模型的熔断器
+
+提供方故障时，排队中的每个LLM任务仍会各自等到超时才失败，浪费worker时间，用户还要逐个手动重试。
+熔断器按模型ID统计最近一个时间窗口内的调用结果，所有worker通过Redis共享状态：
+
+- 关闭（closed）：正常调用。窗口内调用数达到 min_calls 且失败率（慢调用也计为失败）
+  达到 failure_rate_threshold 时打开；
+- 打开（open）：不再调用该模型，回退链直接换用下一个模型；整条回退链都已熔断的任务
+  放回待执行并暂缓分发；
+- 半开（half_open）：打开 open_seconds 秒后放行最多 half_open_probes 个探测请求，
+  全部成功后关闭，任一失败则重新打开。
+
+在 model_config.toml 的 [circuit_breaker] 中配置。Redis不可用时熔断器不拦截调用。
+"""
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from redis import Redis
+
+KEY_PREFIX = "tai:breaker:"
+MODELS_KEY = "tai:breaker:models"
+HELD_TASKS_KEY = "tai:breaker:held"
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+DEFAULT_SETTINGS = {
+    "enabled": True,
+    "window_seconds": 60,
+    "min_calls": 5,
+    "failure_rate_threshold": 0.5,
+    "slow_call_seconds": 120,
+    "open_seconds": 60,
+    "half_open_probes": 1,
+    "probe_timeout_seconds": 300,
+}
+
+class CircuitOpenError(Exception):
+    """模型的熔断器处于打开状态"""
+
+    def __init__(self, model_id: str, retry_after: float):
+        super().__init__(f"模型 {model_id} 已熔断，约 {int(retry_after)} 秒后重试")
+        self.model_id = model_id
+        self.retry_after = retry_after
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+class BreakerCall:
+    """一次被熔断器放行的调用，通过 call 或 watch 执行并记录结果"""
+
+    def __init__(self, breaker: "CircuitBreaker", model_id: str, probe: bool):
+        self.breaker = breaker
+        self.model_id = model_id
+        self.probe = probe
+        self.recorded = False
+
+    def call(self, func, *args, **kwargs):
+        """执行非流式调用，按耗时记录成功，抛出异常时记录失败"""
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.recorded = True
+            self.breaker.record_failure(self.model_id, e, probe=self.probe)
+            raise
+        self.recorded = True
+        self.breaker.record_success(self.model_id, time.monotonic() - started, probe=self.probe)
+        return result
+
+    def watch(self, items: Iterable) -> Iterator:
+        """逐个产出响应，收到第一个响应块时按耗时记录成功，之前抛出的异常记为失败
+
+        调用方提前关闭（如对冲请求落败被取消）时不记录结果。
+        """
+        started = time.monotonic()
+        try:
+            for item in items:
+                if not self.recorded:
+                    self.recorded = True
+                    self.breaker.record_success(self.model_id, time.monotonic() - started, probe=self.probe)
+                yield item
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            if not self.recorded:
+                self.recorded = True
+                self.breaker.record_failure(self.model_id, e, probe=self.probe)
+            raise
+
+class CircuitBreaker:
+    """保存在Redis中的按模型熔断器"""
+
+    def __init__(self, redis_conn: Redis, model_config: Dict):
+        """初始化
+
+        Args:
+            redis_conn: Redis连接
+            model_config: 完整的模型配置，读取其中的 circuit_breaker 部分
+        """
+        self.redis = redis_conn
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(model_config.get("circuit_breaker", {}))
+        self.enabled = bool(self.settings["enabled"])
+
+    def _key(self, model_id: str) -> str:
+        return f"{KEY_PREFIX}{model_id}"
+
+    def _load(self, model_id: str) -> Dict:
+        raw = self.redis.hgetall(self._key(model_id))
+        state = {_decode(k): _decode(v) for k, v in raw.items()}
+        state.setdefault("state", STATE_CLOSED)
+        for field in ("opened_at", "window_started_at", "probe_started_at"):
+            state[field] = float(state.get(field) or 0)
+        for field in ("calls", "failures", "probes", "probe_successes", "trips"):
+            state[field] = int(state.get(field) or 0)
+        return state
+
+    def _retry_after(self, state: Dict, now: float) -> Optional[float]:
+        """距离可以再次调用的秒数，可以调用时返回None"""
+        if state["state"] == STATE_OPEN:
+            remaining = state["opened_at"] + self.settings["open_seconds"] - now
+            return remaining if remaining > 0 else None
+        if state["state"] == STATE_HALF_OPEN and state["probes"] >= self.settings["half_open_probes"]:
+            remaining = state["probe_started_at"] + self.settings["probe_timeout_seconds"] - now
+            return remaining if remaining > 0 else None
+        return None
+
+    def retry_after(self, model_ids: List[str]) -> Optional[float]:
+        """模型列表中所有模型都已熔断时返回最早可以重试的秒数，任一模型可以调用时返回None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        waits = []
+        for model_id in model_ids:
+            try:
+                wait = self._retry_after(self._load(model_id), now)
+            except Exception:
+                logging.exception(f"读取模型 {model_id} 的熔断状态失败")
+                return None
+            if wait is None:
+                return None
+            waits.append(wait)
+        return max(1.0, min(waits)) if waits else None
+
+    def _admit(self, model_id: str) -> bool:
+        """放行一次调用，返回是否为半开状态的探测请求，不能调用时抛出 CircuitOpenError"""
+        key = self._key(model_id)
+        now = time.time()
+        state = self._load(model_id)
+        if state["state"] == STATE_CLOSED:
+            return False
+        wait = self._retry_after(state, now)
+        if wait is not None:
+            raise CircuitOpenError(model_id, wait)
+        if state["state"] == STATE_OPEN or state["probes"] >= self.settings["half_open_probes"]:
+            # 冷却结束进入半开，或上一批探测请求超时未返回（如worker崩溃），重新开始探测
+            self.redis.hset(key, mapping={"state": STATE_HALF_OPEN, "probes": 0, "probe_successes": 0})
+        if self.redis.hincrby(key, "probes", 1) > self.settings["half_open_probes"]:
+            self.redis.hincrby(key, "probes", -1)
+            raise CircuitOpenError(model_id, self.settings["probe_timeout_seconds"])
+        self.redis.hset(key, "probe_started_at", now)
+        logging.info(f"模型 {model_id} 的熔断器半开，发起探测请求")
+        return True
+
+    @contextmanager
+    def admit(self, model_id: str):
+        """在熔断器允许时执行一次调用，在with块内通过返回对象的 call（非流式）或 watch（流式）执行
+
+        Raises:
+            CircuitOpenError: 熔断器打开或半开状态的探测名额已满
+        """
+        if not self.enabled:
+            yield BreakerCall(self, model_id, probe=False)
+            return
+        try:
+            probe = self._admit(model_id)
+        except CircuitOpenError:
+            raise
+        except Exception:
+            logging.exception(f"检查模型 {model_id} 的熔断状态失败，直接放行")
+            probe = False
+        call = BreakerCall(self, model_id, probe)
+        try:
+            yield call
+        finally:
+            # 探测请求没有产生结果（如排队等待配额超时、被取消）时归还探测名额
+            if probe and not call.recorded:
+                self._safely(self.redis.hincrby, self._key(model_id), "probes", -1)
+
+    def _safely(self, func, *args, **kwargs):
+        """熔断器的记录失败不影响业务流程"""
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            logging.exception("更新熔断器状态失败")
+            return None
+
+    def record_success(self, model_id: str, latency_seconds: float, probe: bool = False) -> None:
+        """记录一次成功调用，耗时超过 slow_call_seconds 的计为慢调用"""
+        if not self.enabled:
+            return
+        slow_after = self.settings["slow_call_seconds"]
+        slow = bool(slow_after) and latency_seconds > slow_after
+        reason = f"响应耗时 {latency_seconds:.1f} 秒" if slow else None
+        self._safely(self._record, model_id, failed=slow, probe=probe, reason=reason)
+
+    def record_failure(self, model_id: str, error: BaseException, probe: bool = False) -> None:
+        """记录一次失败调用"""
+        if not self.enabled:
+            return
+        self._safely(self._record, model_id, failed=True, probe=probe, reason=str(error)[:500])
+
+    def _record(self, model_id: str, failed: bool, probe: bool, reason: Optional[str]) -> None:
+        key = self._key(model_id)
+        now = time.time()
+        self.redis.sadd(MODELS_KEY, model_id)
+        if probe:
+            self.redis.hincrby(key, "probes", -1)
+            if failed:
+                self._trip(model_id, now, f"探测请求失败: {reason}")
+            elif self.redis.hincrby(key, "probe_successes", 1) >= self.settings["half_open_probes"]:
+                self.redis.hset(key, mapping={
+                    "state": STATE_CLOSED, "probes": 0, "probe_successes": 0,
+                    "calls": 0, "failures": 0, "window_started_at": now
+                })
+                logging.warning(f"模型 {model_id} 的探测请求成功，熔断器关闭")
+            return
+
+        state = self._load(model_id)
+        if state["window_started_at"] + self.settings["window_seconds"] < now:
+            self.redis.hset(key, mapping={"window_started_at": now, "calls": 0, "failures": 0})
+        calls = self.redis.hincrby(key, "calls", 1)
+        failures = self.redis.hincrby(key, "failures", 1 if failed else 0)
+        if failed:
+            self.redis.hset(key, "last_error", reason or "")
+        if (
+            state["state"] == STATE_CLOSED
+            and calls >= self.settings["min_calls"]
+            and failures / calls >= self.settings["failure_rate_threshold"]
+        ):
+            self._trip(model_id, now, f"最近 {calls} 次调用中 {failures} 次失败: {reason}")
+
+    def _trip(self, model_id: str, now: float, reason: str) -> None:
+        key = self._key(model_id)
+        self.redis.hset(key, mapping={
+            "state": STATE_OPEN, "opened_at": now, "probes": 0, "probe_successes": 0,
+            "calls": 0, "failures": 0, "window_started_at": now, "last_error": reason
+        })
+        self.redis.hincrby(key, "trips", 1)
+        logging.warning(f"模型 {model_id} 熔断，{self.settings['open_seconds']} 秒后开始探测: {reason}")
+
+    def hold_task(self, task_id: int, retry_after: float) -> None:
+        """暂缓分发任务，到期后由 pop_due_tasks 取出重新调度"""
+        self._safely(self.redis.zadd, HELD_TASKS_KEY, {str(task_id): time.time() + retry_after})
+
+    def held_task_ids(self) -> set:
+        """仍在暂缓分发的任务ID"""
+        try:
+            members = self.redis.zrangebyscore(HELD_TASKS_KEY, time.time(), "+inf")
+            return {int(_decode(m)) for m in members}
+        except Exception:
+            logging.exception("读取暂缓分发的任务失败")
+            return set()
+
+    def pop_due_tasks(self) -> List[int]:
+        """取出暂缓期已结束的任务ID，多个worker同时取出时每个任务只返回一次"""
+        due = []
+        for member in self.redis.zrangebyscore(HELD_TASKS_KEY, "-inf", time.time()):
+            if self.redis.zrem(HELD_TASKS_KEY, member):
+                due.append(int(_decode(member)))
+        return due
+
+    def snapshot(self, model_ids: Iterable[str] = ()) -> List[Dict]:
+        """获取各模型的熔断状态，包括配置中的模型和调用过的模型"""
+        known = {_decode(m) for m in self.redis.smembers(MODELS_KEY)}
+        now = time.time()
+        result = []
+        for model_id in sorted(known.union(model_ids)):
+            state = self._load(model_id)
+            wait = self._retry_after(state, now)
+            result.append({
+                "model_id": model_id,
+                "state": state["state"],
+                "calls": state["calls"],
+                "failures": state["failures"],
+                "failure_rate": round(state["failures"] / state["calls"], 3) if state["calls"] else 0.0,
+                "trips": state["trips"],
+                "opened_at": state["opened_at"] or None,
+                "retry_after_seconds": round(wait, 1) if wait is not None else None,
+                "probes_in_flight": state["probes"] if state["state"] == STATE_HALF_OPEN else 0,
+                "last_error": state.get("last_error") or None,
+            })
+        return result
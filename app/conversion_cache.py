@@ -0,0 +1,117 @@
+"""按文件内容寻址的文档转换缓存
+
+每次审阅Job都会重新转换文章的活动附件，高级模式下还要上传Mistral OCR并逐张描述图片。
+文件内容没有变化时，转换结果只取决于转换类型和少数配置项，这里以
+sha256(文件) + 文件扩展名 + 转换类型 + 相关配置 为键把Markdown保存在 conversion_cache 表中，
+命中时直接复制到新的审阅报告。总大小超过上限时按最近使用时间淘汰（LRU），
+管理员可以通过 /admin/conversion-cache 接口按文件或全部失效。
+"""
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .file_converter import resolve_ocr_engines
+from .models import ConversionCacheEntry
+
+# 转换逻辑发生不兼容变化时递增，使旧的缓存全部失效
+CONVERTER_VERSION = 1
+
+# 高级转换中影响输出的配置项
+ADVANCED_CONFIG_KEYS = ("enable_image_description", "image_description_model", "max_images")
+
+# 混合转换中影响输出的配置项，OCR引擎按当前环境解析后参与计算
+HYBRID_CONFIG_KEYS = ("hybrid_min_text_chars", "ocr_lang")
+
+def file_content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def conversion_cache_config(conversion_type: str, file_ext: str, task_config: Dict) -> Dict:
+    """参与缓存键计算的转换配置"""
+    config = {"version": CONVERTER_VERSION, "conversion_type": conversion_type, "file_ext": file_ext.lower()}
+    if conversion_type == "advanced":
+        for key in ADVANCED_CONFIG_KEYS:
+            config[key] = task_config.get(key)
+    elif conversion_type == "hybrid":
+        for key in HYBRID_CONFIG_KEYS:
+            config[key] = task_config.get(key)
+        # 使用实际会采用的引擎而不是配置值，配置Mistral密钥后不再命中之前由tesseract识别的结果
+        config["ocr_engine"] = resolve_ocr_engines(task_config)[0]
+    return config
+
+def make_conversion_cache_key(file_hash: str, cache_config: Dict) -> str:
+    """根据文件哈希和转换配置生成缓存键"""
+    payload = json.dumps({"file": file_hash, "config": cache_config}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_cached_conversion(db: Session, cache_key: str) -> Optional[str]:
+    """读取缓存的Markdown并更新最近使用时间，未命中返回None"""
+    entry = db.query(ConversionCacheEntry).filter(ConversionCacheEntry.cache_key == cache_key).first()
+    if entry is None:
+        return None
+    entry.hit_count = (entry.hit_count or 0) + 1
+    entry.last_used_at = datetime.utcnow()
+    db.commit()
+    return entry.markdown
+
+def save_conversion(db: Session, cache_key: str, file_hash: str, cache_config: Dict, markdown: str, max_size_mb: float = 512) -> None:
+    """写入转换结果，超过大小上限时淘汰最久未使用的条目"""
+    if not markdown:
+        return
+    size = len(markdown.encode("utf-8"))
+    max_bytes = int(max_size_mb * 1024 * 1024)
+    if size > max_bytes:
+        return
+    entry = db.query(ConversionCacheEntry).filter(ConversionCacheEntry.cache_key == cache_key).first()
+    if entry is None:
+        entry = ConversionCacheEntry(cache_key=cache_key, hit_count=0)
+        db.add(entry)
+    entry.file_hash = file_hash
+    entry.conversion_type = cache_config.get("conversion_type", "simple")
+    entry.config = cache_config
+    entry.markdown = markdown
+    entry.size = size
+    entry.last_used_at = datetime.utcnow()
+    db.commit()
+
+    total = db.query(func.coalesce(func.sum(ConversionCacheEntry.size), 0)).scalar()
+    if total <= max_bytes:
+        return
+    rows = db.query(ConversionCacheEntry.id, ConversionCacheEntry.size).filter(
+        ConversionCacheEntry.cache_key != cache_key
+    ).order_by(ConversionCacheEntry.last_used_at).all()
+    evicted = []
+    for entry_id, entry_size in rows:
+        if total <= max_bytes:
+            break
+        evicted.append(entry_id)
+        total -= entry_size
+    if evicted:
+        db.query(ConversionCacheEntry).filter(ConversionCacheEntry.id.in_(evicted)).delete(synchronize_session=False)
+        db.commit()
+
+def invalidate_conversions(db: Session, file_hash: Optional[str] = None) -> int:
+    """删除指定文件的所有缓存条目，未指定文件时清空缓存，返回删除的条目数"""
+    query = db.query(ConversionCacheEntry)
+    if file_hash:
+        query = query.filter(ConversionCacheEntry.file_hash == file_hash)
+    deleted = query.delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def conversion_cache_stats(db: Session) -> Dict:
+    """缓存的条目数、总大小和累计命中次数"""
+    entries, total_size, hits = db.query(
+        func.count(ConversionCacheEntry.id),
+        func.coalesce(func.sum(ConversionCacheEntry.size), 0),
+        func.coalesce(func.sum(ConversionCacheEntry.hit_count), 0)
+    ).one()
+    return {"entries": entries, "total_size": total_size, "hits": hits}
@@ -0,0 +1,47 @@
+"""按用户角色加权的公平调度
+
+所有Job的待执行任务按项目所有者（Project.owner_id）分组，每个所有者的权重和
+同时执行任务数上限由其角色（UserRole）决定，在 model_config.toml 的
+[scheduler.roles.<role>] 中配置。
+
+全局执行槽位有限时，每次分发选择“占用槽位数 / 权重”最小的所有者，
+即按权重比例分配worker（加权最大最小公平），同一所有者内部按任务创建顺序执行。
+"""
+from typing import Dict, Iterable, Optional
+
+from .schemas import UserRole
+
+DEFAULT_ROLE_POLICIES = {
+    UserRole.ADMIN: {"weight": 4, "max_concurrency": 8},
+    UserRole.VIP: {"weight": 2, "max_concurrency": 4},
+    UserRole.NORMAL: {"weight": 1, "max_concurrency": 2},
+}
+
+def get_role_policy(role: Optional[UserRole], scheduler_config: Dict) -> Dict[str, int]:
+    """获取角色的调度权重和并发上限，未知角色按普通用户处理"""
+    role = role or UserRole.NORMAL
+    policy = dict(DEFAULT_ROLE_POLICIES.get(role, DEFAULT_ROLE_POLICIES[UserRole.NORMAL]))
+    policy.update(scheduler_config.get("roles", {}).get(role.value, {}))
+    return {
+        "weight": max(1, int(policy["weight"])),
+        "max_concurrency": max(1, int(policy["max_concurrency"])),
+    }
+
+class OwnerShare:
+    """一个所有者在本轮调度中的份额状态"""
+
+    def __init__(self, owner_id, weight: int, in_flight: int, first_task_id: int):
+        self.owner_id = owner_id
+        self.weight = weight
+        # 当前占用的执行槽位数，每分发一个任务加一
+        self.in_flight = in_flight
+        # 最早的待执行任务ID，份额相同时先到先得
+        self.first_task_id = first_task_id
+
+def pick_next_owner(shares: Iterable[OwnerShare]) -> Optional[OwnerShare]:
+    """选出分发下一个任务后份额最小的所有者"""
+    return min(
+        shares,
+        key=lambda s: ((s.in_flight + 1) / s.weight, s.first_task_id),
+        default=None
+    )
@@ -8,12 +8,18 @@ import pytesseract
 from pathlib import Path
 import base64
 import json
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 import time
+import random
 import signal
 from timeout_decorator import timeout, TimeoutError
 import threading
+import re
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from io import BytesIO
+from contextlib import nullcontext
+from .llm_governor import estimate_message_tokens
+from .image_description_cache import make_image_cache_keys
 
 # 全局超时处理设置
 GLOBAL_TIMEOUT = 1800  # 全局操作超时时间（秒）
@@ -66,6 +72,10 @@ try:
 except ImportError:
     IMAGE_DESCRIPTION_AVAILABLE = False
 
+# 图片描述提示词，同时参与图片描述缓存键的计算
+IMAGE_DESCRIPTION_SYSTEM_PROMPT = "你是一个图像描述助手。描述图像内容，详细且简洁。"
+IMAGE_DESCRIPTION_PROMPT = "请描述这张图片的内容，提供清晰、准确的描述。"
+
 ALLOWED_EXTENSIONS = {'.md', '.doc', '.pdf', '.txt', '.docx'}
 ALLOWED_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
 
@@ -79,13 +89,174 @@ def extract_text_from_docx(file_path: str) -> str:
     doc = Document(file_path)
     return "\n".join([paragraph.text for paragraph in doc.paragraphs])
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """从PDF文件中提取文本"""
+# 页数达到该值时按页并行提取PDF文本，页数较少时进程池的启动开销大于收益
+PDF_PARALLEL_MIN_PAGES = 50
+
+def _extract_pdf_page_range(file_path: str, start: int, end: int) -> List[str]:
+    """在子进程中提取 [start, end) 页的文本，每个进程各自打开PDF"""
     reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+def iter_pdf_page_texts(file_path: str, config: Optional[Dict] = None) -> Iterator[str]:
+    """按页码顺序逐页产出PDF文本
+
+    页数达到 pdf_parallel_min_pages 时把页码范围分给进程池并行提取，结果仍按页码顺序产出，
+    前面的页提取完即可开始消费；进程池不可用时从尚未产出的页开始改为串行提取。
+
+    Args:
+        file_path: PDF文件路径
+        config: 可选配置，pdf_parallel_min_pages 为并行的最小页数，pdf_workers 为进程数（默认CPU核数）
+    """
+    config = config or {}
+    reader = PdfReader(file_path)
+    total = len(reader.pages)
+    min_pages = config.get("pdf_parallel_min_pages", PDF_PARALLEL_MIN_PAGES)
+    workers = min(int(config.get("pdf_workers") or os.cpu_count() or 1), total)
+    next_page = 0
+    if workers > 1 and min_pages and total >= min_pages:
+        # 每个进程分到多段范围，避免某段恰好都是复杂页面时拖慢整体
+        chunk_size = max(1, -(-total // (workers * 4)))
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [
+                    executor.submit(_extract_pdf_page_range, file_path, start, min(start + chunk_size, total))
+                    for start in range(0, total, chunk_size)
+                ]
+                for future in futures:
+                    for text in future.result():
+                        next_page += 1
+                        yield text
+            return
+        except Exception as e:
+            print(f"并行提取PDF文本失败: {str(e)}，从第 {next_page + 1} 页起改为串行提取")
+    for i in range(next_page, total):
+        yield reader.pages[i].extract_text()
+
+def extract_text_from_pdf(file_path: str, config: Optional[Dict] = None) -> str:
+    """从PDF文件中提取文本，页数较多时按页并行提取"""
+    return "".join(f"{text}\n" for text in iter_pdf_page_texts(file_path, config))
+
+# 混合转换：文本层非空白字符数达到该值的页直接使用文本层，否则视为扫描页进行OCR
+HYBRID_MIN_TEXT_CHARS = 50
+
+_MARKDOWN_IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+
+def classify_pdf_pages(page_texts: List[str], min_text_chars: int = HYBRID_MIN_TEXT_CHARS) -> List[int]:
+    """返回文本层过于稀疏、需要OCR的页码（从0开始）"""
+    return [
+        i for i, text in enumerate(page_texts)
+        if len("".join((text or "").split())) < min_text_chars
+    ]
+
+def _ocr_pages_with_tesseract(file_path: str, page_indexes: List[int], lang: Optional[str] = None) -> Dict[int, str]:
+    """用本地tesseract识别扫描页中嵌入的图片
+
+    扫描件的每页通常只有一张整页图片，直接识别嵌入图片即可，无需把页面渲染为图片。
+    """
+    reader = PdfReader(file_path)
+    results = {}
+    for index in page_indexes:
+        texts = []
+        for page_image in reader.pages[index].images:
+            with Image.open(BytesIO(page_image.data)) as image:
+                if lang:
+                    texts.append(pytesseract.image_to_string(image, lang=lang))
+                else:
+                    texts.append(pytesseract.image_to_string(image))
+        results[index] = "\n".join(text.strip() for text in texts if text.strip())
+    return results
+
+def _ocr_pages_with_mistral(file_path: str, page_indexes: List[int], api_key: str) -> Dict[int, str]:
+    """只把扫描页组成新的PDF上传到Mistral OCR，按页返回Markdown"""
+    if not MISTRAL_AVAILABLE:
+        raise ImportError("Mistral OCR需要安装mistralai包: pip install mistralai")
+    from pypdf import PdfWriter
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for index in page_indexes:
+        writer.add_page(reader.pages[index])
+    buffer = BytesIO()
+    writer.write(buffer)
+
+    client = Mistral(api_key=api_key)
+    def process_pdf():
+        uploaded_file = client.files.upload(
+            file={"file_name": f"{Path(file_path).stem}_scanned", "content": buffer.getvalue()},
+            purpose="ocr",
+        )
+        signed_url = client.files.get_signed_url(file_id=uploaded_file.id, expiry=1)
+        return client.ocr.process(
+            document=DocumentURLChunk(document_url=signed_url.url),
+            model="mistral-ocr-latest",
+            include_image_base64=False
+        )
+    response = with_timeout(GLOBAL_TIMEOUT, process_pdf)
+    # 未返回图片数据，去掉OCR结果中指向页面图片的引用
+    return {
+        index: _MARKDOWN_IMAGE_RE.sub("", page.markdown).strip()
+        for index, page in zip(page_indexes, response.pages)
+    }
+
+def resolve_ocr_engines(config: Optional[Dict] = None) -> List[str]:
+    """按配置和当前环境确定扫描页依次尝试的OCR引擎
+
+    auto 在有Mistral API密钥且安装了mistralai时先用Mistral，失败后改用tesseract；
+    指定 mistral 但不可用时同样改用tesseract。
+    """
+    config = config or {}
+    engine = config.get("hybrid_ocr_engine", "auto")
+    api_key = os.environ.get("MISTRAL_API_KEY") or config.get("mistral_api_key")
+    engines = []
+    if engine in ("auto", "mistral") and api_key and MISTRAL_AVAILABLE:
+        engines.append("mistral")
+    if engine in ("auto", "tesseract") or not engines:
+        engines.append("tesseract")
+    return engines
+
+def convert_pdf_hybrid(file_path: str, config: Optional[Dict] = None) -> str:
+    """逐页混合转换PDF：有文本层的页本地提取，只有扫描页进行OCR，按页码顺序合并
+
+    Args:
+        file_path: PDF文件路径
+        config: 可选配置
+            hybrid_min_text_chars: 文本层非空白字符数低于该值的页视为扫描页
+            hybrid_ocr_engine: auto（有Mistral API密钥时使用Mistral OCR，否则使用tesseract）、mistral 或 tesseract
+            ocr_lang: tesseract的识别语言，如 chi_sim+eng，默认使用tesseract的默认语言
+            mistral_api_key: 未设置环境变量 MISTRAL_API_KEY 时使用的密钥
+            logger: 日志函数
+
+    实际使用的OCR引擎记录在 config["ocr_engine"] 中；OCR全部失败时扫描页保留空文本，
+    并通过 config["ocr_error"] 告知调用方。
+    """
+    config = config if config is not None else {}
+    log = config.get("logger") or print
+    page_texts = list(iter_pdf_page_texts(file_path, config))
+    scanned = classify_pdf_pages(page_texts, config.get("hybrid_min_text_chars", HYBRID_MIN_TEXT_CHARS))
+    log(f"共 {len(page_texts)} 页，{len(page_texts) - len(scanned)} 页使用文本层，{len(scanned)} 页需要OCR")
+
+    if scanned:
+        ocr_texts = None
+        errors = []
+        for name in resolve_ocr_engines(config):
+            try:
+                log(f"使用 {name} 识别第 {', '.join(str(i + 1) for i in scanned)} 页")
+                if name == "mistral":
+                    api_key = os.environ.get("MISTRAL_API_KEY") or config.get("mistral_api_key")
+                    ocr_texts = _ocr_pages_with_mistral(file_path, scanned, api_key)
+                else:
+                    ocr_texts = _ocr_pages_with_tesseract(file_path, scanned, config.get("ocr_lang") or None)
+                config["ocr_engine"] = name
+                break
+            except Exception as e:
+                errors.append(f"{name}: {str(e)}")
+                log(f"{name} OCR失败: {str(e)}")
+        if ocr_texts is None:
+            config["ocr_error"] = "；".join(errors)
+        else:
+            for index, text in ocr_texts.items():
+                page_texts[index] = text
+
+    return "".join(f"{text}\n" for text in page_texts)
 
 def extract_text_from_image(file_path: str) -> str:
     """从图片中提取文本"""
@@ -101,7 +272,7 @@ def convert_file_to_markdown(file_path: str, conversion_type: str = "simple", co
     
     Args:
         file_path: 要转换的文件路径
-        conversion_type: 转换类型，可选 "simple" 或 "advanced"
+        conversion_type: 转换类型，可选 "simple"、"advanced" 或 "hybrid"（逐页混合，只对扫描页OCR）
         config: 高级转换的配置参数
         
     Returns:
@@ -113,9 +284,15 @@ def convert_file_to_markdown(file_path: str, conversion_type: str = "simple", co
             return converter.convert_pdf(file_path)
         except Exception as e:
             print(f"高级转换失败: {str(e)}，回退到简单转换")
+            # 通过配置告知调用方发生了回退
+            if config is not None:
+                config["advanced_conversion_error"] = str(e)
             # 如果高级转换失败，回退到简单转换
             conversion_type = "simple"
     
+    if conversion_type == "hybrid" and file_path.lower().endswith('.pdf'):
+        return convert_pdf_hybrid(file_path, config)
+    
     # 简单转换
     if not is_allowed_file(file_path):
         raise ValueError(f"Unsupported file type: {file_path}")
@@ -129,7 +306,7 @@ def convert_file_to_markdown(file_path: str, conversion_type: str = "simple", co
     elif file_ext == '.docx':
         return extract_text_from_docx(file_path)
     elif file_ext == '.pdf':
-        return extract_text_from_pdf(file_path)
+        return extract_text_from_pdf(file_path, config)
     elif file_ext in ALLOWED_IMAGE_EXTENSIONS:
         image_text = extract_text_from_image(file_path)
         if image_text:
@@ -155,8 +332,20 @@ class AdvancedMarkdownConverter:
         self.image_model = self.config.get("image_description_model", "lm_studio/qwen2.5-vl-7b-instruct")
         self.enable_image_description = self.config.get("enable_image_description", True)
         self.max_images = self.config.get("max_images", 20)  # 添加图片数量上限，默认为20
+        # 同时描述的图片数、每张图片的尝试次数和重试退避时间（指数增长并加随机抖动）
+        self.image_concurrency = max(1, int(self.config.get("image_description_concurrency", 4)))
+        self.image_max_retries = max(1, int(self.config.get("image_description_max_retries", 3)))
+        self.image_retry_base_seconds = self.config.get("image_description_retry_base_seconds", 2)
+        self.image_retry_max_seconds = self.config.get("image_description_retry_max_seconds", 30)
+        # 按图片内容缓存描述（LLMResponseCache），未提供时不缓存；启用感知哈希后相似的图片也会命中
+        self.image_cache = self.config.get("image_description_cache")
+        self.image_cache_perceptual = self.config.get("image_description_cache_perceptual", False)
         # 添加日志记录功能
         self.logger = self.config.get("logger", lambda msg: print(msg))
+        # 模型速率和并发配额，未提供时不限制
+        self.llm_governor = self.config.get("llm_governor")
+        # 调用图片描述模型的入口，未提供时直接调用 litellm.completion
+        self.llm_client = self.config.get("llm_client")
         # 添加临时文件目录列表
         self.temp_dirs = []
         
@@ -262,73 +451,87 @@ class AdvancedMarkdownConverter:
         
         return complete_md_path, all_images
     
-    def _generate_single_image_description(self, img_path: str, model_params: Dict) -> str:
+    def _image_completion(self, **kwargs):
+        """调用图片描述模型"""
+        if self.llm_client is not None:
+            return self.llm_client.completion(**kwargs)
+        return completion(**kwargs)
+
+    def _generate_single_image_description(self, img_path: str, model_params: Dict, log=None) -> str:
         """生成单张图片的描述
         
         Args:
             img_path: 图片路径
             model_params: 模型参数
+            log: 日志函数，默认为转换器的日志函数
             
         Returns:
             图片描述文本
         """
+        log = log or self.logger
         # 使用自定义超时处理代替装饰器，更加可靠
         with open(img_path, "rb") as img_file:
             base64_image = base64.b64encode(img_file.read()).decode("utf-8")
         
-        # 根据平台选择不同的超时处理方式
-        if IS_MACOS:
-            # macOS可能不支持信号处理或在某些环境中有限制，使用线程超时
-            try:
-                def make_api_call():
-                    response = completion(
-                        model=self.image_model,
-                        messages=[
-                            {"role": "system", "content": "你是一个图像描述助手。描述图像内容，详细且简洁。"},
-                            {"role": "user", "content": [
-                                {"type": "text", "text": "请描述这张图片的内容，提供清晰、准确的描述。"},
-                                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                            ]}
-                        ],
-                        **model_params
-                    )
-                    return response.choices[0].message.content
-                
-                return with_timeout(30, make_api_call)
-            except Exception as e:
-                raise Exception(f"图片描述API调用失败: {str(e)}")
+        messages = [
+            {"role": "system", "content": IMAGE_DESCRIPTION_SYSTEM_PROMPT},
+            {"role": "user", "content": [
+                {"type": "text", "text": IMAGE_DESCRIPTION_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
+            ]}
+        ]
+        
+        # 在模型配额内调用，排队等待时间不计入30秒的调用超时
+        if self.llm_governor is not None:
+            governed_call = self.llm_governor.acquire(self.image_model, estimate_message_tokens(messages, model_params.get("max_tokens", 0)))
         else:
-            # 在支持信号的平台上使用SIGALRM
-            original_handler = signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(30)  # 设置30秒超时
+            governed_call = nullcontext(None)
+        
+        with governed_call as permit:
+            if permit is not None and permit.wait_seconds >= 0.01:
+                log(f"图片描述模型配额排队等待 {permit.wait_seconds:.2f} 秒")
             
-            try:
-                response = completion(
-                    model=self.image_model,
-                    messages=[
-                        {"role": "system", "content": "你是一个图像描述助手。描述图像内容，详细且简洁。"},
-                        {"role": "user", "content": [
-                            {"type": "text", "text": "请描述这张图片的内容，提供清晰、准确的描述。"},
-                            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}"}}
-                        ]}
-                    ],
-                    **model_params
-                )
-                
-                # 成功后取消超时
-                signal.alarm(0)
-                signal.signal(signal.SIGALRM, original_handler)
+            # 根据平台选择不同的超时处理方式，信号只能在主线程中设置，并发描述时同样使用线程超时
+            if IS_MACOS or threading.current_thread() is not threading.main_thread():
+                # macOS可能不支持信号处理或在某些环境中有限制，使用线程超时
+                try:
+                    def make_api_call():
+                        response = self._image_completion(
+                            model=self.image_model,
+                            messages=messages,
+                            **model_params
+                        )
+                        return response.choices[0].message.content
+                    
+                    return with_timeout(30, make_api_call)
+                except Exception as e:
+                    raise Exception(f"图片描述API调用失败: {str(e)}")
+            else:
+                # 在支持信号的平台上使用SIGALRM
+                original_handler = signal.signal(signal.SIGALRM, timeout_handler)
+                signal.alarm(30)  # 设置30秒超时
                 
-                return response.choices[0].message.content
-            except Exception as e:
-                # 确保取消超时设置
                 try:
+                    response = self._image_completion(
+                        model=self.image_model,
+                        messages=messages,
+                        **model_params
+                    )
+                    
+                    # 成功后取消超时
                     signal.alarm(0)
                     signal.signal(signal.SIGALRM, original_handler)
-                except:
-                    pass
-                # 显式抛出异常以便被外层捕获
-                raise Exception(f"图片描述API调用失败: {str(e)}")
+                    
+                    return response.choices[0].message.content
+                except Exception as e:
+                    # 确保取消超时设置
+                    try:
+                        signal.alarm(0)
+                        signal.signal(signal.SIGALRM, original_handler)
+                    except:
+                        pass
+                    # 显式抛出异常以便被外层捕获
+                    raise Exception(f"图片描述API调用失败: {str(e)}")
 
     def generate_image_descriptions(self, images: Dict[str, Dict]) -> Dict[str, str]:
         """生成图片描述
@@ -363,55 +566,115 @@ class AdvancedMarkdownConverter:
         if self.image_model.startswith("lm_studio"):
             model_params["base_url"] = "http://127.0.0.1:1234/v1"
         
-        for idx, (img_id, img_info) in enumerate(filtered_images.items(), 1):
-            # 重试机制
-            max_retries = 3
-            retry_delay = 5
-            last_error = None
-            
-            self.logger(f"正在处理第 {idx}/{min(total_images, self.max_images)} 张图片 (ID: {img_id})")
-            img_path = img_info["path"]
-            
-            # 设置单个图片处理的安全超时，确保即使内部处理函数失败也能继续
-            overall_timeout = threading.Timer(60, lambda: self.logger(f"警告：图片 {img_id} 处理超时60秒，强制跳过"))
-            overall_timeout.start()
-            
+        # 调用模型前先查描述缓存，同一文档中内容相同的图片也只描述一次
+        pending = {}
+        duplicates = {}
+        cache_keys = {}
+        first_by_content = {}
+        cache_hits = 0
+        for img_id, img_info in filtered_images.items():
+            cache_keys[img_id] = self._image_cache_keys(img_info["path"])
+            cached = self._get_cached_description(cache_keys[img_id])
+            if cached is not None:
+                descriptions[img_id] = cached
+                cache_hits += 1
+                continue
+            content_key = cache_keys[img_id][0] if cache_keys[img_id] else None
+            if content_key in first_by_content:
+                duplicates[img_id] = first_by_content[content_key]
+                continue
+            if content_key:
+                first_by_content[content_key] = img_id
+            pending[img_id] = img_info
+        if filtered_images:
+            self.logger(
+                f"图片描述缓存命中 {cache_hits}/{len(filtered_images)} 张 ({cache_hits / len(filtered_images):.0%})"
+                + (f"，文档内重复图片 {len(duplicates)} 张" if duplicates else "")
+            )
+        
+        # 多张图片并发描述，每张图片的日志在其完成后集中输出，避免多个线程同时写任务日志
+        total = len(pending)
+        if pending:
+            workers = min(self.image_concurrency, total)
+            self.logger(f"使用模型 {self.image_model} 生成图片描述，并发数: {workers}")
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-description")
             try:
-                for retry in range(max_retries):
+                futures = {
+                    executor.submit(self._describe_image_with_retries, img_id, img_info["path"], model_params): img_id
+                    for img_id, img_info in pending.items()
+                }
+                for done, future in enumerate(as_completed(futures), 1):
+                    img_id = futures[future]
                     try:
-                        self.logger(f"使用模型 {self.image_model} 生成图片描述 (尝试 {retry + 1}/{max_retries})")
-                        desc_text = self._generate_single_image_description(img_path, model_params)
-                        descriptions[img_id] = desc_text
-                        self.logger(f"图片 {img_id} 描述生成完成")
-                        # 成功生成描述，跳出重试循环
-                        break
-                    except TimeoutError:
-                        last_error = "请求超时"
-                        self.logger(f"图片 {img_id} 描述生成超时，{retry_delay}秒后重试")
-                        if retry < max_retries - 1:
-                            time.sleep(retry_delay)
+                        descriptions[img_id], log_lines, succeeded = future.result()
                     except Exception as e:
-                        last_error = str(e)
-                        self.logger(f"图片 {img_id} 描述生成失败: {last_error}，{retry_delay}秒后重试")
-                        if retry < max_retries - 1:
-                            time.sleep(retry_delay)
-                
-                # 如果所有重试都失败，记录最终错误并继续下一张图片
-                if img_id not in descriptions:
-                    error_msg = f"在{max_retries}次尝试后仍然失败：{last_error}"
-                    descriptions[img_id] = f"[图片描述失败: {error_msg}]"
-                    self.logger(f"图片 {img_id} 描述生成最终失败: {error_msg}")
-            except Exception as e:
-                self.logger(f"图片 {img_id} 处理过程中发生严重错误: {str(e)}，跳过此图片")
-                descriptions[img_id] = f"[图片处理错误: {str(e)}]"
+                        descriptions[img_id], log_lines, succeeded = f"[图片处理错误: {str(e)}]", [f"图片 {img_id} 处理过程中发生严重错误: {str(e)}，跳过此图片"], False
+                    for line in log_lines:
+                        self.logger(line)
+                    if succeeded and self.image_cache is not None:
+                        for key in cache_keys[img_id]:
+                            self.image_cache.put(key, self.image_model, descriptions[img_id])
+                    self.logger(f"已完成 {done}/{total} 张图片 (ID: {img_id})")
             finally:
-                # 取消超时定时器，确保不会触发
-                if overall_timeout.is_alive():
-                    overall_timeout.cancel()
+                executor.shutdown(wait=True)
+        for img_id, first_id in duplicates.items():
+            descriptions[img_id] = descriptions[first_id]
         
+        # 按图片在文档中的原始顺序返回，与完成顺序无关
+        descriptions = {img_id: descriptions[img_id] for img_id in images}
         self.logger(f"所有 {total_images} 张图片描述处理完成")
         return descriptions
     
+    def _image_cache_keys(self, img_path: str) -> List[str]:
+        """图片描述的缓存键，第一个为内容哈希键，图片无法读取时返回空列表"""
+        try:
+            with open(img_path, "rb") as img_file:
+                data = img_file.read()
+        except OSError:
+            return []
+        prompt = f"{IMAGE_DESCRIPTION_SYSTEM_PROMPT}\n{IMAGE_DESCRIPTION_PROMPT}"
+        return make_image_cache_keys(data, self.image_model, prompt, perceptual=self.image_cache_perceptual)
+
+    def _get_cached_description(self, cache_keys: List[str]) -> Optional[str]:
+        """按内容哈希、感知哈希的顺序查找缓存的描述"""
+        if self.image_cache is None:
+            return None
+        for key in cache_keys:
+            cached = self.image_cache.get(key)
+            if cached is not None:
+                return cached
+        return None
+
+    def _retry_delay(self, attempt: int) -> float:
+        """第attempt次失败后的等待秒数：指数退避加随机抖动，多张图片同时失败时错开重试"""
+        delay = min(self.image_retry_base_seconds * (2 ** attempt), self.image_retry_max_seconds)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _describe_image_with_retries(self, img_id: str, img_path: str, model_params: Dict) -> Tuple[str, List[str], bool]:
+        """在线程中描述单张图片，失败时按退避时间重试
+
+        Returns:
+            (描述文本, 日志列表, 是否成功)，所有尝试都失败时描述为失败说明
+        """
+        log_lines = []
+        last_error = None
+        for retry in range(self.image_max_retries):
+            try:
+                desc_text = self._generate_single_image_description(img_path, model_params, log=log_lines.append)
+                log_lines.append(f"图片 {img_id} 描述生成完成 (尝试 {retry + 1}/{self.image_max_retries})")
+                return desc_text, log_lines, True
+            except TimeoutError:
+                last_error = "请求超时"
+            except Exception as e:
+                last_error = str(e)
+            if retry < self.image_max_retries - 1:
+                delay = self._retry_delay(retry)
+                log_lines.append(f"图片 {img_id} 描述生成失败: {last_error}，{delay:.1f}秒后重试")
+                time.sleep(delay)
+        error_msg = f"在{self.image_max_retries}次尝试后仍然失败：{last_error}"
+        log_lines.append(f"图片 {img_id} 描述生成最终失败: {error_msg}")
+        return f"[图片描述失败: {error_msg}]", log_lines, False
+
     def create_image_description_markdown(self, descriptions: Dict[str, str], output_dir: str) -> str:
         """创建图片描述Markdown文件
         
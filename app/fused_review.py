@@ -0,0 +1,32 @@
+"""审阅与结构化提取融合模式
+
+自动批阅的每篇文章都要先后调用两次模型：审阅，再从审阅报告中提取结构化数据，
+第二次调用只是重新读一遍第一次的输出。融合模式在审阅提示词后追加要求，让模型在报告末尾
+按项目的提取格式输出一段YAML，审阅完成后直接解析写入结构化数据；解析失败时仍由
+后续的结构化提取任务处理。
+
+字段的优先级与单独的提取任务一致：结构化提取配置中启用 rule_extraction_enabled 时，
+规则从报告正文中确定的字段优先，其余字段取自报告末尾的YAML；关闭规则提取时完全采用YAML。
+
+在 [tasks.process_with_llm.default_config] 中以 fused_extraction = true 开启。
+"""
+from typing import Optional, Tuple
+
+FUSED_MARKER = "===结构化数据==="
+
+FUSED_INSTRUCTIONS = """
+
+完成上述审阅报告后，另起一行单独输出标记 {marker}，然后按以下要求输出结构化数据，标记之后不要再输出其他内容：
+
+{extraction_prompt}"""
+
+def build_fused_prompt(system_prompt: str, extraction_prompt: str) -> str:
+    """在审阅提示词后追加输出结构化数据的要求"""
+    return system_prompt + FUSED_INSTRUCTIONS.format(marker=FUSED_MARKER, extraction_prompt=extraction_prompt.strip())
+
+def split_fused_output(content: str) -> Tuple[str, Optional[str]]:
+    """把模型输出拆分为审阅报告和结构化数据部分，没有标记时结构化数据为None"""
+    review, marker, trailer = (content or "").rpartition(FUSED_MARKER)
+    if not marker:
+        return content, None
+    return review.rstrip(), trailer.strip() or None
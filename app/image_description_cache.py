@@ -0,0 +1,49 @@
+"""图片描述缓存的键
+
+同一批论文中校徽、声明页印章、模板页眉和标准电路符号等图片反复出现，每次都调用视觉模型描述是浪费。
+图片描述保存在 LLMResponseCache 中，键由图片内容和模型ID决定：
+
+- 内容哈希：图片字节的SHA-256，只有完全相同的图片才会命中；
+- 感知哈希（可选）：缩小为9x8灰度图后比较相邻像素得到的64位差异哈希（dHash），
+  重新压缩或轻微缩放后的同一张图片也能命中，但可能把极为相似的不同图片视为同一张。
+
+在 model_config.toml 的 [image_description_cache] 中配置。
+"""
+import hashlib
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image
+
+from .llm_cache import make_cache_key
+
+def image_content_hash(data: bytes) -> str:
+    """图片字节的SHA-256"""
+    return hashlib.sha256(data).hexdigest()
+
+def image_perceptual_hash(data: bytes) -> Optional[str]:
+    """计算图片的差异哈希（16位十六进制），无法解码时返回None"""
+    try:
+        with Image.open(BytesIO(data)) as image:
+            pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return f"{bits:016x}"
+
+def make_image_cache_keys(data: bytes, model: str, prompt: str, perceptual: bool = False) -> List[str]:
+    """生成图片描述的缓存键，依次为内容哈希键和（启用时）感知哈希键
+
+    提示词参与计算，修改描述提示词后旧的缓存不会再被使用。
+    """
+    hashes = [f"sha256:{image_content_hash(data)}"]
+    if perceptual:
+        dhash = image_perceptual_hash(data)
+        if dhash:
+            hashes.append(f"dhash:{dhash}")
+    return [make_cache_key(model, [{"role": "user", "content": prompt, "image": image_hash}]) for image_hash in hashes]
@@ -0,0 +1,74 @@
+"""任务租约与心跳
+
+调度器认领任务时为其设置租约，worker执行期间由心跳线程定期续约。
+worker崩溃（如处理大PDF时OOM、容器重启）后租约不再续约，
+回收器（reaper）发现租约过期的任务后按任务类型的策略重新排队或标记失败。
+
+策略在 model_config.toml 的 [scheduler.leases] 中配置：
+    lease_seconds          执行中任务的租约时长，心跳每隔三分之一租约续约一次
+    claim_timeout_seconds  已分发但尚未被worker开始执行的最长时间
+    [scheduler.leases.<task_type>]
+        on_expire     租约过期后的处理方式：requeue 重新排队，fail 标记失败
+        max_attempts  最多执行次数，达到后即使策略为requeue也标记失败
+"""
+import logging
+import threading
+from typing import Callable, Dict
+
+from .schemas import JobTaskType
+
+LEASE_REQUEUE = "requeue"
+LEASE_FAIL = "fail"
+
+DEFAULT_LEASE_POLICIES = {
+    # 上传处理会创建文档记录，重复执行会产生重复文档
+    JobTaskType.PROCESS_UPLOAD: {"on_expire": LEASE_FAIL, "max_attempts": 1},
+    JobTaskType.CONVERT_TO_MARKDOWN: {"on_expire": LEASE_REQUEUE, "max_attempts": 3},
+    JobTaskType.PROCESS_WITH_LLM: {"on_expire": LEASE_REQUEUE, "max_attempts": 2},
+    JobTaskType.EXTRACT_STRUCTURED_DATA: {"on_expire": LEASE_REQUEUE, "max_attempts": 3},
+}
+
+def get_lease_policy(task_type: str, scheduler_config: Dict) -> Dict:
+    """获取任务类型的租约策略"""
+    lease_config = scheduler_config.get("leases", {})
+    policy = {
+        "lease_seconds": lease_config.get("lease_seconds", 120),
+        "claim_timeout_seconds": lease_config.get("claim_timeout_seconds", 1800),
+        "on_expire": LEASE_REQUEUE,
+        "max_attempts": 3,
+    }
+    policy.update(DEFAULT_LEASE_POLICIES.get(task_type, {}))
+    task_policy = lease_config.get(getattr(task_type, "value", task_type), {})
+    if isinstance(task_policy, dict):
+        policy.update(task_policy)
+    if policy["on_expire"] not in [LEASE_REQUEUE, LEASE_FAIL]:
+        policy["on_expire"] = LEASE_FAIL
+    return policy
+
+class TaskHeartbeat:
+    """在后台线程中定期调用续约函数，续约函数返回False时停止"""
+
+    def __init__(self, renew: Callable[[], bool], interval_seconds: float):
+        self.renew = renew
+        self.interval_seconds = max(0.1, interval_seconds)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="task-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            try:
+                if not self.renew():
+                    logging.warning("任务租约已失效，停止心跳")
+                    return
+            except Exception as e:
+                # 续约失败不影响任务本身，下一个周期重试
+                logging.warning(f"任务心跳续约失败: {str(e)}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+        return False
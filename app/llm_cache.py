@@ -0,0 +1,131 @@
+"""按内容寻址的LLM响应缓存
+
+以模型、消息内容、temperature、max_tokens以及影响输出的任务选项的哈希为键缓存模型的完整输出，
+同一篇未修改的文章重新审阅、重试失败任务或在不同项目中审阅相同文件时直接复用结果。
+
+缓存保存在本地SQLite文件中，总大小超过上限时按最近使用时间淘汰（LRU）。
+在 model_config.toml 的 [llm_cache] 中启用，默认关闭；任务配置中的
+use_response_cache = false 可以为单个任务类型或项目关闭缓存。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+)
+"""
+
+def make_cache_key(model: str, messages: List[Dict], temperature=None, max_tokens=None, options: Optional[Dict] = None) -> str:
+    """根据调用参数生成缓存键
+
+    options为最终消息之外仍会改变输出的任务选项（如分段审阅的配置），未提供时不参与计算，已有的键保持不变。
+    """
+    params = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+    if options is not None:
+        params["options"] = options
+    payload = json.dumps(
+        params,
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """保存在SQLite中的LRU响应缓存"""
+
+    def __init__(self, path: str, max_size_mb: float = 256, enabled: bool = True):
+        """初始化
+
+        Args:
+            path: 缓存数据库文件路径
+            max_size_mb: 缓存内容的总大小上限（MB）
+            enabled: 是否启用，关闭时读写均不做任何操作
+        """
+        self.path = path
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @classmethod
+    def from_config(cls, cache_config: Dict) -> "LLMResponseCache":
+        """根据 [llm_cache] 配置创建缓存"""
+        return cls(
+            cache_config.get("path", "data/llm_cache.db"),
+            max_size_mb=cache_config.get("max_size_mb", 256),
+            enabled=cache_config.get("enabled", False)
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used_at)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def get(self, cache_key: str) -> Optional[str]:
+        """读取缓存的响应并更新最近使用时间，未命中返回None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conn = self._connect()
+            try:
+                row = conn.execute(
+                    "SELECT response FROM llm_responses WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute(
+                    "UPDATE llm_responses SET last_used_at = ? WHERE cache_key = ?", (time.time(), cache_key)
+                )
+                conn.commit()
+                return row[0]
+            finally:
+                conn.close()
+
+    def put(self, cache_key: str, model: str, response: str) -> None:
+        """写入响应，超过大小上限时淘汰最久未使用的条目"""
+        if not self.enabled or not response:
+            return
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (cache_key, model, response, size, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (cache_key, model, response, size, now, now)
+                )
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = conn.execute(
+                        "SELECT cache_key, size FROM llm_responses WHERE cache_key != ? ORDER BY last_used_at",
+                        (cache_key,)
+                    ).fetchall()
+                    evicted = []
+                    for key, entry_size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        evicted.append((key,))
+                        total -= entry_size
+                    conn.executemany("DELETE FROM llm_responses WHERE cache_key = ?", evicted)
+                conn.commit()
+            finally:
+                conn.close()
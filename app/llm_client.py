@@ -0,0 +1,81 @@
+"""LLM调用入口
+
+默认直接调用 litellm.completion。异步worker启动后通过 attach_loop 绑定其事件循环，
+之后所有调用都改为在该事件循环中执行 litellm.acompletion：任务代码仍在线程中同步编写，
+而网络等待全部由同一个事件循环复用，单个进程即可同时处理大量LLM任务。
+
+模型ID以 mock/ 开头时改由本地模拟模型（见 mock_llm.py）生成响应，用于离线压测。
+"""
+import asyncio
+import queue
+from typing import Optional
+
+from litellm import acompletion, completion
+
+from .mock_llm import MockLLMProvider, is_mock_model
+
+# 流式响应结束标记
+_STREAM_END = object()
+
+class _StreamError:
+    """事件循环中发生的异常，转交给读取响应的线程抛出"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+class LLMClient:
+    """按运行模式选择同步或异步方式调用litellm"""
+
+    def __init__(self, mock_provider: Optional[MockLLMProvider] = None):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.mock_provider = mock_provider or MockLLMProvider()
+
+    def attach_loop(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """绑定异步worker的事件循环，传入None恢复同步调用"""
+        self._loop = loop
+
+    @property
+    def is_async(self) -> bool:
+        return self._loop is not None
+
+    def completion(self, **kwargs):
+        """调用模型，参数与 litellm.completion 相同
+
+        未绑定事件循环时直接同步调用；已绑定时不能在事件循环线程中调用，否则会死锁。
+        """
+        mock = is_mock_model(kwargs.get("model"))
+        if self._loop is None:
+            return self.mock_provider.completion(**kwargs) if mock else completion(**kwargs)
+        async_completion = self.mock_provider.acompletion if mock else acompletion
+        if kwargs.get("stream"):
+            return self._stream_via_loop(async_completion, kwargs)
+        return asyncio.run_coroutine_threadsafe(async_completion(**kwargs), self._loop).result()
+
+    def _stream_via_loop(self, async_completion, kwargs):
+        """在事件循环中读取流式响应，通过队列逐块交给调用线程"""
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                response = await async_completion(**kwargs)
+                async for chunk in response:
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(_StreamError(e))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                chunks.put(_STREAM_END)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = chunks.get()
+                if item is _STREAM_END:
+                    return
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            # 调用方提前停止读取（如任务被暂停）时取消事件循环中的请求
+            future.cancel()
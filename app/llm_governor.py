@@ -0,0 +1,183 @@
+"""按模型限制LLM调用速率和并发的全局调度器
+
+model_config.toml 中每个 [[models]] 条目可以声明：
+    requests_per_minute  每分钟请求数上限
+    tokens_per_minute    每分钟token数上限（按提示词估算值加max_tokens计）
+    max_concurrency      同时进行中的请求数上限
+未声明的限制视为不限制。速率限制使用保存在Redis中的令牌桶，
+并发限制使用 SlotPool，因此所有worker进程共享同一份配额。
+调用期间由心跳线程每隔三分之一租约为并发槽位续约，耗时超过租约的长流式调用不会被其他调用挤占槽位；
+worker崩溃后槽位随租约过期自动释放。
+"""
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from redis import Redis
+
+from .leases import TaskHeartbeat
+from .slots import SlotPool
+
+KEY_PREFIX = "tai:ratelimit:"
+
+# 同时检查请求桶和token桶，两者都有余量时才扣减，否则返回需要等待的毫秒数
+_TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local limits = {tonumber(ARGV[1]), tonumber(ARGV[2])}
+local costs = {1, tonumber(ARGV[3])}
+local levels = {}
+local wait = 0
+for i = 1, 2 do
+    local capacity = limits[i]
+    if capacity > 0 then
+        local cost = math.min(costs[i], capacity)
+        local data = redis.call('HMGET', KEYS[i], 'level', 'ts')
+        local level = tonumber(data[1]) or capacity
+        local ts = tonumber(data[2]) or now
+        level = math.min(capacity, level + (now - ts) * capacity / 60000)
+        levels[i] = level - cost
+        if level < cost then
+            wait = math.max(wait, math.ceil((cost - level) * 60000 / capacity))
+        end
+    end
+end
+if wait > 0 then
+    return wait
+end
+for i = 1, 2 do
+    if levels[i] then
+        redis.call('HSET', KEYS[i], 'level', levels[i], 'ts', now)
+        redis.call('PEXPIRE', KEYS[i], 120000)
+    end
+end
+return 0
+"""
+
+class RateLimitTimeout(Exception):
+    """等待模型配额超时"""
+    pass
+
+class GovernorPermit:
+    """一次被放行的LLM调用"""
+
+    def __init__(self, model_id: str, wait_seconds: float):
+        self.model_id = model_id
+        # 在调度器中排队等待的总时长（秒）
+        self.wait_seconds = wait_seconds
+
+def estimate_text_tokens(text: str) -> int:
+    """粗略估算文本的token数
+
+    中文约1字1token、英文约4字符1token，这里按2字符1token折中估算。
+    """
+    return len(text or "") // 2
+
+def estimate_message_tokens(messages: List[Dict], max_tokens: int = 0) -> int:
+    """粗略估算一次调用消耗的token数（提示词加最大输出），图片按1000token计"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    return chars // 2 + images * 1000 + (max_tokens or 0)
+
+class LLMGovernor:
+    """按模型ID限制调用速率和并发"""
+
+    def __init__(self, redis_conn: Redis, model_config: Dict):
+        """初始化
+
+        Args:
+            redis_conn: Redis连接
+            model_config: 完整的模型配置，读取其中的 models 和 llm_governor 部分
+        """
+        self.redis = redis_conn
+        self.model_config = model_config
+        settings = model_config.get("llm_governor", {})
+        self.max_wait_seconds = settings.get("max_wait_seconds", 900)
+        self.concurrency_lease_seconds = settings.get("concurrency_lease_seconds", 900)
+        self.poll_interval_seconds = settings.get("poll_interval_seconds", 0.5)
+
+    def get_model_limits(self, model_id: str) -> Dict[str, int]:
+        """获取模型声明的限制，0表示不限制"""
+        for model in self.model_config.get("models", []):
+            if model.get("id") == model_id:
+                return {
+                    "requests_per_minute": int(model.get("requests_per_minute", 0) or 0),
+                    "tokens_per_minute": int(model.get("tokens_per_minute", 0) or 0),
+                    "max_concurrency": int(model.get("max_concurrency", 0) or 0),
+                }
+        return {"requests_per_minute": 0, "tokens_per_minute": 0, "max_concurrency": 0}
+
+    def _wait_for_rate(self, model_id: str, limits: Dict[str, int], estimated_tokens: int, deadline: float):
+        """等待令牌桶放行"""
+        if not limits["requests_per_minute"] and not limits["tokens_per_minute"]:
+            return
+        script = self.redis.register_script(_TOKEN_BUCKET_SCRIPT)
+        keys = [f"{KEY_PREFIX}{model_id}:requests", f"{KEY_PREFIX}{model_id}:tokens"]
+        while True:
+            wait_ms = int(script(keys=keys, args=[
+                limits["requests_per_minute"],
+                limits["tokens_per_minute"],
+                estimated_tokens
+            ]))
+            if wait_ms <= 0:
+                return
+            if time.monotonic() + wait_ms / 1000 > deadline:
+                raise RateLimitTimeout(f"模型 {model_id} 的速率配额等待超过 {self.max_wait_seconds} 秒")
+            time.sleep(wait_ms / 1000)
+
+    def _wait_for_slot(self, slot_pool: Optional[SlotPool], holder: str, model_id: str, deadline: float):
+        """等待并发槽位"""
+        if slot_pool is None:
+            return
+        while not slot_pool.acquire(holder):
+            if time.monotonic() + self.poll_interval_seconds > deadline:
+                raise RateLimitTimeout(f"模型 {model_id} 的并发槽位等待超过 {self.max_wait_seconds} 秒")
+            time.sleep(self.poll_interval_seconds)
+
+    @contextmanager
+    def acquire(self, model_id: str, estimated_tokens: int = 0):
+        """在模型配额内执行一次调用，流式调用需在with块内读取完整响应
+
+        Args:
+            model_id: 模型ID
+            estimated_tokens: 本次调用估算的token数
+
+        Yields:
+            GovernorPermit，其中记录了排队等待的时长
+        """
+        limits = self.get_model_limits(model_id)
+        started = time.monotonic()
+        deadline = started + self.max_wait_seconds
+
+        slot_pool = None
+        holder = uuid.uuid4().hex
+        if limits["max_concurrency"]:
+            slot_pool = SlotPool(
+                self.redis,
+                f"model:{model_id}",
+                limit=limits["max_concurrency"],
+                lease_seconds=self.concurrency_lease_seconds
+            )
+
+        self._wait_for_slot(slot_pool, holder, model_id, deadline)
+        heartbeat = nullcontext()
+        if slot_pool is not None:
+            heartbeat = TaskHeartbeat(lambda: slot_pool.renew(holder), self.concurrency_lease_seconds / 3)
+        try:
+            with heartbeat:
+                self._wait_for_rate(model_id, limits, estimated_tokens, deadline)
+                yield GovernorPermit(model_id, time.monotonic() - started)
+        finally:
+            if slot_pool is not None:
+                slot_pool.release(holder)
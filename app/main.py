@@ -8,9 +8,8 @@ from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from datetime import datetime
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from redis import Redis
-from rq import Queue
 import asyncio
 import json
 import base64
@@ -23,14 +22,13 @@ import logging
 
 from . import models, schemas, auth, tasks
 from .database import engine, get_db
+from .conversion_cache import file_content_hash, invalidate_conversions, conversion_cache_stats
 from .schemas import UserRole
+from .queues import SOURCE_ARTICLE_REVIEW, SOURCE_ARTICLE_EXTRACT, SOURCE_API, SOURCE_UPLOAD, SOURCE_PROJECT_EXTRACT
 
 # 设置日志记录器
 logger = logging.getLogger(__name__)
 
-redis_conn = Redis()
-task_queue = Queue(connection=redis_conn)
-
 models.Base.metadata.create_all(bind=engine)
 
 # 创建主应用
@@ -360,7 +358,8 @@ async def create_article_review(
         status=schemas.JobStatus.PENDING,
         progress=0,
         logs="",
-        parallelism=1
+        parallelism=1,
+        source=SOURCE_ARTICLE_REVIEW
     )
     db.add(db_job)
     db.commit()
@@ -382,13 +381,13 @@ async def create_article_review(
     )
     db.add(llm_task)
     
+    # 设置任务之间的前置依赖
+    db.flush()
+    tasks.link_task_dependencies([convert_task, llm_task])
     db.commit()
     
     # 启动任务
-    task_queue.enqueue(
-        tasks.schedule_job_tasks,
-        args=(db_job.id,)
-    )
+    tasks.enqueue_schedule_job_tasks(db_job)
     
     return db_job
 
@@ -430,7 +429,8 @@ async def extract_article_structured_data(
         status=schemas.JobStatus.PENDING,
         progress=0,
         logs="",
-        parallelism=1
+        parallelism=1,
+        source=SOURCE_ARTICLE_EXTRACT
     )
     db.add(db_job)
     db.commit()
@@ -446,10 +446,7 @@ async def extract_article_structured_data(
     db.commit()
     
     # 启动任务
-    task_queue.enqueue(
-        tasks.schedule_job_tasks,
-        args=(db_job.id,)
-    )
+    tasks.enqueue_schedule_job_tasks(db_job)
     
     return db_job
 
@@ -753,6 +750,117 @@ async def delete_project(
     db.commit()
     return {"message": "Project deleted successfully"}
 
+@api_app.post("/projects/{project_id}/re-extract-structured-data", response_model=schemas.Job, tags=["Project Management"])
+async def re_extract_project_structured_data(
+    project_id: int,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """为项目中所有已有审阅报告的文章重新提取结构化数据，多篇文章合并为一次模型调用"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this project")
+
+    article_ids = [
+        row[0] for row in db.query(models.AIReviewReport.article_id).join(
+            models.Article, models.Article.id == models.AIReviewReport.article_id
+        ).filter(
+            models.Article.project_id == project_id,
+            models.AIReviewReport.source_data.isnot(None),
+            models.AIReviewReport.source_data != ""
+        ).distinct().order_by(models.AIReviewReport.article_id).all()
+    ]
+    if not article_ids:
+        raise HTTPException(status_code=400, detail="No articles with AI review reports in this project")
+
+    task_config = tasks.get_task_config('extract_structured_data', project.config or {})
+    batch_size = max(1, int(task_config.get('extraction_batch_size', 10)))
+
+    db_job = models.Job(
+        name=f"Re-extract Structured Data for {project.name}",
+        project_id=project_id,
+        status=schemas.JobStatus.PENDING,
+        progress=0,
+        logs="",
+        parallelism=max(1, int(task_config.get('batch_parallelism', 4))),
+        source=SOURCE_PROJECT_EXTRACT
+    )
+    db.add(db_job)
+    db.commit()
+
+    # 每个任务处理一批文章，批大小为1时与单篇提取相同
+    for start in range(0, len(article_ids), batch_size):
+        batch = article_ids[start:start + batch_size]
+        if len(batch) == 1:
+            db.add(models.JobTask(
+                job_id=db_job.id,
+                task_type=schemas.JobTaskType.EXTRACT_STRUCTURED_DATA,
+                status=schemas.JobStatus.PENDING,
+                article_id=batch[0]
+            ))
+        else:
+            db.add(models.JobTask(
+                job_id=db_job.id,
+                task_type=schemas.JobTaskType.EXTRACT_STRUCTURED_DATA,
+                status=schemas.JobStatus.PENDING,
+                params={"article_ids": batch}
+            ))
+    db.commit()
+
+    tasks.enqueue_schedule_job_tasks(db_job)
+
+    return db_job
+
+@api_app.get("/projects/{project_id}/llm-usage", response_model=schemas.ProjectLLMUsage, tags=["Project Management"])
+async def get_project_llm_usage(
+    project_id: int,
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """按任务类型汇总项目中模型调用的token用量和耗时"""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this project")
+
+    rows = db.query(
+        models.JobTask.task_type,
+        func.count(models.JobTask.id),
+        func.coalesce(func.sum(models.JobTask.prompt_tokens), 0),
+        func.coalesce(func.sum(models.JobTask.completion_tokens), 0),
+        func.avg(models.JobTask.time_to_first_token_ms),
+        func.avg(models.JobTask.llm_latency_ms)
+    ).join(
+        models.Job, models.Job.id == models.JobTask.job_id
+    ).filter(
+        models.Job.project_id == project_id,
+        models.JobTask.prompt_tokens.isnot(None)
+    ).group_by(models.JobTask.task_type).all()
+
+    by_task_type = [
+        {
+            "task_type": task_type,
+            "task_count": task_count,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "avg_time_to_first_token_ms": avg_ttft,
+            "avg_latency_ms": avg_latency
+        }
+        for task_type, task_count, prompt_tokens, completion_tokens, avg_ttft, avg_latency in rows
+    ]
+    prompt_total = sum(item["prompt_tokens"] for item in by_task_type)
+    completion_total = sum(item["completion_tokens"] for item in by_task_type)
+    return {
+        "project_id": project_id,
+        "prompt_tokens": prompt_total,
+        "completion_tokens": completion_total,
+        "total_tokens": prompt_total + completion_total,
+        "by_task_type": by_task_type
+    }
+
 @api_app.get("/projects/{project_id}/export-csv", tags=["Project Management"])
 async def export_project_to_csv(
     project_id: int,
@@ -863,13 +971,15 @@ async def create_job(
         status=schemas.JobStatus.PENDING,
         progress=0,
         logs="",
-        parallelism=job.parallelism or 1
+        parallelism=job.parallelism or 1,
+        source=SOURCE_API
     )
     db.add(db_job)
     db.commit()
     db.refresh(db_job)
     
     # 创建任务记录
+    db_tasks = []
     for task_create in job.tasks:
         # 如果提供了article_id，检查文章是否存在
         if task_create.article_id:
@@ -892,15 +1002,16 @@ async def create_job(
             params=task_create.params
         )
         db.add(db_task)
+        db_tasks.append(db_task)
     
+    # 同一文章的任务按流水线顺序设置前置依赖
+    db.flush()
+    tasks.link_task_dependencies(db_tasks)
     db.commit()
     
     
     # 调度任务
-    task_queue.enqueue(
-        tasks.schedule_job_tasks,
-        args=(db_job.id,)
-    )
+    tasks.enqueue_schedule_job_tasks(db_job)
     
     # 刷新job以获取关联的tasks
     db.refresh(db_job)
@@ -931,7 +1042,8 @@ async def create_upload_job(
         status=schemas.JobStatus.PENDING,
         progress=0,
         logs="",
-        parallelism=parallelism
+        parallelism=parallelism,
+        source=SOURCE_UPLOAD
     )
     db.add(db_job)
     db.commit()
@@ -962,10 +1074,7 @@ async def create_upload_job(
     db.commit()
     
     # 调度任务
-    task_queue.enqueue(
-        tasks.schedule_job_tasks,
-        args=(db_job.id,)
-    )
+    tasks.enqueue_schedule_job_tasks(db_job)
     
     # 刷新job以获取关联的tasks
     db.refresh(db_job)
@@ -1045,32 +1154,22 @@ async def job_action(
     if hasattr(action, 'task_id') and action.task_id:
         return await task_action(job_id, action.task_id, action, current_user, db)
     
+    # 暂停、恢复和重试之外不需要重新扫描Job
+    reschedule = False
+    
     # 处理不同的操作
     if action.action == schemas.JobAction.PAUSE:
-        # 先试着找一个正在处理的任务
-        task_to_pause = db.query(models.JobTask).filter(
+        # 各篇文章的流水线相互独立，需要一次暂停Job中所有待执行、已分发和执行中的任务；
+        # 已分发的任务不会再开始执行，执行中的任务在下一次状态检查时中止
+        db.query(models.JobTask).filter(
             models.JobTask.job_id == job_id,
-            models.JobTask.status == schemas.JobStatus.PROCESSING
-        ).first()
-        
-        # 如果没有正在处理的任务，查找待处理的任务
-        if not task_to_pause:
-            task_to_pause = db.query(models.JobTask).filter(
-                models.JobTask.job_id == job_id,
-                models.JobTask.status == schemas.JobStatus.PENDING
-            ).first()
-        
-        # 如果找到了任务，则暂停
-        if task_to_pause:
-            task_to_pause.status = schemas.JobStatus.PAUSED
-            job.status = schemas.JobStatus.PAUSED
-        else:
-            # 没有找到任何任务，但不抛出错误
-            # 把所有任务都标记为暂停
-            db.query(models.JobTask).filter(
-                models.JobTask.job_id == job_id
-            ).update({"status": schemas.JobStatus.PAUSED})
-            job.status = schemas.JobStatus.PAUSED
+            models.JobTask.status.in_([
+                schemas.JobStatus.PENDING,
+                schemas.JobStatus.CLAIMED,
+                schemas.JobStatus.PROCESSING
+            ])
+        ).update({"status": schemas.JobStatus.PAUSED}, synchronize_session=False)
+        job.status = schemas.JobStatus.PAUSED
     
     elif action.action == schemas.JobAction.RESUME:
         # 恢复所有暂停的任务
@@ -1089,8 +1188,14 @@ async def job_action(
                 raise HTTPException(status_code=400, detail="No tasks found")
                 
             # 有其他任务，但没有暂停的，所以设置为pending
+            # 已分发或正在执行的任务保持不变，避免同一任务被重复执行
             for task in other_tasks:
-                if task.status != schemas.JobStatus.COMPLETED and task.status != schemas.JobStatus.FAILED:
+                if task.status not in [
+                    schemas.JobStatus.COMPLETED,
+                    schemas.JobStatus.FAILED,
+                    schemas.JobStatus.CLAIMED,
+                    schemas.JobStatus.PROCESSING
+                ]:
                     task.status = schemas.JobStatus.PENDING
                     
             job.status = schemas.JobStatus.PENDING
@@ -1100,11 +1205,7 @@ async def job_action(
             
             job.status = schemas.JobStatus.PENDING
         
-        # 调度任务
-        task_queue.enqueue(
-            tasks.schedule_job_tasks,
-            args=(job_id,)
-        )
+        reschedule = True
     
     elif action.action == schemas.JobAction.CANCEL:
         # 取消所有未完成的任务
@@ -1112,6 +1213,7 @@ async def job_action(
             models.JobTask.job_id == job_id,
             models.JobTask.status.in_([
                 schemas.JobStatus.PENDING,
+                schemas.JobStatus.CLAIMED,
                 schemas.JobStatus.PROCESSING,
                 schemas.JobStatus.PAUSED
             ])
@@ -1142,17 +1244,19 @@ async def job_action(
             task.status = schemas.JobStatus.PENDING
             task.progress = 0
             task.logs = ""
+            task.attempts = 0
         
         job.status = schemas.JobStatus.PENDING
         job.progress = 0
         
-        # 调度任务
-        task_queue.enqueue(
-            tasks.schedule_job_tasks,
-            args=(job_id,)
-        )
+        reschedule = True
     
     db.commit()
+    
+    # 状态提交后再触发调度，避免调度器读取到未提交的状态
+    if reschedule:
+        tasks.enqueue_schedule_job_tasks(job)
+    
     db.refresh(job)
     return job
 
@@ -1185,9 +1289,11 @@ async def task_action(
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    reschedule = False
+    
     # 处理不同的操作
     if action.action == schemas.JobAction.PAUSE:
-        if task.status != schemas.JobStatus.PROCESSING:
+        if task.status not in [schemas.JobStatus.CLAIMED, schemas.JobStatus.PROCESSING]:
             raise HTTPException(status_code=400, detail="Can only pause processing tasks")
         task.status = schemas.JobStatus.PAUSED
     
@@ -1196,11 +1302,8 @@ async def task_action(
             raise HTTPException(status_code=400, detail="Can only resume paused tasks")
         task.status = schemas.JobStatus.PENDING
         
-        # 调度任务
-        task_queue.enqueue(
-            tasks.execute_task,
-            args=(task_id,)
-        )
+        # 提交后重新扫描Job，由调度器在前置任务满足后执行
+        reschedule = True
     
     elif action.action == schemas.JobAction.CANCEL:
         if task.status in [schemas.JobStatus.COMPLETED, schemas.JobStatus.FAILED, schemas.JobStatus.CANCELLED]:
@@ -1214,15 +1317,16 @@ async def task_action(
         task.status = schemas.JobStatus.PENDING
         task.progress = 0
         task.logs = ""
+        task.attempts = 0
         
-        # 调度任务
-        task_queue.enqueue(
-            tasks.execute_task,
-            args=(task_id,)
-        )
+        # 提交后重新扫描Job，由调度器在前置任务满足后执行
+        reschedule = True
     
     db.commit()
     
+    if reschedule:
+        tasks.enqueue_schedule_job_tasks(job)
+    
     # 更新Job状态
     tasks.update_job_status(db, job_id)
     
@@ -1627,6 +1731,50 @@ async def get_model_config(
     """获取完整的模型配置"""
     return tasks.get_model_config()
 
+@api_app.get("/admin/metrics", tags=["System Management"])
+async def get_metrics(
+    current_user: models.User = Depends(auth.check_admin_user)
+):
+    """获取调度、租约回收等运行指标"""
+    return tasks.metrics.snapshot()
+
+@api_app.get("/admin/circuit-breakers", tags=["System Management"])
+async def get_circuit_breakers(
+    current_user: models.User = Depends(auth.check_admin_user)
+):
+    """获取各模型的熔断器状态"""
+    model_ids = [model.get("id") for model in tasks.MODEL_CONFIG.get("models", []) if model.get("id")]
+    return tasks.circuit_breaker.snapshot(model_ids)
+
+@api_app.get("/admin/conversion-cache", tags=["System Management"])
+async def get_conversion_cache_stats(
+    current_user: models.User = Depends(auth.check_admin_user),
+    db: Session = Depends(get_db)
+):
+    """获取文档转换缓存的条目数、总大小和命中次数"""
+    return conversion_cache_stats(db)
+
+@api_app.delete("/admin/conversion-cache", tags=["System Management"])
+async def invalidate_conversion_cache(
+    file_hash: Optional[str] = None,
+    article_id: Optional[int] = None,
+    current_user: models.User = Depends(auth.check_admin_user),
+    db: Session = Depends(get_db)
+):
+    """使文档转换缓存失效
+
+    指定file_hash时删除该文件的所有缓存，指定article_id时删除文章当前活动附件的缓存，都未指定时清空缓存。
+    """
+    if article_id is not None:
+        article = db.query(models.Article).filter(models.Article.id == article_id).first()
+        if not article:
+            raise HTTPException(status_code=404, detail="Article not found")
+        active = next((a for a in (article.attachments or []) if a.get("is_active")), None)
+        if not active or not active.get("path") or not os.path.exists(active["path"]):
+            raise HTTPException(status_code=404, detail="Active attachment not found")
+        file_hash = file_content_hash(active["path"])
+    return {"deleted": invalidate_conversions(db, file_hash)}
+
 @api_app.get("/user/stats", response_model=schemas.UserStats, tags=["User Management"])
 async def get_user_stats(
     current_user: models.User = Depends(auth.get_current_active_user),
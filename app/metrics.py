@@ -0,0 +1,31 @@
+"""保存在Redis中的运行指标计数器
+
+所有worker进程共享同一组计数，通过管理接口查看。指标名使用冒号分隔维度，
+如 reaper.requeued:process_with_llm。
+"""
+from typing import Dict
+
+from redis import Redis
+
+METRICS_KEY = "tai:metrics"
+
+class MetricsRecorder:
+    """累加计数型指标"""
+
+    def __init__(self, redis_conn: Redis):
+        self.redis = redis_conn
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        """累加指标，记录失败时不影响业务流程"""
+        try:
+            self.redis.hincrby(METRICS_KEY, name, amount)
+        except Exception:
+            pass
+
+    def snapshot(self) -> Dict[str, int]:
+        """获取所有指标的当前值"""
+        values = self.redis.hgetall(METRICS_KEY)
+        return {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in sorted(values.items())
+        }
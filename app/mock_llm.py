@@ -0,0 +1,239 @@
+"""本地模拟模型，用于离线压测
+
+压测调度、SSE推送和数据库写入时不能每次都消耗真实模型的额度。模型ID以 mock/ 开头时，
+LLMClient 不调用litellm，而是由这里按 model_config.toml 中 [mock_llm.profiles.<名称>]
+的延迟配置生成合成文本，例如 mock/fast 使用 [mock_llm.profiles.fast]：
+
+    time_to_first_token_ms   首个token前的等待毫秒数
+    jitter                   首个token时间的随机浮动比例，0.2表示±20%
+    tail_probability         出现长尾延迟的概率
+    tail_time_to_first_token_ms  长尾请求的首个token等待毫秒数
+    tokens_per_second        输出速度
+    output_tokens            每次输出的token数（中文按1字1token），不超过调用的max_tokens
+    chunk_tokens             流式响应每块的token数
+    error_rate               返回服务不可用错误（503）的概率
+    rate_limit_rate          返回限流错误（429）的概率
+
+合成文本按请求内容选择格式：图片消息返回图片描述；结构化提取返回YAML，批量提取按编号逐份返回；
+审阅返回以“评价等级”“最终评分”结尾的报告，融合模式下再追加结构化数据，下游的规则提取和解析都能正常工作。
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Dict, Iterator, List, Optional
+
+import litellm
+from litellm import ModelResponse
+from litellm.types.utils import Choices, Delta, Message, StreamingChoices, Usage
+
+from .fused_review import FUSED_MARKER
+from .llm_governor import estimate_message_tokens
+
+MOCK_MODEL_PREFIX = "mock/"
+
+DEFAULT_PROFILE = {
+    "time_to_first_token_ms": 200,
+    "jitter": 0.2,
+    "tail_probability": 0.0,
+    "tail_time_to_first_token_ms": 0,
+    "tokens_per_second": 100,
+    "output_tokens": 400,
+    "chunk_tokens": 8,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+}
+
+_GRADES = ["优秀", "良好", "中等", "及格", "不及格"]
+
+_REVIEW_SENTENCES = [
+    "文章结构完整，论点与论据之间的衔接较为自然。",
+    "部分段落的论证略显单薄，建议补充数据或案例支撑。",
+    "语言表达总体流畅，个别句子存在重复表述。",
+    "引用格式基本规范，但有少量文献信息不完整。",
+    "结论部分对前文的总结较为到位，可进一步提出展望。",
+]
+
+_IMAGE_SENTENCES = [
+    "图片展示了一张包含文字和图表的页面。",
+    "画面中部是一幅柱状图，坐标轴标注清晰。",
+    "右侧有若干说明文字，字体较小。",
+]
+
+_BATCH_REPORT_RE = re.compile(r"<<<\s*报告\s*(\d+)\s*>>>")
+
+def is_mock_model(model: Optional[str]) -> bool:
+    """是否为模拟模型"""
+    return isinstance(model, str) and model.startswith(MOCK_MODEL_PREFIX)
+
+def _message_text(message: Dict) -> str:
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return ""
+
+def _has_image(messages: List[Dict]) -> bool:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+def _fill(sentences: List[str], tokens: int) -> str:
+    """循环拼接句子直到达到指定长度"""
+    parts = []
+    length = 0
+    i = 0
+    while length < tokens:
+        sentence = sentences[i % len(sentences)]
+        parts.append(sentence)
+        length += len(sentence)
+        i += 1
+    return "".join(parts)[:max(tokens, 0)]
+
+def _structured_yaml(score: int, grade: str) -> str:
+    return f"```yaml\nfinal_score: {score}\ngrade: {grade}\n```"
+
+def synthesize_content(messages: List[Dict], output_tokens: int) -> str:
+    """根据请求内容生成合成输出，相同请求的输出相同"""
+    seed = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    rng = random.Random(seed)
+    score = rng.randint(55, 95)
+    grade = _GRADES[0] if score >= 90 else _GRADES[1] if score >= 80 else _GRADES[2] if score >= 70 else _GRADES[3] if score >= 60 else _GRADES[4]
+
+    if _has_image(messages):
+        return _fill(_IMAGE_SENTENCES, output_tokens)
+
+    system_prompt = "\n".join(_message_text(m) for m in messages if m.get("role") == "system")
+    user_text = "\n".join(_message_text(m) for m in messages if m.get("role") != "system")
+
+    # 批量结构化提取：按报告编号逐份返回
+    if "<<<结果" in system_prompt:
+        return "\n\n".join(
+            f"<<<结果 {item_id}>>>\n{_structured_yaml(score, grade)}"
+            for item_id in _BATCH_REPORT_RE.findall(user_text)
+        )
+    # 融合模式：报告后追加结构化数据
+    trailer = ""
+    if FUSED_MARKER in system_prompt:
+        trailer = f"\n{FUSED_MARKER}\n{_structured_yaml(score, grade)}"
+    elif "YAML" in system_prompt or "yaml" in system_prompt:
+        return _structured_yaml(score, grade)
+
+    ending = f"\n\n5. 评价等级：{grade}\n6. 最终评分（百分制）：{score}分"
+    body = _fill(_REVIEW_SENTENCES, max(output_tokens - len(ending) - len(trailer), 0))
+    return body + ending + trailer
+
+class MockLLMProvider:
+    """按延迟配置生成合成响应的模拟模型，接口与 litellm.completion / acompletion 相同"""
+
+    def __init__(self, profiles: Optional[Dict[str, Dict]] = None, rng: Optional[random.Random] = None):
+        """初始化
+
+        Args:
+            profiles: 配置名到延迟配置的映射，未配置的项使用默认值
+            rng: 决定延迟和错误注入的随机数生成器，测试中可传入固定种子
+        """
+        self.profiles = profiles or {}
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, mock_config: Dict) -> "MockLLMProvider":
+        """根据 [mock_llm] 配置创建"""
+        return cls(mock_config.get("profiles", {}))
+
+    def get_profile(self, model: str) -> Dict:
+        """获取模型对应的延迟配置，未配置的模型使用默认值"""
+        name = model[len(MOCK_MODEL_PREFIX):] if is_mock_model(model) else model
+        profile = dict(DEFAULT_PROFILE)
+        profile.update(self.profiles.get(name, {}))
+        return profile
+
+    def _maybe_fail(self, model: str, profile: Dict) -> None:
+        """按配置的概率注入限流或服务错误"""
+        roll = self.rng.random()
+        if roll < profile["rate_limit_rate"]:
+            raise litellm.RateLimitError("模拟限流（429）", llm_provider="mock", model=model)
+        if roll < profile["rate_limit_rate"] + profile["error_rate"]:
+            raise litellm.ServiceUnavailableError("模拟服务不可用（503）", llm_provider="mock", model=model)
+
+    def _first_token_seconds(self, profile: Dict) -> float:
+        if profile["tail_probability"] > 0 and self.rng.random() < profile["tail_probability"]:
+            return profile["tail_time_to_first_token_ms"] / 1000
+        jitter = profile["jitter"]
+        return max(profile["time_to_first_token_ms"] * self.rng.uniform(1 - jitter, 1 + jitter), 0) / 1000
+
+    def _plan(self, model: str, messages: List[Dict], max_tokens: Optional[int]):
+        """决定本次请求的延迟、输出内容和用量"""
+        profile = self.get_profile(model)
+        self._maybe_fail(model, profile)
+        output_tokens = profile["output_tokens"]
+        if max_tokens:
+            output_tokens = min(output_tokens, max_tokens)
+        content = synthesize_content(messages, output_tokens)
+        usage = Usage(
+            prompt_tokens=estimate_message_tokens(messages),
+            completion_tokens=len(content),
+            total_tokens=estimate_message_tokens(messages) + len(content)
+        )
+        step = max(int(profile["chunk_tokens"]), 1)
+        pieces = [content[i:i + step] for i in range(0, len(content), step)]
+        seconds_per_token = 1 / profile["tokens_per_second"] if profile["tokens_per_second"] > 0 else 0
+        return self._first_token_seconds(profile), seconds_per_token, content, pieces, usage
+
+    @staticmethod
+    def _response(model: str, content: str, usage: Usage) -> ModelResponse:
+        return ModelResponse(
+            model=model,
+            choices=[Choices(message=Message(role="assistant", content=content), finish_reason="stop")],
+            usage=usage
+        )
+
+    @staticmethod
+    def _chunk(model: str, content: Optional[str], finish_reason: Optional[str] = None, usage: Optional[Usage] = None) -> ModelResponse:
+        chunk = ModelResponse(
+            stream=True,
+            model=model,
+            choices=[StreamingChoices(delta=Delta(content=content), finish_reason=finish_reason)]
+        )
+        if usage is not None:
+            chunk.usage = usage
+        return chunk
+
+    def completion(self, model: str, messages: List[Dict], stream: bool = False, max_tokens: Optional[int] = None, **kwargs):
+        """同步调用，流式时返回逐块产出的生成器"""
+        first_token, per_token, content, pieces, usage = self._plan(model, messages, max_tokens)
+        if not stream:
+            time.sleep(first_token + per_token * len(content))
+            return self._response(model, content, usage)
+
+        def generate() -> Iterator[ModelResponse]:
+            time.sleep(first_token)
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(per_token * len(piece))
+                yield self._chunk(model, piece)
+            yield self._chunk(model, None, finish_reason="stop", usage=usage)
+
+        return generate()
+
+    async def acompletion(self, model: str, messages: List[Dict], stream: bool = False, max_tokens: Optional[int] = None, **kwargs):
+        """异步调用，等待时不阻塞事件循环"""
+        first_token, per_token, content, pieces, usage = self._plan(model, messages, max_tokens)
+        if not stream:
+            await asyncio.sleep(first_token + per_token * len(content))
+            return self._response(model, content, usage)
+
+        async def generate():
+            await asyncio.sleep(first_token)
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(per_token * len(piece))
+                yield self._chunk(model, piece)
+            yield self._chunk(model, None, finish_reason="stop", usage=usage)
+
+        return generate()
@@ -0,0 +1,162 @@
+"""模型回退链和对冲请求
+
+任务的模型只在开始时选定一次，提供方变慢或不可用时整个任务会卡到RQ超时或直接失败，
+免费模型的延迟长尾尤其明显。这里按 model_config.toml 中为任务类型配置的回退链依次尝试：
+
+- 当前模型调用出错（在产出第一个token之前）时，立即改用链上的下一个模型；
+- 超过 hedge_after_seconds 仍未收到第一个token时，在下一个模型上发起备用请求，
+  两者并行，先产出第一个token的请求胜出，其余请求被取消。
+
+每个候选请求在独立线程中读取，胜出后只把胜出请求的输出交给调用方。
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+
+# 候选请求读取结束标记
+_END = object()
+
+class _Failure:
+    """候选请求在产出第一个token前的异常"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+class _Attempt:
+    """一个候选模型的请求"""
+
+    def __init__(self, model: str, index: int):
+        self.model = model
+        self.index = index
+        self.cancelled = threading.Event()
+        self.buffer = []
+        self.started_at = time.monotonic()
+
+class HedgedCall:
+    """在模型回退链上执行一次（可能被对冲的）模型调用
+
+    open_stream(model) 在候选线程中调用，返回该模型的响应块迭代器；可以写成生成器，
+    以便在其中持有配额等资源，请求被取消时生成器会被关闭。非流式调用返回只含一个响应的迭代器即可。
+
+    取消只在落败请求产出下一个响应块时生效，非流式请求会一直执行到完成，
+    因此非流式调用不应设置 hedge_after_seconds，只在出错时回退。
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        open_stream: Callable[[str], Iterable],
+        hedge_after_seconds: Optional[float] = None,
+        is_first_token: Callable[[object], bool] = lambda chunk: True,
+        on_attempt: Optional[Callable[[str, str], None]] = None
+    ):
+        """初始化
+
+        Args:
+            models: 按优先级排列的候选模型，第一个为主模型
+            open_stream: 发起请求并返回响应块迭代器的函数
+            hedge_after_seconds: 未收到第一个token时发起备用请求的等待秒数，0或None表示只在出错时回退
+            is_first_token: 判断响应块是否包含第一个有效token
+            on_attempt: 发起候选请求时的回调，参数为模型和原因（primary/fallback/hedge）
+        """
+        if not models:
+            raise ValueError("候选模型列表不能为空")
+        self.models = models
+        self.open_stream = open_stream
+        self.hedge_after = hedge_after_seconds if hedge_after_seconds and hedge_after_seconds > 0 else None
+        self.is_first_token = is_first_token
+        self.on_attempt = on_attempt
+        self.winner: Optional[_Attempt] = None
+        self.attempts: List[_Attempt] = []
+        self._events = queue.Queue()
+
+    @property
+    def model(self) -> Optional[str]:
+        """胜出的模型"""
+        return self.winner.model if self.winner else None
+
+    def _read(self, attempt: _Attempt):
+        stream = None
+        try:
+            stream = self.open_stream(attempt.model)
+            for chunk in stream:
+                if attempt.cancelled.is_set():
+                    return
+                self._events.put((attempt, chunk))
+            self._events.put((attempt, _END))
+        except Exception as e:
+            self._events.put((attempt, _Failure(e)))
+        finally:
+            close = getattr(stream, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:
+                    logging.exception(f"关闭模型 {attempt.model} 的请求失败")
+
+    def _launch(self, reason: str) -> Optional[_Attempt]:
+        index = len(self.attempts)
+        if index >= len(self.models):
+            return None
+        attempt = _Attempt(self.models[index], index)
+        self.attempts.append(attempt)
+        if self.on_attempt:
+            self.on_attempt(attempt.model, reason)
+        threading.Thread(target=self._read, args=(attempt,), name=f"llm-hedge-{attempt.model}", daemon=True).start()
+        return attempt
+
+    def start(self) -> "HedgedCall":
+        """发起请求并阻塞到某个候选模型产出第一个token，所有候选都失败时抛出最后一个异常"""
+        self._launch("primary")
+        active = 1
+        last_error: Optional[BaseException] = None
+        while self.winner is None:
+            timeout = None
+            if self.hedge_after is not None and len(self.attempts) < len(self.models):
+                timeout = max(0.0, self.attempts[-1].started_at + self.hedge_after - time.monotonic())
+            try:
+                attempt, item = self._events.get(timeout=timeout)
+            except queue.Empty:
+                self._launch("hedge")
+                active += 1
+                continue
+
+            if isinstance(item, _Failure):
+                logging.warning(f"模型 {attempt.model} 调用失败: {item.error}")
+                last_error = item.error
+                active -= 1
+                if self._launch("fallback"):
+                    active += 1
+                elif active == 0:
+                    raise last_error
+                continue
+
+            # 第一个有效token之前的块（如只含角色信息的块）先缓存，没有输出就结束的请求也视为胜出
+            attempt.buffer.append(item)
+            if item is _END or self.is_first_token(item):
+                self.winner = attempt
+
+        for attempt in self.attempts:
+            if attempt is not self.winner:
+                attempt.cancelled.set()
+        return self
+
+    def __iter__(self) -> Iterator:
+        """逐块产出胜出请求的响应"""
+        if self.winner is None:
+            self.start()
+        for item in self.winner.buffer:
+            if item is _END:
+                return
+            yield item
+        while True:
+            attempt, item = self._events.get()
+            if attempt is not self.winner:
+                continue
+            if item is _END:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
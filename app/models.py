@@ -58,6 +58,10 @@ class AIReviewReport(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # 更新时间
     status = Column(String, default="pending")  # pending, processing, completed, failed
     structured_data = Column(JSON, nullable=True)  # 结构化的数据
+    prompt_tokens = Column(Integer, nullable=True)  # 审阅和结构化提取消耗的提示词token数
+    completion_tokens = Column(Integer, nullable=True)  # 审阅和结构化提取消耗的输出token数
+    time_to_first_token_ms = Column(Integer, nullable=True)  # 审阅时首个输出token的等待时间（毫秒）
+    llm_latency_ms = Column(Integer, nullable=True)  # 审阅的模型调用总耗时（毫秒）
     
     article = relationship("Article", back_populates="ai_reviews")
     job = relationship("Job")
@@ -83,16 +87,25 @@ class JobTask(Base):
     id = Column(Integer, primary_key=True, index=True)
     job_id = Column(Integer, ForeignKey("jobs.id"), nullable=False)
     task_type = Column(SQLAlchemyEnum(JobTaskType), nullable=False)
-    status = Column(SQLAlchemyEnum(JobStatus), nullable=False)
+    status = Column(SQLAlchemyEnum(JobStatus), nullable=False, index=True)
     progress = Column(Integer, nullable=True)
     logs = Column(Text, nullable=True)
     article_id = Column(Integer, ForeignKey("articles.id"), nullable=True)
     params = Column(JSON, nullable=True)  # 存储任务参数
+    depends_on_id = Column(Integer, ForeignKey("job_tasks.id"), nullable=True, index=True)  # 前置任务ID，前置任务完成后才可执行
+    claim_token = Column(String, nullable=True)  # 最近一次分发的令牌，worker凭令牌开始执行，保证每次分发至多执行一次
+    lease_expires_at = Column(DateTime, nullable=True)  # 租约到期时间（UTC），执行中由心跳续约，过期后由回收器处理
+    attempts = Column(Integer, default=0)  # 已开始执行的次数，显式重试时清零
+    prompt_tokens = Column(Integer, nullable=True)  # 模型调用消耗的提示词token数
+    completion_tokens = Column(Integer, nullable=True)  # 模型调用消耗的输出token数
+    time_to_first_token_ms = Column(Integer, nullable=True)  # 首个输出token的等待时间（毫秒）
+    llm_latency_ms = Column(Integer, nullable=True)  # 模型调用总耗时（毫秒）
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     job = relationship("Job", back_populates="tasks")
     article = relationship("Article")
+    depends_on = relationship("JobTask", remote_side=[id])
 
 class Job(Base):
     __tablename__ = "jobs"
@@ -105,8 +118,23 @@ class Job(Base):
     progress = Column(Integer, nullable=True)
     logs = Column(Text, nullable=True)
     parallelism = Column(Integer, default=1)  # 并行度设置
+    source = Column(String, nullable=True, default="api")  # 任务来源，决定使用的优先级队列
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     project = relationship("Project", back_populates="jobs")
     tasks = relationship("JobTask", back_populates="job", cascade="all, delete-orphan")
+
+class ConversionCacheEntry(Base):
+    __tablename__ = "conversion_cache"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String, unique=True, index=True, nullable=False)  # 文件内容哈希、转换类型和相关配置的哈希
+    file_hash = Column(String, index=True, nullable=False)  # 文件内容的SHA-256
+    conversion_type = Column(String, nullable=False)  # simple / advanced / hybrid
+    config = Column(JSON, nullable=True)  # 参与缓存键计算的转换配置
+    markdown = Column(Text, nullable=False)  # 转换得到的Markdown文本
+    size = Column(Integer, nullable=False)  # Markdown的字节数
+    hit_count = Column(Integer, default=0)  # 命中次数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime, nullable=True)  # 最近一次写入或命中的时间（UTC），按此淘汰
@@ -0,0 +1,106 @@
+"""按优先级划分的RQ任务队列
+
+high   交互式操作，如单篇文章的审阅和结构化数据提取
+normal 通过API创建的一般任务
+bulk   批量上传及其产生的自动批阅任务、项目级重新提取
+
+每个Job记录自己的来源（source），来源到队列的映射在 model_config.toml 的
+[queues.routes] 中配置；worker按 [queues.weights] 中的权重在各队列之间加权轮转出队。
+
+启用异步worker（[async_worker]）后，LLM类任务改为进入带 async- 前缀的同名优先级队列，
+由异步worker在单个进程中并发执行，其余任务仍由进程型worker执行。
+"""
+from typing import Dict, List, Optional
+
+from rq import Worker
+
+QUEUE_HIGH = "high"
+QUEUE_NORMAL = "normal"
+QUEUE_BULK = "bulk"
+# 按优先级从高到低排列
+QUEUE_NAMES = [QUEUE_HIGH, QUEUE_NORMAL, QUEUE_BULK]
+
+# 异步worker监听的队列
+ASYNC_QUEUE_PREFIX = "async-"
+ASYNC_QUEUE_NAMES = [f"{ASYNC_QUEUE_PREFIX}{name}" for name in QUEUE_NAMES]
+
+# 默认由异步worker执行的任务类型，主要时间花在等待模型响应上
+DEFAULT_ASYNC_TASK_TYPES = ["process_with_llm", "extract_structured_data"]
+
+# Job来源
+SOURCE_ARTICLE_REVIEW = "article_review"
+SOURCE_ARTICLE_EXTRACT = "article_extract"
+SOURCE_API = "api"
+SOURCE_UPLOAD = "upload"
+SOURCE_AUTO_REVIEW = "auto_review"
+SOURCE_PROJECT_EXTRACT = "project_extract"
+
+DEFAULT_ROUTES = {
+    SOURCE_ARTICLE_REVIEW: QUEUE_HIGH,
+    SOURCE_ARTICLE_EXTRACT: QUEUE_HIGH,
+    SOURCE_API: QUEUE_NORMAL,
+    SOURCE_UPLOAD: QUEUE_BULK,
+    SOURCE_AUTO_REVIEW: QUEUE_BULK,
+    SOURCE_PROJECT_EXTRACT: QUEUE_BULK,
+}
+
+DEFAULT_WEIGHTS = {
+    QUEUE_HIGH: 6,
+    QUEUE_NORMAL: 3,
+    QUEUE_BULK: 1,
+}
+
+def resolve_queue_name(source: Optional[str], queue_config: Dict) -> str:
+    """根据Job来源确定使用的队列，未配置的来源使用normal队列"""
+    routes = dict(DEFAULT_ROUTES)
+    routes.update(queue_config.get("routes", {}))
+    queue_name = routes.get(source or SOURCE_API, QUEUE_NORMAL)
+    return queue_name if queue_name in QUEUE_NAMES else QUEUE_NORMAL
+
+def resolve_task_queue_name(source: Optional[str], task_type: str, queue_config: Dict, async_config: Dict) -> str:
+    """确定任务的执行队列，启用异步worker时LLM类任务进入对应的异步队列"""
+    queue_name = resolve_queue_name(source, queue_config)
+    task_type = getattr(task_type, "value", task_type)
+    if async_config.get("enabled", False) and task_type in async_config.get("task_types", DEFAULT_ASYNC_TASK_TYPES):
+        return f"{ASYNC_QUEUE_PREFIX}{queue_name}"
+    return queue_name
+
+def get_queue_weights(queue_config: Dict) -> Dict[str, int]:
+    """获取各队列的出队权重，异步队列与同名优先级队列使用相同权重"""
+    weights = dict(DEFAULT_WEIGHTS)
+    weights.update(queue_config.get("weights", {}))
+    weights.update({f"{ASYNC_QUEUE_PREFIX}{name}": weight for name, weight in list(weights.items())})
+    return weights
+
+class WeightedRoundRobin:
+    """平滑加权轮询，给出每一轮检查队列的顺序"""
+
+    def __init__(self, names: List[str], weights: Dict[str, int]):
+        self.names = list(names)
+        self.weights = {name: max(1, int(weights.get(name, 1))) for name in self.names}
+        self._current = {name: 0 for name in self.names}
+
+    def next_order(self) -> List[str]:
+        """选出本轮优先检查的队列，其余队列按优先级排在其后"""
+        total = sum(self.weights.values())
+        for name, weight in self.weights.items():
+            self._current[name] += weight
+        lead = max(self.names, key=lambda name: self._current[name])
+        self._current[lead] -= total
+        return [lead] + [name for name in self.names if name != lead]
+
+class WeightedWorker(Worker):
+    """按权重在多个队列之间轮转出队顺序的worker
+
+    使用平滑加权轮询选出本轮优先检查的队列，其余队列按优先级排在其后，
+    因此所有队列都有任务时按权重比例出队，某个队列为空时不会浪费worker。
+    """
+
+    def __init__(self, queues, *args, weights: Optional[Dict[str, int]] = None, **kwargs):
+        super().__init__(queues, *args, **kwargs)
+        self.round_robin = WeightedRoundRobin([q.name for q in self.queues], weights or {})
+        self.reorder_queues(reference_queue=None)
+
+    def reorder_queues(self, reference_queue):
+        queues_by_name = {q.name: q for q in self.queues}
+        self._ordered_queues = [queues_by_name[name] for name in self.round_robin.next_order()]
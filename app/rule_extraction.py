@@ -0,0 +1,120 @@
+"""基于规则的结构化数据快速提取
+
+文章类型的审阅提示词要求报告以“评价等级”和“最终评分”结尾，这些字段用正则即可可靠地取出，
+不必再调用推理模型。提取时先按规则逐个字段匹配，只有规则无法确定的字段才交给模型。
+
+规则可以在文章类型或项目配置的 tasks.extract_structured_data.extraction_rules 中覆盖，格式为：
+
+    [
+        {
+            "field": "final_score",          # 写入结构化数据的字段名
+            "patterns": ["最终评分[：:]\\s*(\\d+)"],  # 依次尝试的正则，第一个分组为字段值
+            "type": "number",                # number / integer / string
+            "choices": [],                   # 可选，取值必须在列表中
+            "min": 0, "max": 100             # 可选，数值范围
+        }
+    ]
+
+同一字段匹配到多个不同的值时视为不确定，交给模型提取。
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+GRADE_CHOICES = ["优秀", "良好", "中等", "及格", "不及格"]
+
+_GRADE_VALUE = r"[*_`\s]*(不及格|优秀|良好|中等|及格)"
+_SCORE_VALUE = r"[*_`\s]*(\d{1,3}(?:\.\d+)?)"
+
+DEFAULT_EXTRACTION_RULES = [
+    {
+        "field": "final_score",
+        "patterns": [
+            # 6. 最终评分（百分制）：85分
+            r"最终评分[^\n\d]{0,20}?[：:]" + _SCORE_VALUE,
+            # 6. 最终评分（百分制）\n85分
+            r"最终评分[^\n\d]*\n+[\s>*-]*" + _SCORE_VALUE,
+        ],
+        "type": "number",
+        "min": 0,
+        "max": 100,
+    },
+    {
+        "field": "grade",
+        "patterns": [
+            r"评价等级[^\n]{0,20}?[：:]" + _GRADE_VALUE,
+            r"评价等级[^\n]*\n+[\s>*-]*" + _GRADE_VALUE,
+        ],
+        "type": "string",
+        "choices": GRADE_CHOICES,
+    },
+]
+
+def _convert(value: str, rule: Dict) -> Optional[Any]:
+    """按规则转换并校验字段值，不合法时返回None"""
+    value = value.strip()
+    value_type = rule.get("type", "string")
+    if value_type in ("number", "integer"):
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        if "min" in rule and number < rule["min"]:
+            return None
+        if "max" in rule and number > rule["max"]:
+            return None
+        if value_type == "integer" or number.is_integer():
+            return int(number)
+        return number
+    if rule.get("choices") and value not in rule["choices"]:
+        return None
+    return value or None
+
+def _match_field(text: str, rule: Dict) -> Optional[Any]:
+    """匹配单个字段，所有规则匹配到的值一致时才返回"""
+    values = []
+    for pattern in rule.get("patterns", []):
+        try:
+            matches = re.finditer(pattern, text)
+            for match in matches:
+                raw = match.group(1) if match.groups() else match.group(0)
+                value = _convert(raw, rule)
+                if value is not None:
+                    values.append(value)
+        except re.error:
+            continue
+    if not values or len(set(values)) > 1:
+        return None
+    return values[0]
+
+def extract_with_rules(text: str, rules: Optional[List[Dict]] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """按规则提取结构化数据
+
+    Returns:
+        (确定提取到的字段, 未能确定的字段名列表)
+    """
+    rules = DEFAULT_EXTRACTION_RULES if rules is None else rules
+    data = {}
+    missing = []
+    for rule in rules:
+        field = rule.get("field")
+        if not field:
+            continue
+        value = _match_field(text or "", rule)
+        if value is None:
+            missing.append(field)
+        else:
+            data[field] = value
+    return data, missing
+
+def merge_structured_data(model_data: Any, rule_data: Dict[str, Any]) -> Any:
+    """合并模型和规则的提取结果，规则确定的字段优先"""
+    if not rule_data:
+        return model_data
+    if isinstance(model_data, dict):
+        merged = dict(model_data)
+        merged.update(rule_data)
+        return merged
+    merged = dict(rule_data)
+    if model_data is not None:
+        merged["raw_text"] = model_data
+    return merged
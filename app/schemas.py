@@ -10,6 +10,7 @@ class UserRole(str, Enum):
 
 class JobStatus(str, Enum):
     PENDING = "pending"
+    CLAIMED = "claimed"  # 已被调度器分发，等待worker开始执行
     PROCESSING = "processing"
     PAUSED = "paused"
     COMPLETED = "completed"
@@ -126,6 +127,10 @@ class AIReviewReport(AIReviewReportBase):
     job_id: int | None
     status: str = "pending"
     structured_data: Optional[Dict[str, Any]] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    time_to_first_token_ms: Optional[int] = None
+    llm_latency_ms: Optional[int] = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -171,6 +176,7 @@ class JobTaskBase(BaseModel):
     logs: Optional[str] = None
     article_id: Optional[int] = None
     params: Optional[Dict[str, Any]] = None
+    depends_on_id: Optional[int] = None
 
 class JobTaskCreate(BaseModel):
     task_type: JobTaskType
@@ -180,6 +186,10 @@ class JobTaskCreate(BaseModel):
 class JobTask(JobTaskBase):
     id: int
     job_id: int
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    time_to_first_token_ms: Optional[int] = None
+    llm_latency_ms: Optional[int] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -202,6 +212,7 @@ class JobBase(BaseModel):
     progress: Optional[int] = None
     logs: Optional[str] = None
     parallelism: Optional[int] = 1
+    source: Optional[str] = None
 
 class JobCreate(BaseModel):
     project_id: Optional[int] = None
@@ -230,6 +241,7 @@ class Job(JobBase):
             "progress": self.progress,
             "logs": self.logs,
             "parallelism": self.parallelism,
+            "source": self.source,
             "tasks": [task for task in self.tasks],
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
@@ -246,6 +258,21 @@ class JobActionRequest(BaseModel):
     action: JobAction
     task_id: Optional[int] = None  # 可选，指定要操作的特定任务ID
 
+class TaskTypeUsage(BaseModel):
+    task_type: JobTaskType
+    task_count: int
+    prompt_tokens: int
+    completion_tokens: int
+    avg_time_to_first_token_ms: Optional[float] = None
+    avg_latency_ms: Optional[float] = None
+
+class ProjectLLMUsage(BaseModel):
+    project_id: int
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    by_task_type: List[TaskTypeUsage]
+
 class UserStats(BaseModel):
     article_count: int
     project_count: int
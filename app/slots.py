@@ -0,0 +1,89 @@
+"""基于Redis的并发槽位管理
+
+每个槽位池对应一个Redis有序集合：成员为持有者ID（通常是任务ID），分数为租约到期时间。
+获取、续约和释放均通过Lua脚本原子执行，时间取自Redis服务器，
+因此多个worker进程、多台主机共享同一份计数，且崩溃进程持有的槽位会在租约到期后自动回收。
+"""
+from redis import Redis
+
+KEY_PREFIX = "tai:slots:"
+
+# 清理过期租约后，若持有者已在集合中则续约，否则在未超过上限时占用一个槽位
+_ACQUIRE_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local lease_ms = tonumber(ARGV[2])
+local holder = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+if not redis.call('ZSCORE', key, holder) and redis.call('ZCARD', key) >= limit then
+    return 0
+end
+redis.call('ZADD', key, now + lease_ms, holder)
+redis.call('PEXPIRE', key, lease_ms)
+return 1
+"""
+
+# 仅当持有者仍持有槽位时续约
+_RENEW_SCRIPT = """
+local key = KEYS[1]
+local lease_ms = tonumber(ARGV[1])
+local holder = ARGV[2]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local score = redis.call('ZSCORE', key, holder)
+if not score or tonumber(score) <= now then
+    return 0
+end
+redis.call('ZADD', key, now + lease_ms, holder)
+if redis.call('PTTL', key) < lease_ms then
+    redis.call('PEXPIRE', key, lease_ms)
+end
+return 1
+"""
+
+# 清理过期租约后返回当前占用的槽位数
+_COUNT_SCRIPT = """
+local key = KEYS[1]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+return redis.call('ZCARD', key)
+"""
+
+class SlotPool:
+    """带租约的分布式计数信号量"""
+
+    def __init__(self, redis_conn: Redis, name: str, limit: int = 1, lease_seconds: float = 1800):
+        """初始化槽位池
+
+        Args:
+            redis_conn: Redis连接
+            name: 槽位池名称，如 job:12
+            limit: 最多同时持有的槽位数
+            lease_seconds: 租约时长（秒），持有者需在到期前续约
+        """
+        self.redis = redis_conn
+        self.key = f"{KEY_PREFIX}{name}"
+        self.limit = max(1, int(limit))
+        self.lease_ms = max(1, int(lease_seconds * 1000))
+
+    def acquire(self, holder) -> bool:
+        """尝试占用一个槽位，已持有时视为续约"""
+        script = self.redis.register_script(_ACQUIRE_SCRIPT)
+        return bool(script(keys=[self.key], args=[self.limit, self.lease_ms, str(holder)]))
+
+    def renew(self, holder) -> bool:
+        """为已持有的槽位续约，租约已过期时返回False"""
+        script = self.redis.register_script(_RENEW_SCRIPT)
+        return bool(script(keys=[self.key], args=[self.lease_ms, str(holder)]))
+
+    def release(self, holder) -> None:
+        """释放槽位，未持有时不做任何操作"""
+        self.redis.zrem(self.key, str(holder))
+
+    def in_use(self) -> int:
+        """当前有效租约的数量"""
+        script = self.redis.register_script(_COUNT_SCRIPT)
+        return int(script(keys=[self.key]))
@@ -0,0 +1,83 @@
+"""流式模型输出的合并写入
+
+流式响应的每个块都很小，逐块把完整内容写回数据库会使写入量随长度平方增长。
+这里把收到的增量缓存在内存中，达到时间或大小阈值时才写入一次，
+写入时只在数据库中追加本次的增量，而不是重写整段内容。
+
+阈值在任务配置中设置：
+    stream_flush_interval_ms  距上次写入的最长间隔（毫秒）
+    stream_flush_bytes        缓存的增量达到该字节数时立即写入
+"""
+import time
+from typing import List
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from .models import AIReviewReport, JobTask
+
+class StreamFlushWriter:
+    """把流式输出增量追加到审阅报告的source_data中"""
+
+    def __init__(self, db: Session, ai_review_id: int, task_id: int, flush_interval_ms: float = 500, flush_bytes: int = 2048):
+        """初始化
+
+        Args:
+            db: 数据库会话，每次写入后提交
+            ai_review_id: 写入的审阅报告ID
+            task_id: 记录进度日志的任务ID
+            flush_interval_ms: 两次写入的最长间隔（毫秒）
+            flush_bytes: 触发写入的缓存大小（字节）
+        """
+        self.db = db
+        self.ai_review_id = ai_review_id
+        self.task_id = task_id
+        self.flush_interval = max(0, flush_interval_ms) / 1000
+        self.flush_bytes = max(1, int(flush_bytes))
+        self._parts: List[str] = []
+        self._pending: List[str] = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
+
+    @property
+    def content(self) -> str:
+        """目前收到的完整内容"""
+        return "".join(self._parts)
+
+    def reset(self) -> None:
+        """清空报告中已有的内容，重新审阅时从空内容开始追加"""
+        self.db.execute(
+            update(AIReviewReport).where(AIReviewReport.id == self.ai_review_id).values(source_data="")
+        )
+        self.db.commit()
+        self._last_flush = time.monotonic()
+
+    def append(self, delta: str) -> None:
+        """追加一段增量，达到阈值时写入数据库"""
+        if not delta:
+            return
+        self._parts.append(delta)
+        self._pending.append(delta)
+        self._pending_bytes += len(delta.encode("utf-8"))
+        if self._pending_bytes >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """把缓存的增量追加到数据库"""
+        if not self._pending:
+            return
+        delta = "".join(self._pending)
+        self.db.execute(
+            update(AIReviewReport)
+            .where(AIReviewReport.id == self.ai_review_id)
+            .values(source_data=func.coalesce(AIReviewReport.source_data, "") + delta)
+        )
+        self.db.execute(
+            update(JobTask)
+            .where(JobTask.id == self.task_id)
+            .values(logs=func.coalesce(JobTask.logs, "") + f"【更新】收到内容: {len(delta)}字符\n")
+        )
+        self.db.commit()
+        self._pending = []
+        self._pending_bytes = 0
+        self._last_flush = time.monotonic()
@@ -2,35 +2,58 @@ import os
 import zipfile
 import io
 from datetime import datetime, timedelta
+from typing import Optional
 from rq import get_current_job
-from sqlalchemy.orm import Session
+from sqlalchemy import case, or_, func
+from sqlalchemy.orm import Session, aliased
 from .database import SessionLocal
-from .models import Job, JobTask, Article, Project, AIReviewReport
+from .models import Job, JobTask, Article, ArticleType, Project, AIReviewReport, User
 from .schemas import ArticleCreate, JobStatus, JobTaskType
 from docx import Document
 from pypdf import PdfReader
 from PIL import Image
 import pytesseract
-from litellm import completion
 import json
 import tomli
 from .file_converter import convert_file_to_markdown
+from .slots import SlotPool
+from .llm_governor import LLMGovernor
+from .llm_client import LLMClient
+from .mock_llm import MockLLMProvider
+from .llm_cache import LLMResponseCache, make_cache_key
+from .stream_writer import StreamFlushWriter
+from .conversion_cache import (
+    file_content_hash,
+    conversion_cache_config,
+    make_conversion_cache_key,
+    get_cached_conversion,
+    save_conversion
+)
+from .model_fallback import HedgedCall
+from .circuit_breaker import CircuitBreaker
+from .token_usage import LLMUsage, POLICY_REFUSE, apply_token_budget
+from .rule_extraction import extract_with_rules, merge_structured_data
+from .fused_review import build_fused_prompt, split_fused_output
+from .batch_extraction import build_batch_extraction_messages, split_batch_response
+from .chunked_review import plan_review_chunks, build_map_messages, build_reduce_messages
+from .queues import QUEUE_NAMES, ASYNC_QUEUE_NAMES, SOURCE_AUTO_REVIEW, resolve_task_queue_name
+from .fair_share import OwnerShare, get_role_policy, pick_next_owner
+from .leases import LEASE_REQUEUE, TaskHeartbeat, get_lease_policy
+from .metrics import MetricsRecorder
 from redis import Redis
 from rq import Queue
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import uuid
 import yaml
 
 ALLOWED_EXTENSIONS = {'.md', '.doc', '.pdf', '.txt', '.docx'}
 ALLOWED_IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
 
-# 创建Redis连接和队列
+# 创建Redis连接和按优先级划分的队列
 redis_conn = Redis()
-# 创建一个默认队列，用于并行执行不同job的任务
-task_queue = Queue(connection=redis_conn)
-# 创建一个执行任务的队列字典，用于跟踪每个job的任务执行
-# 键为job_id，值为当前正在执行的任务数量
-job_tasks = {}
+task_queues = {name: Queue(name, connection=redis_conn) for name in QUEUE_NAMES + ASYNC_QUEUE_NAMES}
 
 # 加载模型配置
 def load_model_config():
@@ -46,6 +69,24 @@ def load_model_config():
 # 全局模型配置
 MODEL_CONFIG = load_model_config()
 
+# 按模型限制LLM调用速率和并发，配额在所有worker之间共享
+llm_governor = LLMGovernor(redis_conn, MODEL_CONFIG)
+
+# 运行指标计数，所有worker共享
+metrics = MetricsRecorder(redis_conn)
+
+# 按模型的熔断器，状态在所有worker之间共享
+circuit_breaker = CircuitBreaker(redis_conn, MODEL_CONFIG)
+
+# LLM调用入口，异步worker中改为通过事件循环调用 litellm.acompletion，mock/开头的模型使用 [mock_llm] 中的模拟配置
+llm_client = LLMClient(MockLLMProvider.from_config(MODEL_CONFIG.get("mock_llm", {})))
+
+# 模型响应缓存，在 [llm_cache] 中启用
+llm_cache = LLMResponseCache.from_config(MODEL_CONFIG.get("llm_cache", {}))
+
+# 按图片内容缓存的图片描述，在 [image_description_cache] 中配置
+image_description_cache = LLMResponseCache.from_config(MODEL_CONFIG.get("image_description_cache", {}))
+
 # 获取任务可用的模型列表
 def get_available_models_for_task(task_type):
     """获取特定任务类型可用的模型列表"""
@@ -67,6 +108,97 @@ def get_default_model_for_task(task_type):
         return task_config["available_models"][0]
     return default_model or os.getenv("LLM_MODEL", "deepseek/deepseek-chat")
 
+# 获取任务的模型回退链
+def get_model_chain_for_task(task_type, model, task_config=None):
+    """获取任务的模型回退链：选定的模型在前，其后依次为配置的回退模型
+
+    回退模型优先取任务配置（可被项目覆盖）中的fallback_models，否则取 [tasks.<task_type>] 中的配置，
+    配置了可用模型列表时只保留列表中的模型。
+    """
+    type_config = MODEL_CONFIG.get("tasks", {}).get(task_type, {})
+    fallback_models = (task_config or {}).get("fallback_models")
+    if fallback_models is None:
+        fallback_models = type_config.get("fallback_models", [])
+    available_models = get_available_models_for_task(task_type)
+    chain = [model]
+    for fallback_model in fallback_models:
+        if fallback_model in chain or (available_models and fallback_model not in available_models):
+            continue
+        chain.append(fallback_model)
+    return chain
+
+def chunk_has_content(chunk) -> bool:
+    """流式响应块是否包含输出内容
+
+    推理模型（如QwQ）在正文之前先输出较长的reasoning_content，推理内容同样说明模型已开始响应，
+    视为首个token，避免在推理阶段发起重复的对冲请求。
+    """
+    choices = getattr(chunk, "choices", None)
+    delta = getattr(choices[0], "delta", None) if choices else None
+    return any(
+        isinstance(content, str) and content != ""
+        for content in (getattr(delta, "content", None), getattr(delta, "reasoning_content", None))
+    )
+
+def make_attempt_logger(db: Session, task: JobTask):
+    """记录回退和对冲请求的回调，在发起请求的线程中调用"""
+    def on_attempt(candidate, reason):
+        metrics.incr(f"llm.attempt.{reason}:{candidate}")
+        if reason != "primary":
+            label = "回退" if reason == "fallback" else "对冲"
+            task.logs += f"【模型】{label}请求: {candidate}\n"
+            db.commit()
+    return on_attempt
+
+def log_governor_waits(task: JobTask, waits: dict):
+    """记录各候选模型的配额排队时间
+
+    排队发生在候选请求的线程中，只把等待时间记入 waits，由持有数据库会话的线程写入日志。
+    """
+    for candidate, wait_seconds in list(waits.items()):
+        task.logs += f"【信息】模型配额排队等待 {wait_seconds:.2f} 秒（{candidate}）\n"
+
+def hold_task_for_open_circuits(db: Session, task: JobTask, models) -> bool:
+    """回退链上的模型全部熔断时把任务放回待执行，暂缓到熔断器开始探测后再分发
+
+    Returns:
+        任务是否被暂缓，暂缓时调用方应直接返回
+    """
+    retry_after = circuit_breaker.retry_after(models)
+    if retry_after is None:
+        return False
+    # 先登记暂缓再改回待执行，避免调度器在两步之间立即重新分发
+    circuit_breaker.hold_task(task.id, retry_after)
+    # 本次执行没有调用模型，撤销开始执行时计入的次数，长时间熔断不会耗尽任务的重试次数
+    db.query(JobTask).filter(
+        JobTask.id == task.id,
+        JobTask.status == JobStatus.PROCESSING
+    ).update({
+        "status": JobStatus.PENDING,
+        "claim_token": None,
+        "lease_expires_at": None,
+        "attempts": case((JobTask.attempts > 0, JobTask.attempts - 1), else_=0)
+    }, synchronize_session=False)
+    db.refresh(task)
+    task.logs += f"【熔断】模型 {', '.join(models)} 均已熔断，任务放回队列，约 {int(retry_after)} 秒后重新调度\n"
+    db.commit()
+    metrics.incr(f"breaker.held:{task.task_type.value}")
+    return True
+
+def release_held_tasks() -> int:
+    """重新调度暂缓期已结束的任务，返回涉及的Job数"""
+    task_ids = circuit_breaker.pop_due_tasks()
+    if not task_ids:
+        return 0
+    db = SessionLocal()
+    try:
+        jobs = db.query(Job).join(JobTask, JobTask.job_id == Job.id).filter(JobTask.id.in_(task_ids)).distinct().all()
+        for job in jobs:
+            enqueue_schedule_job_tasks(job)
+        return len(jobs)
+    finally:
+        db.close()
+
 # 获取任务的默认配置
 def get_task_default_config(task_type):
     """获取特定任务类型的默认配置"""
@@ -84,6 +216,73 @@ def get_task_config(task_type, project_config):
     merged_config.update(project_task_config)
     return merged_config
 
+# 获取调度配置
+def get_scheduler_config():
+    """获取调度相关的配置"""
+    return MODEL_CONFIG.get("scheduler", {})
+
+def get_job_slot_pool(job_id: int, parallelism: int = 1) -> SlotPool:
+    """获取Job的并发槽位池，槽位计数保存在Redis中，由所有worker进程共享"""
+    lease_seconds = get_scheduler_config().get("slot_lease_seconds", 1800)
+    return SlotPool(redis_conn, f"job:{job_id}", limit=parallelism, lease_seconds=lease_seconds)
+
+def get_owner_slot_pool(owner_id: int, limit: int = 1) -> SlotPool:
+    """获取项目所有者的并发槽位池，上限由用户角色决定"""
+    lease_seconds = get_scheduler_config().get("slot_lease_seconds", 1800)
+    return SlotPool(redis_conn, f"owner:{owner_id}", limit=limit, lease_seconds=lease_seconds)
+
+def get_global_slot_pool() -> SlotPool:
+    """获取全局执行槽位池，槽位数一般设置为worker总数"""
+    scheduler_config = get_scheduler_config()
+    return SlotPool(
+        redis_conn,
+        "global",
+        limit=scheduler_config.get("max_in_flight_tasks", 8),
+        lease_seconds=scheduler_config.get("slot_lease_seconds", 1800)
+    )
+
+def release_task_slots(holder: str, job_id: int, owner_id: Optional[int]):
+    """释放一次分发占用的Job、所有者和全局槽位，holder为分发令牌
+
+    项目或所有者已不存在的Job在分发时同样占用 owner:None 槽位，这里按相同的键释放。
+    """
+    get_job_slot_pool(job_id).release(holder)
+    get_owner_slot_pool(owner_id).release(holder)
+    get_global_slot_pool().release(holder)
+
+def get_job_queue(job: Job, task_type: Optional[str] = None) -> Queue:
+    """根据Job的来源选择执行队列，映射关系见 [queues.routes] 配置
+
+    指定任务类型时，启用异步worker后LLM类任务进入对应的异步队列，见 [async_worker] 配置。
+    """
+    queue_name = resolve_task_queue_name(
+        job.source,
+        task_type,
+        MODEL_CONFIG.get("queues", {}),
+        MODEL_CONFIG.get("async_worker", {})
+    )
+    return task_queues[queue_name]
+
+def get_schedule_request_key(job_id: int) -> str:
+    """Job待执行调度请求的去重键"""
+    return f"tai:schedule:requested:{job_id}"
+
+def enqueue_schedule_job_tasks(job: Job):
+    """将Job的调度请求放入该Job对应的队列
+
+    同一Job已有尚未开始执行的调度请求时不再重复入队，调度器开始扫描时清除该标记，
+    因此扫描期间发生的新事件仍会触发下一次调度。入队失败时同样清除标记，避免后续请求被去重丢弃。
+    """
+    dedupe_seconds = get_scheduler_config().get("schedule_dedupe_seconds", 300)
+    request_key = get_schedule_request_key(job.id)
+    if not redis_conn.set(request_key, 1, nx=True, ex=dedupe_seconds):
+        return None
+    try:
+        return get_job_queue(job).enqueue(schedule_job_tasks, args=(job.id,))
+    except Exception:
+        redis_conn.delete(request_key)
+        raise
+
 def is_allowed_file(filename: str) -> bool:
     """检查文件是否为允许的类型"""
     ext = os.path.splitext(filename)[1].lower()
@@ -104,8 +303,8 @@ def update_job_status(db: Session, job_id: int):
     total_progress = sum(task.progress or 0 for task in tasks) / len(tasks)
     job.progress = int(total_progress)
     
-    # 确定整体状态
-    statuses = [task.status for task in tasks]
+    # 确定整体状态，已分发尚未开始的任务视为处理中
+    statuses = [JobStatus.PROCESSING if task.status == JobStatus.CLAIMED else task.status for task in tasks]
     
     # 如果所有任务都完成
     if all(status == JobStatus.COMPLETED for status in statuses):
@@ -116,8 +315,8 @@ def update_job_status(db: Session, job_id: int):
     # 如果有任务被取消
     elif any(status == JobStatus.CANCELLED for status in statuses):
         job.status = JobStatus.CANCELLED
-    # 如果有任务被暂停，且没有正在处理的任务
-    elif any(status == JobStatus.PAUSED for status in statuses) and not any(status == JobStatus.PROCESSING for status in statuses):
+    # 如果有任务被暂停，且没有正在处理或等待执行的任务（单独暂停某个任务不影响其余任务）
+    elif any(status == JobStatus.PAUSED for status in statuses) and not any(status in [JobStatus.PROCESSING, JobStatus.PENDING] for status in statuses):
         job.status = JobStatus.PAUSED
     # 如果有任务正在处理
     elif any(status == JobStatus.PROCESSING for status in statuses):
@@ -138,41 +337,94 @@ def check_job_task_status(db: Session, job_task: JobTask) -> bool:
         return False
     return True
 
-def execute_task(task_id: int):
-    """执行任务"""
+# 单篇文章流水线的阶段顺序：转换 → LLM处理 → 结构化数据提取
+PIPELINE_STAGE_ORDER = [
+    JobTaskType.CONVERT_TO_MARKDOWN,
+    JobTaskType.PROCESS_WITH_LLM,
+    JobTaskType.EXTRACT_STRUCTURED_DATA,
+]
+
+def link_task_dependencies(tasks):
+    """按文章的流水线阶段顺序为任务设置前置依赖
+
+    同一篇文章的任务按 转换 → LLM处理 → 结构化提取 串成一条链，
+    已显式指定depends_on_id的任务保持不变。调用前任务需要已经flush获得ID。
+    """
+    tasks_by_article = {}
+    for task in tasks:
+        if task.article_id is None:
+            continue
+        tasks_by_article.setdefault(task.article_id, []).append(task)
+
+    def stage_rank(task):
+        if task.task_type in PIPELINE_STAGE_ORDER:
+            return PIPELINE_STAGE_ORDER.index(task.task_type)
+        return len(PIPELINE_STAGE_ORDER)
+
+    for article_tasks in tasks_by_article.values():
+        article_tasks.sort(key=lambda t: (stage_rank(t), t.id))
+        for previous, current in zip(article_tasks, article_tasks[1:]):
+            if current.depends_on_id is None:
+                current.depends_on_id = previous.id
+
+def execute_task(task_id: int, claim_token: Optional[str] = None):
+    """执行任务
+
+    任务只有在处于调度器分发时的CLAIMED状态且令牌一致时才会开始执行，
+    重复入队、过期的分发或已被暂停、取消的任务都不会再次执行。
+    """
     db = SessionLocal()
+    job_id = None
+    owner_id = None
+    owns_slots = False
     try:
         task = db.query(JobTask).filter(JobTask.id == task_id).first()
         if not task:
             raise ValueError(f"找不到任务ID {task_id}")
-            
-        if task.status != JobStatus.PENDING and task.status != JobStatus.PROCESSING:
-            logging.info(f"任务 {task_id} 不处于等待或处理状态，当前状态: {task.status}")
-            return
-        
-        # 更新任务状态为处理中
-        task.status = JobStatus.PROCESSING
+        job_id = task.job_id
+        owner_id = db.query(Project.owner_id).join(Job, Job.project_id == Project.id).filter(Job.id == job_id).scalar()
+            
+        # 原子地将任务从CLAIMED改为PROCESSING，只有一个worker能够成功
+        lease_policy = get_lease_policy(task.task_type, get_scheduler_config())
+        start_query = db.query(JobTask).filter(JobTask.id == task_id, JobTask.status == JobStatus.CLAIMED)
+        if claim_token is not None:
+            start_query = start_query.filter(JobTask.claim_token == claim_token)
+        started = start_query.update({
+            "status": JobStatus.PROCESSING,
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_policy["lease_seconds"]),
+            "attempts": func.coalesce(JobTask.attempts, 0) + 1
+        }, synchronize_session=False)
         db.commit()
-            
-        if task.task_type == JobTaskType.CONVERT_TO_MARKDOWN:
-            convert_to_markdown_task(task.id, task.article_id)
-        elif task.task_type == JobTaskType.PROCESS_WITH_LLM:
-            process_with_llm_task(task.id, task.article_id)
-        elif task.task_type == JobTaskType.PROCESS_UPLOAD:
-            if not task.params or 'file_path' not in task.params or 'project_id' not in task.params:
-                raise ValueError(f"任务缺少必要参数，需要 file_path 和 project_id")
-            process_upload_task(task.id, task.params['file_path'], task.params['project_id'])
-        elif task.task_type == JobTaskType.EXTRACT_STRUCTURED_DATA:
-            extract_structured_data_task(task.id, task.article_id)
-        else:
-            raise ValueError(f"未知的任务类型: {task.task_type}")
-        
-        # 更新job_tasks计数
-        if task.job_id in job_tasks:
-            job_tasks[task.job_id] = max(0, job_tasks[task.job_id] - 1)
+        db.refresh(task)
+        if not started:
+            # 令牌仍是本次分发的说明任务在开始前被暂停或取消，需要释放本次分发占用的槽位
+            owns_slots = claim_token is not None and task.claim_token == claim_token
+            logging.info(f"任务 {task_id} 未处于本次分发的待执行状态，跳过执行，当前状态: {task.status}")
+            return
+        owns_slots = True
         
-        # 任务执行完成后，立即调度下一个任务
-        task_queue.enqueue(schedule_job_tasks, args=(task.job_id,))
+        # 执行期间由心跳线程续约，worker崩溃后租约过期，由回收器处理
+        heartbeat = TaskHeartbeat(
+            lambda: renew_task_lease(task_id, task.claim_token, job_id, owner_id, lease_policy["lease_seconds"]),
+            lease_policy["lease_seconds"] / 3
+        )
+        with heartbeat:
+            if task.task_type == JobTaskType.CONVERT_TO_MARKDOWN:
+                convert_to_markdown_task(task.id, task.article_id)
+            elif task.task_type == JobTaskType.PROCESS_WITH_LLM:
+                process_with_llm_task(task.id, task.article_id)
+            elif task.task_type == JobTaskType.PROCESS_UPLOAD:
+                if not task.params or 'file_path' not in task.params or 'project_id' not in task.params:
+                    raise ValueError(f"任务缺少必要参数，需要 file_path 和 project_id")
+                process_upload_task(task.id, task.params['file_path'], task.params['project_id'])
+            elif task.task_type == JobTaskType.EXTRACT_STRUCTURED_DATA:
+                # 项目级重新提取时一个任务包含多篇文章
+                if task.params and task.params.get('article_ids'):
+                    batch_extract_structured_data_task(task.id, task.params['article_ids'])
+                else:
+                    extract_structured_data_task(task.id, task.article_id)
+            else:
+                raise ValueError(f"未知的任务类型: {task.task_type}")
             
     except Exception as e:
         logging.error(f"执行任务 {task_id} 出错: {str(e)}")
@@ -182,20 +434,119 @@ def execute_task(task_id: int):
             # 追加错误日志而不是覆盖
             task.logs = task.logs + f"\n【错误】执行失败: {str(e)}" if task.logs else f"【错误】执行失败: {str(e)}"
             db.commit()
+        raise
+    finally:
+        db.close()
+        # 任务结束（无论成功或失败）后释放并行槽位，并立即调度后续可执行的任务，不再依赖定时轮询
+        if job_id is not None and owns_slots:
+            release_task_slots(claim_token or str(task_id), job_id, owner_id)
+            schedule_job_tasks(job_id)
+
+def renew_task_lease(task_id: int, claim_token: Optional[str], job_id: int, owner_id: Optional[int], lease_seconds: float) -> bool:
+    """为执行中的任务续约，同时续约其占用的槽位；任务已不属于本次分发时返回False"""
+    db = SessionLocal()
+    try:
+        renewed = db.query(JobTask).filter(
+            JobTask.id == task_id,
+            JobTask.claim_token == claim_token,
+            JobTask.status == JobStatus.PROCESSING
+        ).update({
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    if not renewed:
+        return False
+    holder = claim_token or str(task_id)
+    get_job_slot_pool(job_id).renew(holder)
+    get_owner_slot_pool(owner_id).renew(holder)
+    get_global_slot_pool().renew(holder)
+    metrics.incr("lease.renewed")
+    return True
+
+def reap_expired_task_leases() -> int:
+    """回收租约已过期的任务，按任务类型的策略重新排队或标记失败，返回处理的任务数
+
+    已分发但worker迟迟未开始执行、或执行中的worker崩溃未能续约的任务都会被回收，
+    原分发占用的槽位一并释放，并重新触发所在Job的调度。
+    """
+    db = SessionLocal()
+    reaped_jobs = {}
+    reaped_count = 0
+    try:
+        now = datetime.utcnow()
+        scheduler_config = get_scheduler_config()
+        expired = db.query(JobTask, Job, Project.owner_id).join(
+            Job, JobTask.job_id == Job.id
+        ).outerjoin(
+            Project, Job.project_id == Project.id
+        ).filter(
+            JobTask.status.in_([JobStatus.CLAIMED, JobStatus.PROCESSING]),
+            JobTask.lease_expires_at < now
+        ).all()
         
-        # 更新job_tasks计数
-        if task and task.job_id in job_tasks:
-            job_tasks[task.job_id] = max(0, job_tasks[task.job_id] - 1)
+        for task, job, owner_id in expired:
+            policy = get_lease_policy(task.task_type, scheduler_config)
+            expired_status = task.status
+            expired_token = task.claim_token
+            requeue = policy["on_expire"] == LEASE_REQUEUE and (task.attempts or 0) < policy["max_attempts"]
+            new_status = JobStatus.PENDING if requeue else JobStatus.FAILED
+            
+            # 条件更新，避免与刚刚续约或结束的worker冲突
+            updated = db.query(JobTask).filter(
+                JobTask.id == task.id,
+                JobTask.status == expired_status,
+                JobTask.claim_token == expired_token,
+                JobTask.lease_expires_at < now
+            ).update({
+                "status": new_status,
+                "claim_token": None,
+                "lease_expires_at": None
+            }, synchronize_session=False)
+            if not updated:
+                continue
+            
+            db.refresh(task)
+            stage = "分发后未开始执行" if expired_status == JobStatus.CLAIMED else "执行中的worker失联"
+            if requeue:
+                task.logs = (task.logs or "") + f"【回收】任务租约已过期（{stage}），已执行 {task.attempts or 0} 次，重新排队\n"
+            else:
+                task.logs = (task.logs or "") + f"【回收】任务租约已过期（{stage}），已执行 {task.attempts or 0} 次，按策略标记为失败\n"
+            db.commit()
+            
+            release_task_slots(expired_token or str(task.id), job.id, owner_id)
+            action = "requeued" if requeue else "failed"
+            metrics.incr(f"reaper.{action}")
+            metrics.incr(f"reaper.{action}:{task.task_type.value}")
+            logging.warning(f"回收任务 {task.id}（{task.task_type.value}），租约过期于 {stage}，处理方式: {action}")
+            reaped_jobs[job.id] = job
+            reaped_count += 1
         
-        # 即使任务失败，也调度下一个任务
-        if task:
-            task_queue.enqueue(schedule_job_tasks, args=(task.job_id,))
-        raise
+        for job in reaped_jobs.values():
+            enqueue_schedule_job_tasks(job)
+        return reaped_count
     finally:
         db.close()
 
+def run_lease_reaper() -> int:
+    """执行一轮租约回收，多个worker同时运行时每个周期只有一个执行"""
+    interval = get_scheduler_config().get("leases", {}).get("reaper_interval_seconds", 30)
+    if not redis_conn.set("tai:reaper:lock", 1, nx=True, ex=max(1, int(interval))):
+        return 0
+    return reap_expired_task_leases()
+
 def schedule_job_tasks(job_id: int):
-    """调度Job的所有任务，确保Job内部的任务按严格顺序执行，但允许不同job并行执行"""
+    """更新Job的任务状态，并分发所有Job中前置依赖已满足的任务
+
+    每篇文章的 转换 → LLM处理 → 结构化提取 按依赖顺序执行，不同文章的流水线相互独立。
+    每个Job最多保持parallelism个任务同时执行，跨Job的分发顺序见 dispatch_runnable_tasks。
+
+    调度由事件驱动：任务结束、创建Job以及暂停/恢复/重试等操作时触发一次扫描，
+    不再周期性地重新入队轮询。
+    """
+    # 开始扫描前清除去重标记，扫描期间的新事件可以再次请求调度
+    redis_conn.delete(get_schedule_request_key(job_id))
     db = SessionLocal()
     try:
         # 获取Job信息
@@ -203,77 +554,168 @@ def schedule_job_tasks(job_id: int):
         if not job:
             return
         
-        # 获取作业的并行度设置
-        job_parallelism = job.parallelism or 1
-        
         # 获取所有任务及其状态
-        all_tasks = db.query(JobTask).filter(JobTask.job_id == job_id).all()
+        all_tasks = db.query(JobTask).filter(JobTask.job_id == job_id).order_by(JobTask.id).all()
+        tasks_by_id = {t.id: t for t in all_tasks}
+        
+        # 前置任务失败或取消时，后续任务无法执行，直接标记为取消
+        changed = True
+        while changed:
+            changed = False
+            for t in all_tasks:
+                if t.status != JobStatus.PENDING or t.depends_on_id is None:
+                    continue
+                dependency = tasks_by_id.get(t.depends_on_id)
+                if dependency and dependency.status in [JobStatus.FAILED, JobStatus.CANCELLED]:
+                    t.status = JobStatus.CANCELLED
+                    t.logs = (t.logs or "") + f"【中止】前置任务 {dependency.id} 状态为 {dependency.status.value}，任务未执行\n"
+                    changed = True
+        db.commit()
         
         # 检查当前是否有任务正在处理中
-        processing_tasks = [t for t in all_tasks if t.status == JobStatus.PROCESSING]
+        processing_tasks = [t for t in all_tasks if t.status in [JobStatus.CLAIMED, JobStatus.PROCESSING]]
+        pending_tasks = [t for t in all_tasks if t.status == JobStatus.PENDING]
         
-        # 在单个作业内部仍然保持严格顺序执行的策略
-        if processing_tasks:
-            # 如果有任务正在处理中，等待它完成
-            # 在当前作业内部，保持严格的任务顺序执行
-            print(f"Job {job_id} - 已有任务正在处理中，等待完成")
-            task_queue.enqueue_in(timedelta(seconds=15), schedule_job_tasks, args=(job_id,))
-            return
+        # 已释放的槽位可能属于其他用户的Job，在所有Job之间按公平份额分发
+        dispatch_runnable_tasks(db)
         
-        # 获取所有待处理的任务
-        pending_tasks = [t for t in all_tasks if t.status == JobStatus.PENDING]
-        if not pending_tasks:
-            # 没有待处理的任务，检查任务是否全部完成
+        if not pending_tasks and not processing_tasks:
             if all(t.status in [JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED] for t in all_tasks):
                 # 所有任务都已经完成、失败或取消
                 print(f"Job {job_id} - 所有任务已处理完成")
-                # 更新Job状态
                 update_job_status(db, job_id)
-                # 从job_tasks字典中移除此job
-                if job_id in job_tasks:
-                    del job_tasks[job_id]
-            else:
-                # 可能有暂停的任务，15秒后再检查
-                task_queue.enqueue_in(timedelta(seconds=15), schedule_job_tasks, args=(job_id,))
+            # 否则存在暂停的任务，等待恢复操作重新触发调度
             return
         
-        # 按照任务类型和创建时间排序，确保Markdown转换任务优先执行
-        # 首先，找出所有Markdown转换任务
-        markdown_tasks = [t for t in pending_tasks if t.task_type == JobTaskType.CONVERT_TO_MARKDOWN]
-        other_tasks = [t for t in pending_tasks if t.task_type != JobTaskType.CONVERT_TO_MARKDOWN]
-        
-        # 排序后的任务列表
-        sorted_tasks = markdown_tasks + other_tasks
-        
-        if sorted_tasks:
-            # 每次只执行一个任务，严格按顺序
-            next_task = sorted_tasks[0]
-            
-            # 将任务加入队列
-            task_queue.enqueue(execute_task, args=(next_task.id,))
-            print(f"Job {job_id} - 调度任务 {next_task.id} 类型: {next_task.task_type}")
-            
-            # 更新任务状态
-            next_task.status = JobStatus.PROCESSING
-            db.commit()
-            
-            # 记录此job当前正在执行的任务数
-            job_tasks[job_id] = job_tasks.get(job_id, 0) + 1
-        
-        # 15秒后再次检查
-        task_queue.enqueue_in(timedelta(seconds=15), schedule_job_tasks, args=(job_id,))
-        
         # 检查Job状态统计
         completed_count = sum(1 for t in all_tasks if t.status == JobStatus.COMPLETED)
-        pending_or_processing_count = sum(1 for t in all_tasks if t.status in [JobStatus.PENDING, JobStatus.PROCESSING])
+        pending_or_processing_count = sum(1 for t in all_tasks if t.status in [JobStatus.PENDING, JobStatus.CLAIMED, JobStatus.PROCESSING])
         print(f"Job {job_id} - {completed_count} 已完成, {pending_or_processing_count} 待处理/处理中")
-            
-        db.commit()
     except Exception as e:
         print(f"Error scheduling tasks: {str(e)}")
     finally:
         db.close()
 
+def dispatch_runnable_tasks(db: Session):
+    """在项目所有者之间按角色权重公平地分发可执行任务
+
+    任务需要依次占用全局、所有者和Job三级槽位：全局槽位限制同时执行的任务总数，
+    所有者槽位按角色限制单个用户的并发，Job槽位即Job的并行度。
+    全局槽位不足时优先分发给占用份额最小的所有者，避免单个用户的大批量上传占满所有worker。
+
+    每次分发生成一个令牌作为槽位持有者，并以 PENDING → CLAIMED 的条件更新认领任务，
+    多个调度器同时扫描时同一任务只会被分发一次。
+
+    是否可以执行只看任务自身的状态：暂停Job时其所有未完成的任务都会被暂停，而单独恢复的任务应当照常分发。
+    每个Job最多只读取 min(空闲全局槽位数, Job并行度) 个可执行任务，
+    扫描量与空闲槽位数成正比，而不随积压的任务总数增长。
+    """
+    scheduler_config = get_scheduler_config()
+    global_pool = get_global_slot_pool()
+    free_slots = global_pool.limit - global_pool.in_use()
+    if free_slots <= 0:
+        print(f"全局执行槽位已满 (上限 {global_pool.limit})，等待任务完成后调度")
+        return []
+    
+    # 回退链全部熔断的任务在暂缓期内不分发，也不占用扫描窗口
+    held_task_ids = circuit_breaker.held_task_ids()
+    dependency = aliased(JobTask)
+    runnable = db.query(
+        JobTask.id.label("task_id"),
+        func.row_number().over(partition_by=JobTask.job_id, order_by=JobTask.id).label("position")
+    ).outerjoin(
+        dependency, JobTask.depends_on_id == dependency.id
+    ).filter(
+        JobTask.status == JobStatus.PENDING,
+        or_(JobTask.depends_on_id.is_(None), dependency.status == JobStatus.COMPLETED)
+    )
+    if held_task_ids:
+        runnable = runnable.filter(JobTask.id.notin_(held_task_ids))
+    runnable = runnable.subquery()
+    rows = db.query(JobTask, Job, Project.owner_id, User.role).join(
+        runnable, runnable.c.task_id == JobTask.id
+    ).join(
+        Job, JobTask.job_id == Job.id
+    ).outerjoin(
+        Project, Job.project_id == Project.id
+    ).outerjoin(
+        User, Project.owner_id == User.id
+    ).filter(
+        runnable.c.position <= free_slots,
+        runnable.c.position <= func.coalesce(Job.parallelism, 1)
+    ).order_by(JobTask.id).all()
+    if not rows:
+        return []
+    
+    # 按所有者分组，组内保持任务创建顺序
+    candidates = {}
+    shares = {}
+    owner_pools = {}
+    for task, job, owner_id, role in rows:
+        if owner_id not in shares:
+            policy = get_role_policy(role, scheduler_config)
+            owner_pools[owner_id] = get_owner_slot_pool(owner_id, policy["max_concurrency"])
+            shares[owner_id] = OwnerShare(owner_id, policy["weight"], owner_pools[owner_id].in_use(), task.id)
+        candidates.setdefault(owner_id, []).append((task, job))
+    
+    job_pools = {}
+    dispatched = []
+    while candidates:
+        share = pick_next_owner(shares[owner_id] for owner_id in candidates)
+        task, job = candidates[share.owner_id].pop(0)
+        token = uuid.uuid4().hex
+        
+        if not global_pool.acquire(token):
+            print(f"全局执行槽位已满 (上限 {global_pool.limit})，等待任务完成后调度")
+            break
+        if not owner_pools[share.owner_id].acquire(token):
+            # 该用户已达到角色并发上限，本轮不再为其分发任务
+            global_pool.release(token)
+            del candidates[share.owner_id]
+            continue
+        if job.id not in job_pools:
+            job_pools[job.id] = get_job_slot_pool(job.id, job.parallelism or 1)
+        if not job_pools[job.id].acquire(token):
+            # Job的并行槽位已满，跳过该Job剩余的任务
+            owner_pools[share.owner_id].release(token)
+            global_pool.release(token)
+            candidates[share.owner_id] = [c for c in candidates[share.owner_id] if c[1].id != job.id]
+            print(f"Job {job.id} - 并行槽位已满 (并行度 {job_pools[job.id].limit})，等待任务完成后调度")
+        else:
+            share.in_flight += 1
+            dispatched.append((task, job, share.owner_id, token))
+        
+        if candidates[share.owner_id]:
+            share.first_task_id = candidates[share.owner_id][0][0].id
+        else:
+            del candidates[share.owner_id]
+    
+    # 先认领任务再入队，避免worker在提交前就读取到旧状态；认领失败说明已被其他调度器分发
+    claimed = []
+    for task, job, owner_id, token in dispatched:
+        updated = db.query(JobTask).filter(
+            JobTask.id == task.id,
+            JobTask.status == JobStatus.PENDING
+        ).update({
+            "status": JobStatus.CLAIMED,
+            "claim_token": token,
+            "lease_expires_at": datetime.utcnow() + timedelta(
+                seconds=get_lease_policy(task.task_type, scheduler_config)["claim_timeout_seconds"]
+            )
+        }, synchronize_session=False)
+        if updated:
+            claimed.append((task, job, token))
+        else:
+            release_task_slots(token, job.id, owner_id)
+            metrics.incr("scheduler.claim_conflicts")
+    db.commit()
+    
+    for task, job, token in claimed:
+        db.refresh(task)
+        get_job_queue(job, task.task_type).enqueue(execute_task, args=(task.id, token))
+        print(f"Job {job.id} - 调度任务 {task.id} 类型: {task.task_type}")
+    return [task for task, job, token in claimed]
+
 def convert_to_markdown_task(task_id: int, article_id: int):
     """将文章附件转换为Markdown格式"""
     db = SessionLocal()
@@ -425,23 +867,69 @@ def convert_to_markdown_task(task_id: int, article_id: int):
                         return True
                     
                     task_config['logger'] = log_function
-            
-            # 调用高级转换markdown的时候，同样需要有详细的task log
-            if conversion_type == 'advanced':
-                task.logs += "【详细】开始使用高级转换模式...\n"
-                task.logs += "【详细】上传PDF文件到Mistral OCR服务...\n"
+                    # 图片描述调用同样受模型配额限制，并通过统一的调用入口（支持模拟模型）
+                    task_config['llm_governor'] = llm_governor
+                    task_config['llm_client'] = llm_client
+                    # 重复出现的图片直接使用缓存的描述
+                    task_config['image_description_cache'] = image_description_cache
+                    task_config['image_description_cache_perceptual'] = MODEL_CONFIG.get("image_description_cache", {}).get("perceptual_hash", False)
+            elif conversion_type == 'hybrid' and file_ext.lower() == '.pdf':
+                task.logs += "【信息】使用混合转换模式处理PDF文件，有文本层的页直接提取，仅对扫描页进行OCR\n"
                 db.commit()
+                
+                def log_function(msg):
+                    task.logs += f"【详细】{msg}\n"
+                    db.commit()
+                    return True
+                
+                task_config['logger'] = log_function
+            
+            # 文件内容和转换配置都未变化时直接复用上次的转换结果
+            markdown_text = None
+            use_conversion_cache = task_config.get('use_conversion_cache', True)
+            if use_conversion_cache:
+                file_hash = file_content_hash(file_path)
+                cache_config = conversion_cache_config(conversion_type, file_ext, task_config)
+                conversion_key = make_conversion_cache_key(file_hash, cache_config)
+                markdown_text = get_cached_conversion(db, conversion_key)
+                if markdown_text is not None:
+                    task.logs += f"【缓存】命中文档转换缓存，跳过转换，字符长度: {len(markdown_text)}\n"
+                    db.commit()
             
-            # 调用转换函数
-            markdown_text = convert_file_to_markdown(file_path, conversion_type, task_config)
+            if markdown_text is None:
+                # 调用高级转换markdown的时候，同样需要有详细的task log
+                if conversion_type == 'advanced':
+                    task.logs += "【详细】开始使用高级转换模式...\n"
+                    task.logs += "【详细】上传PDF文件到Mistral OCR服务...\n"
+                    db.commit()
             
-            # 如果是高级转换模式，添加更多详细日志
-            if conversion_type == 'advanced' and file_ext.lower() == '.pdf':
-                task.logs += "【详细】PDF文件OCR处理完成\n"
-                if task_config.get('enable_image_description', True):
-                    task.logs += "【详细】正在生成图片描述...\n"
-                    task.logs += f"【详细】使用模型 {task_config.get('image_description_model', 'lm_studio/qwen2.5-vl-7b-instruct')} 进行图片描述\n"
-                db.commit()
+                # 调用转换函数
+                markdown_text = convert_file_to_markdown(file_path, conversion_type, task_config)
+            
+                # 如果是高级转换模式，添加更多详细日志
+                if conversion_type == 'advanced' and file_ext.lower() == '.pdf':
+                    task.logs += "【详细】PDF文件OCR处理完成\n"
+                    if task_config.get('enable_image_description', True):
+                        task.logs += "【详细】正在生成图片描述...\n"
+                        task.logs += f"【详细】使用模型 {task_config.get('image_description_model', 'lm_studio/qwen2.5-vl-7b-instruct')} 进行图片描述\n"
+                    db.commit()
+                
+                # 高级转换失败回退到简单转换、或有图片描述失败时不缓存，下次重新转换
+                if task_config.get('advanced_conversion_error'):
+                    task.logs += f"【警告】高级转换失败，已回退到简单转换: {task_config['advanced_conversion_error']}\n"
+                    db.commit()
+                elif task_config.get('ocr_error'):
+                    task.logs += f"【警告】扫描页OCR失败，这些页没有文本: {task_config['ocr_error']}\n"
+                    db.commit()
+                elif task_config.get('ocr_engine') and use_conversion_cache and task_config['ocr_engine'] != cache_config.get('ocr_engine'):
+                    # 首选引擎失败后由备用引擎识别的结果不写入首选引擎的缓存
+                    task.logs += f"【警告】扫描页改由 {task_config['ocr_engine']} 识别，本次结果不缓存\n"
+                    db.commit()
+                elif use_conversion_cache and "[图片描述失败" not in markdown_text and "[图片处理错误" not in markdown_text:
+                    save_conversion(
+                        db, conversion_key, file_hash, cache_config, markdown_text,
+                        max_size_mb=MODEL_CONFIG.get("conversion_cache", {}).get("max_size_mb", 512)
+                    )
             
             task.progress = 80
             task.logs += "【处理】文件转换完成，正在保存结果...\n"
@@ -504,6 +992,80 @@ def convert_to_markdown_task(task_id: int, article_id: int):
     finally:
         db.close()
 
+def complete_fused_extraction_tasks(db: Session, task: JobTask) -> int:
+    """融合模式已得到结构化数据时，直接完成依赖该审阅任务且尚未开始的结构化提取任务"""
+    return db.query(JobTask).filter(
+        JobTask.depends_on_id == task.id,
+        JobTask.task_type == JobTaskType.EXTRACT_STRUCTURED_DATA,
+        JobTask.status == JobStatus.PENDING
+    ).update({
+        JobTask.status: JobStatus.COMPLETED,
+        JobTask.progress: 100,
+        JobTask.logs: "【融合】结构化数据已在审阅时提取，无需单独调用模型\n"
+    }, synchronize_session=False)
+
+def review_chunks_concurrently(db: Session, task: JobTask, model: str, chunks, task_config: dict, temperature: float, usage: LLMUsage):
+    """并发审阅各片段（map阶段），按片段顺序返回审阅笔记，任务被暂停或取消时返回None
+
+    模型调用在线程池中执行，数据库会话只在当前线程中使用。
+    """
+    map_max_tokens = task_config.get('map_max_tokens', 800)
+    models = get_model_chain_for_task('process_with_llm', model, task_config)
+    fan_out = max(1, int(task_config.get('map_fan_out', 4)))
+    total = len(chunks)
+
+    def review_chunk(index):
+        messages = build_map_messages(chunks[index], index + 1, total, task_config.get('map_prompt'))
+        messages, prompt_tokens, _ = apply_token_budget(model, messages, task_config)
+        waits = {}
+
+        def open_call(candidate):
+            with circuit_breaker.admit(candidate) as guarded, llm_governor.acquire(candidate, prompt_tokens + map_max_tokens) as permit:
+                waits[candidate] = permit.wait_seconds
+                yield guarded.call(
+                    usage.completion,
+                    llm_client,
+                    candidate,
+                    messages,
+                    prompt_tokens,
+                    temperature=temperature,
+                    max_tokens=map_max_tokens
+                )
+
+        # 分段笔记只在出错时回退，不做对冲，避免成倍增加调用量
+        call = HedgedCall(models, open_call, on_attempt=lambda candidate, reason: metrics.incr(f"llm.attempt.{reason}:{candidate}"))
+        response = next(iter(call))
+        return response.choices[0].message.content or "", waits
+
+    notes = [None] * total
+    executor = ThreadPoolExecutor(max_workers=min(fan_out, total), thread_name_prefix="review-map")
+    try:
+        futures = {executor.submit(review_chunk, i): i for i in range(total)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            notes[index], waits = future.result()
+            log_governor_waits(task, waits)
+            task.logs += f"【分段】第{index + 1}/{total}部分审阅完成，笔记长度: {len(notes[index])}字符\n"
+            task.progress = 40 + int(40 * done / total)
+            db.commit()
+            if not check_job_task_status(db, task):
+                return None
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return notes
+
+# 影响审阅输出的任务配置，与模型和消息一起作为响应缓存键的一部分
+REVIEW_CACHE_CONFIG_KEYS = (
+    "review_mode",
+    "chunk_max_tokens",
+    "map_max_tokens",
+    "map_prompt",
+    "reduce_prompt",
+    "max_prompt_tokens",
+    "over_budget_policy",
+    "fused_extraction",
+)
+
 def process_with_llm_task(task_id: int, article_id: int):
     """处理文章内容并生成AI审阅报告"""
     db = SessionLocal()
@@ -620,6 +1182,9 @@ def process_with_llm_task(task_id: int, article_id: int):
             task.logs += f"【警告】指定模型 {old_model} 不可用，切换为: {model}\n"
             db.commit()
         
+        if hold_task_for_open_circuits(db, task, get_model_chain_for_task('process_with_llm', model, task_config)):
+            return
+        
         task.logs += "【处理】开始调用大语言模型处理内容...\n"
         task.progress = 40
         db.commit()
@@ -627,6 +1192,17 @@ def process_with_llm_task(task_id: int, article_id: int):
         # 构建评审提示词
         system_prompt = task_config.get('prompt', """请对以下文档内容进行专业审阅：""")
         
+        # 融合模式下要求模型在报告末尾按提取格式输出结构化数据
+        fused_extraction = task_config.get('fused_extraction', False)
+        if fused_extraction:
+            extraction_config = get_task_config('extract_structured_data', project.config)
+            system_prompt = build_fused_prompt(
+                system_prompt,
+                extraction_config.get('extraction_prompt') or DEFAULT_EXTRACTION_PROMPT
+            )
+            task.logs += "【融合】审阅时同时输出结构化数据\n"
+            db.commit()
+        
         try:
             # 更新AI审阅报告状态为处理中
             ai_review.status = "processing"
@@ -634,49 +1210,99 @@ def process_with_llm_task(task_id: int, article_id: int):
             
             # 调用AI模型生成审阅报告
             ai_review_content = ""  # 初始化审阅内容
-            chunks = []  # 存储所有的响应块
-            
-            task.logs += "【处理】开始流式调用大语言模型...\n"
-            db.commit()
+
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": markdown_text}
+            ]
+            temperature = task_config.get('temperature', 0.7)
+            max_tokens = task_config.get('max_tokens', 4000)
             
-            # 设置累计字符阈值
-            accumulated_chars = 0
-            commit_threshold = 20  # 每累计20个字符提交一次
-
-            # 使用流式API
-            response = completion(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": markdown_text}
-                ],
-                temperature=task_config.get('temperature', 0.7),
-                max_tokens=task_config.get('max_tokens', 4000),
-                stream=True
+            # 相同模型、输入和审阅方式（分段、融合等配置）的审阅结果可直接复用
+            cache_key = make_cache_key(
+                model, messages, temperature, max_tokens,
+                options={key: task_config.get(key) for key in REVIEW_CACHE_CONFIG_KEYS}
             )
-            
-            # 处理流式响应
-            for chunk in response:
-                # 将块添加到集合中
-                chunks.append(chunk)
+            cached_content = llm_cache.get(cache_key) if task_config.get('use_response_cache', True) else None
+            usage = LLMUsage()
+            
+            if cached_content is not None:
+                ai_review_content = cached_content
+                ai_review.review_content = ai_review_content
+                ai_review.source_data = ai_review_content
+                task.logs += f"【缓存】命中模型响应缓存，跳过模型调用，字符长度: {len(ai_review_content)}\n"
+                db.commit()
+            else:
+                # 超出单次请求预算的长文档先分段审阅，再汇总生成报告
+                chunks = plan_review_chunks(markdown_text, task_config)
+                if len(chunks) > 1:
+                    task.logs += f"【分段】文档较长，分为 {len(chunks)} 部分并发审阅\n"
+                    db.commit()
+                    notes = review_chunks_concurrently(db, task, model, chunks, task_config, temperature, usage)
+                    if notes is None:
+                        task.logs += "【中止】任务已暂停或取消\n"
+                        db.commit()
+                        return
+                    messages = build_reduce_messages(system_prompt, notes, task_config.get('reduce_prompt'))
+                    task.logs += "【分段】开始汇总各部分审阅笔记\n"
                 
-                # 提取当前块的内容
-                content = ""
-                if hasattr(chunk.choices[0], "delta") and hasattr(chunk.choices[0].delta, "content"):
-                    content = chunk.choices[0].delta.content or ""
+                # 调用前检查提示词预算，超出时按项目策略截断或拒绝
+                messages, prompt_tokens, truncated = apply_token_budget(model, messages, task_config)
+                if truncated:
+                    task.logs += f"【预算】提示词超出预算 {task_config.get('max_prompt_tokens')} token，已截断\n"
+                task.logs += f"【预算】提示词约 {prompt_tokens} token\n"
+                task.logs += "【处理】开始流式调用大语言模型...\n"
+                db.commit()
                 
-                # 累积内容
-                if content:
-                    ai_review_content += content
-                    accumulated_chars += len(content)
-                    # 更新数据库和日志
-                    ai_review.review_content = ai_review_content
-                    ai_review.source_data = ai_review_content
-                    task.logs = task.logs + f"【更新】收到内容: {len(content)}字符\n"
-                    # 当累计字符数达到阈值时提交
-                    if accumulated_chars >= commit_threshold:
-                        db.commit()
-                        accumulated_chars = 0  # 重置累计字符数
+                # 流式输出按时间或大小阈值合并，只追加增量
+                writer = StreamFlushWriter(
+                    db,
+                    ai_review.id,
+                    task.id,
+                    flush_interval_ms=task_config.get('stream_flush_interval_ms', 500),
+                    flush_bytes=task_config.get('stream_flush_bytes', 2048)
+                )
+                writer.reset()
+                
+                # 在模型的速率和并发配额内调用，流式响应需在配额内读取完毕；熔断的模型直接换用回退链上的下一个
+                waits = {}
+                def open_stream(candidate):
+                    with circuit_breaker.admit(candidate) as guarded, llm_governor.acquire(candidate, prompt_tokens + max_tokens) as permit:
+                        waits[candidate] = permit.wait_seconds
+                        yield from guarded.watch(usage.stream(
+                            llm_client,
+                            candidate,
+                            messages,
+                            prompt_tokens,
+                            temperature=temperature,
+                            max_tokens=max_tokens
+                        ))
+                
+                # 主模型出错时按回退链换用下一个模型，迟迟没有首个token时发起对冲请求
+                response = HedgedCall(
+                    get_model_chain_for_task('process_with_llm', model, task_config),
+                    open_stream,
+                    hedge_after_seconds=task_config.get('hedge_after_seconds'),
+                    is_first_token=chunk_has_content,
+                    on_attempt=make_attempt_logger(db, task)
+                ).start()
+                log_governor_waits(task, waits)
+                task.logs += f"【模型】由 {response.model} 生成审阅内容\n"
+                metrics.incr(f"llm.won:{response.model}")
+                db.commit()
+                
+                # 处理流式响应
+                for chunk in response:
+                    # 提取当前块的内容
+                    if hasattr(chunk.choices[0], "delta") and hasattr(chunk.choices[0].delta, "content"):
+                        writer.append(chunk.choices[0].delta.content or "")
+                
+                writer.flush()
+                ai_review_content = writer.content
+                
+                # 完整读取的响应写入缓存，回退模型的结果不作为主模型的缓存
+                if task_config.get('use_response_cache', True) and response.model == model:
+                    llm_cache.put(cache_key, model, ai_review_content)
             
             # 最终提交
             db.commit()
@@ -687,11 +1313,38 @@ def process_with_llm_task(task_id: int, article_id: int):
                 db.commit()
                 return
                 
+            # 融合模式下拆出报告末尾的结构化数据，解析失败时交给后续的结构化提取任务
+            fused_data = None
+            if fused_extraction:
+                ai_review_content, trailer = split_fused_output(ai_review_content)
+                if trailer is not None:
+                    fused_data, parse_error = parse_structured_data(trailer)
+                    if parse_error or not isinstance(fused_data, dict):
+                        task.logs += f"【融合】结构化数据解析失败，将由提取任务处理: {parse_error or '格式不是键值对'}\n"
+                        fused_data = None
+                else:
+                    task.logs += "【融合】模型未输出结构化数据，将由提取任务处理\n"
+            
             # 确保最终状态是正确的
             ai_review.review_content = ai_review_content
             ai_review.source_data = ai_review_content
+            # 与单独的提取任务相同的优先级：启用规则提取时规则确定的字段优先，其余字段取自融合输出
+            if fused_data is not None:
+                extraction_config = get_task_config('extract_structured_data', project.config)
+                rule_data = {}
+                if extraction_config.get('rule_extraction_enabled', True):
+                    rule_data, _ = extract_with_rules(ai_review_content, get_extraction_rules(db, project, extraction_config))
+                ai_review.structured_data = merge_structured_data(fused_data, rule_data)
+                skipped = complete_fused_extraction_tasks(db, task)
+                task.logs += f"【融合】结构化数据已保存: {', '.join(ai_review.structured_data)}，跳过 {skipped} 个提取任务\n"
             # 更新AI审阅报告状态为已完成
             ai_review.status = "completed"
+            usage.save_to(task, ai_review)
+            if usage.calls:
+                task.logs += (
+                    f"【用量】{usage.calls} 次调用，提示词 {usage.prompt_tokens} token，输出 {usage.completion_tokens} token，"
+                    f"首个token {usage.time_to_first_token_ms} 毫秒，总耗时 {usage.latency_ms} 毫秒\n"
+                )
             
             # 更新文章的active_ai_review_report_id
             article.active_ai_review_report_id = ai_review.id
@@ -810,117 +1463,87 @@ def process_upload_task(task_id: int, file_path: str, project_id: int):
             task.logs += "【警告】未找到可处理的文件，请检查上传内容是否符合要求\n"
         db.commit()
         
-        for index, (root, file) in enumerate(all_files):
-            print(f"Processing file {index + 1}/{total_files}: {file}")
-            task.logs += f"【处理】({index + 1}/{total_files}) 开始处理文件: {file}\n"
+        # 所有文件共用一个批阅Job，文章和流水线任务按批写入，每批只提交一次
+        upload_config = get_task_config(JobTaskType.PROCESS_UPLOAD, project.config or {})
+        batch_size = max(1, int(upload_config.get("batch_size", 200)))
+        review_job = None
+        if project.auto_approve and total_files > 0:
+            review_job = Job(
+                project_id=project_id,
+                name=f"Auto Review for {job.name}",
+                status=JobStatus.PENDING,
+                progress=0,
+                logs="",
+                parallelism=max(1, int(upload_config.get("review_parallelism", 8))),
+                source=SOURCE_AUTO_REVIEW
+            )
+            db.add(review_job)
+            db.flush()
+            task.logs += f"【信息】项目已开启自动批阅，所有文件共用批阅任务，任务ID: {review_job.id}\n"
             db.commit()
+        
+        from fastapi.encoders import jsonable_encoder
+        for batch_start in range(0, total_files, batch_size):
+            batch = all_files[batch_start:batch_start + batch_size]
+            batch_end = batch_start + len(batch)
+            print(f"Processing files {batch_start + 1}-{batch_end}/{total_files}")
             
             # 检查任务状态
             if not check_job_task_status(db, task):
                 task.logs += "【中止】任务已暂停或取消\n"
                 db.commit()
                 return
-                
-            # 获取project对应的article_type_id
-            project = db.query(Project).filter(Project.id == project_id).first()
-            if not project:
-                error_msg = f"错误：找不到项目ID {project_id}"
-                task.logs += f"【错误】{error_msg}\n"
-                raise Exception(error_msg)
-
-            # 创建article
-            file_path = os.path.join(root, file)
-            from fastapi.encoders import jsonable_encoder
-            
-            attachments = [{
-                "path": file_path,
-                "is_active": True,  # 默认第一个附件为active
-                "filename": file,
-                "created_at": datetime.utcnow().isoformat()
-            }]
-            
-            db_article = Article(
-                name=file,
-                attachments=jsonable_encoder(attachments),
-                article_type_id=project.article_type_id,
-                project_id=project_id
-            )
-            db.add(db_article)
-            db.commit()
-            db.refresh(db_article)
-            
-            task.logs += f"【信息】创建文档记录成功，文档ID: {db_article.id}\n"
-            db.commit()
             
-            # 如果项目设置了自动批阅，则为新文章创建批阅任务
-            if project.auto_approve:
-                task.logs += "【信息】项目已开启自动批阅，创建自动批阅任务...\n"
-                db.commit()
-                
-                # 创建一个新的Job
-                review_job = Job(
-                    project_id=project_id,
-                    name=f"Auto Review for {file}",
-                    status=JobStatus.PENDING,
-                    progress=0,
-                    logs="",
-                    parallelism=1
-                )
-                db.add(review_job)
-                db.commit()
-                db.refresh(review_job)
-                
-                # 创建convert_to_markdown任务
-                convert_task = JobTask(
-                    job_id=review_job.id,
-                    task_type=JobTaskType.CONVERT_TO_MARKDOWN,
-                    status=JobStatus.PENDING,
-                    progress=0,
-                    logs="",
-                    article_id=db_article.id
-                )
-                db.add(convert_task)
-                
-                # 创建process_with_llm任务
-                llm_task = JobTask(
-                    job_id=review_job.id,
-                    task_type=JobTaskType.PROCESS_WITH_LLM,
-                    status=JobStatus.PENDING,
-                    progress=0,
-                    logs="",
-                    article_id=db_article.id
-                )
-                db.add(llm_task)
-                
-                # 创建结构化数据提取任务
-                extract_task = JobTask(
-                    job_id=review_job.id,
-                    task_type=JobTaskType.EXTRACT_STRUCTURED_DATA,
-                    status=JobStatus.PENDING,
-                    progress=0,
-                    logs="",
-                    article_id=db_article.id
-                )
-                db.add(extract_task)
-                
-                db.commit()
-                
-                # 调度任务
-                task_queue.enqueue(
-                    schedule_job_tasks,
-                    args=(review_job.id,)
+            # 创建article
+            created_at = datetime.utcnow().isoformat()
+            articles = [
+                Article(
+                    name=file,
+                    attachments=jsonable_encoder([{
+                        "path": os.path.join(root, file),
+                        "is_active": True,  # 默认第一个附件为active
+                        "filename": file,
+                        "created_at": created_at
+                    }]),
+                    article_type_id=project.article_type_id,
+                    project_id=project_id
                 )
-                
-                task.logs += f"【信息】自动批阅任务已创建，任务ID: {review_job.id}\n"
-                db.commit()
-                
-                print(f"Auto review job {review_job.id} created for article {db_article.id}")
+                for root, file in batch
+            ]
+            db.add_all(articles)
+            db.flush()
+            
+            # 如果项目设置了自动批阅，则为新文章创建批阅流水线任务
+            if review_job is not None:
+                pipeline_tasks = [
+                    JobTask(
+                        job_id=review_job.id,
+                        task_type=task_type,
+                        status=JobStatus.PENDING,
+                        progress=0,
+                        logs="",
+                        article_id=article.id
+                    )
+                    for article in articles
+                    for task_type in PIPELINE_STAGE_ORDER
+                ]
+                db.add_all(pipeline_tasks)
+                # 设置任务之间的前置依赖
+                db.flush()
+                link_task_dependencies(pipeline_tasks)
             
             # 更新进度
-            progress = int((index + 1) / total_files * 100)
+            progress = int(batch_end / total_files * 100)
             task.progress = progress
+            task.logs += f"【处理】({batch_start + 1}-{batch_end}/{total_files}) 创建文档记录成功，文档ID: {articles[0].id}-{articles[-1].id}\n"
             task.logs += f"【进度】处理进度更新为 {progress}%\n"
             db.commit()
+            
+            # 第一批写入后立即开始批阅，中间批次的任务由任务完成事件触发调度，
+            # 最后一批写入后再调度一次，防止此前的任务已全部结束而无人触发
+            if review_job is not None and (batch_start == 0 or batch_end == total_files):
+                enqueue_schedule_job_tasks(review_job)
+                print(f"Auto review job {review_job.id} scheduled for upload task {task_id}")
         
         # 最后检查一次任务状态
         if not check_job_task_status(db, task):
@@ -957,6 +1580,71 @@ def get_model_details(model_id):
             return model
     return {"id": model_id, "name": model_id, "description": ""}
 
+DEFAULT_EXTRACTION_PROMPT = """请从以下审阅报告中提取结构化数据，以YAML格式返回。
+若报告中包含评价等级，请提取；若包含最终评分，请提取；若包含其他关键量化指标，也请一并提取。
+
+使用以下YAML格式：
+
+```yaml
+final_score: 分数值
+grade: 评价等级
+# 其他可能的量化指标
+```
+"""
+
+def build_extraction_system_prompt(extraction_prompt: str) -> str:
+    """结构化提取的系统提示词"""
+    return f"你是一个数据提取助手，擅长从文本中提取结构化数据。请根据给定的格式提取数据，并以YAML格式返回。在后面用户会给出报告的内容。\n{extraction_prompt}"
+
+def build_extraction_messages(extraction_prompt: str, review_content: str):
+    """构建单篇报告的结构化提取消息"""
+    return [
+        {"role": "system", "content": build_extraction_system_prompt(extraction_prompt)},
+        {"role": "user", "content": review_content}
+    ]
+
+def parse_structured_data(content: str):
+    """解析模型返回的YAML，返回 (结构化数据, 解析错误)，解析失败时保留原始文本"""
+    # 从YAML内容中提取```yaml和```之间的内容
+    match = re.search(r"```(?:yaml)?\n(.*?)```", content, re.DOTALL)
+    if match:
+        content = match.group(1)
+    try:
+        return yaml.safe_load(content), None
+    except Exception as e:
+        return {"raw_text": content}, str(e)
+
+def call_extraction_model(db: Session, task: JobTask, model: str, messages, prompt_tokens: int, max_tokens: int, task_config: dict, usage: LLMUsage):
+    """在模型回退链上调用结构化提取，返回 (模型输出, 胜出的模型)"""
+    temperature = task_config.get('temperature', 0.7)
+
+    waits = {}
+
+    def open_call(candidate):
+        with circuit_breaker.admit(candidate) as guarded, llm_governor.acquire(candidate, prompt_tokens + max_tokens) as permit:
+            waits[candidate] = permit.wait_seconds
+            yield guarded.call(
+                usage.completion,
+                llm_client,
+                candidate,
+                messages,
+                prompt_tokens,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+
+    # 主模型出错时换用回退链上的下一个模型；非流式请求发出后无法中途取消，落败的对冲请求仍会完整执行并消耗token，因此不做对冲
+    call = HedgedCall(
+        get_model_chain_for_task('extract_structured_data', model, task_config),
+        open_call,
+        on_attempt=make_attempt_logger(db, task)
+    ).start()
+    response = next(iter(call))
+    log_governor_waits(task, waits)
+    task.logs += f"【模型】由 {call.model} 完成结构化数据提取\n"
+    metrics.incr(f"llm.won:{call.model}")
+    return response.choices[0].message.content or "", call.model
+
 def extract_structured_data_task(task_id: int, article_id: int):
     """从AI审阅的结果中提取结构化数据"""
     db = SessionLocal()
@@ -1043,22 +1731,28 @@ def extract_structured_data_task(task_id: int, article_id: int):
         # 获取任务特定的配置
         task_config = get_task_config('extract_structured_data', project.config)
         
+        # 先按规则提取，规则能确定所有字段时不再调用模型
+        rule_data, missing_fields = {}, []
+        if task_config.get('rule_extraction_enabled', True):
+            rule_data, missing_fields = extract_with_rules(review_content, get_extraction_rules(db, project, task_config))
+            if rule_data and not missing_fields:
+                ai_review.structured_data = rule_data
+                task.status = JobStatus.COMPLETED
+                task.progress = 100
+                task.logs += f"【规则】按规则提取到全部字段: {', '.join(rule_data)}，跳过模型调用\n"
+                task.logs += "【完成】结构化数据提取成功！\n"
+                db.commit()
+                return
+            if rule_data:
+                task.logs += f"【规则】按规则提取到 {', '.join(rule_data)}，其余字段 {', '.join(missing_fields)} 交给模型提取\n"
+                db.commit()
+        
         # 从配置中获取提取提示词
         extraction_prompt = task_config.get('extraction_prompt', "")
         
         # 如果提取提示词为空，使用默认的提示词
         if not extraction_prompt:
-            extraction_prompt = """请从以下审阅报告中提取结构化数据，以YAML格式返回。
-若报告中包含评价等级，请提取；若包含最终评分，请提取；若包含其他关键量化指标，也请一并提取。
-
-使用以下YAML格式：
-
-```yaml
-final_score: 分数值
-grade: 评价等级
-# 其他可能的量化指标
-```
-"""
+            extraction_prompt = DEFAULT_EXTRACTION_PROMPT
             task.logs += "【信息】使用默认的结构化数据提取提示词\n"
         else:
             task.logs += "【信息】使用配置中的结构化数据提取提示词\n"
@@ -1082,53 +1776,61 @@ grade: 评价等级
                 task.logs += f"【警告】指定模型 {old_model} 不可用，切换为: {model}\n"
                 db.commit()
             
+            if hold_task_for_open_circuits(db, task, get_model_chain_for_task('extract_structured_data', model, task_config)):
+                return
+            
             task.logs += "【处理】开始调用大语言模型提取结构化数据...\n"
             task.progress = 40
             db.commit()
                 
             # 使用AI模型提取结构化数据
-            messages = [
-                    {"role": "system", "content": f"你是一个数据提取助手，擅长从文本中提取结构化数据。请根据给定的格式提取数据，并以YAML格式返回。在后面用户会给出报告的内容。\n{extraction_prompt}"},
-                    {"role": "user", "content": review_content}
-            ]
+            messages = build_extraction_messages(extraction_prompt, review_content)
 
             db.commit()
 
-            response = completion(
-                model=model,
-                messages=messages,
-                temperature=task_config.get('temperature', 0.7),
-                max_tokens=task_config.get('max_tokens', 4000)
-            )
-            
-            # 最终提交
-            db.commit()
+            temperature = task_config.get('temperature', 0.7)
+            max_tokens = task_config.get('max_tokens', 4000)
             
-            task.logs += "【信息】AI模型响应完成，保存审阅报告...\n"
-            task.progress = 80
-            db.commit()
+            # 相同审阅内容和提取提示词的结果可直接复用
+            use_cache = task_config.get('use_response_cache', True)
+            cache_key = make_cache_key(model, messages, temperature, max_tokens)
+            yaml_content = llm_cache.get(cache_key) if use_cache else None
+            usage = LLMUsage()
             
-            yaml_content = response.choices[0].message.content
+            if yaml_content is not None:
+                task.logs += f"【缓存】命中模型响应缓存，跳过模型调用，字符长度: {len(yaml_content)}\n"
+                db.commit()
+            else:
+                # 调用前检查提示词预算，超出时按项目策略截断或拒绝
+                messages, prompt_tokens, truncated = apply_token_budget(model, messages, task_config)
+                if truncated:
+                    task.logs += f"【预算】提示词超出预算 {task_config.get('max_prompt_tokens')} token，已截断\n"
+                yaml_content, won_model = call_extraction_model(
+                    db, task, model, messages, prompt_tokens, max_tokens, task_config, usage
+                )
+                
+                # 最终提交
+                db.commit()
+                
+                task.logs += "【信息】AI模型响应完成，保存审阅报告...\n"
+                task.progress = 80
+                db.commit()
+                
+                if use_cache and won_model == model:
+                    llm_cache.put(cache_key, model, yaml_content)
             
             task.logs += "【信息】模型响应完成，准备解析结构化数据...\n"
             task.progress = 70
             db.commit()
             
-            # 从YAML内容中提取```yaml和```之间的内容
-            yaml_pattern = r"```(?:yaml)?\n(.*?)```"
-            match = re.search(yaml_pattern, yaml_content, re.DOTALL)
-            if match:
-                yaml_content = match.group(1)
-            
-            # 将YAML字符串解析为Python字典
-            try:
-                structured_data_dict = yaml.safe_load(yaml_content)
-            except Exception as e:
-                task.logs += f"【警告】YAML解析失败：{str(e)}，将尝试使用原始文本\n"
-                structured_data_dict = {"raw_text": yaml_content}
+            structured_data_dict, parse_error = parse_structured_data(yaml_content)
+            if parse_error:
+                task.logs += f"【警告】YAML解析失败：{parse_error}，将尝试使用原始文本\n"
+            structured_data_dict = merge_structured_data(structured_data_dict, rule_data)
             
             # 保存结构化数据（确保是字典格式）
             ai_review.structured_data = structured_data_dict
+            usage.save_to(task, ai_review, accumulate_report=True)
             db.commit()
             
             task.logs += "【信息】结构化数据已保存\n"
@@ -1164,6 +1866,215 @@ grade: 评价等级
     finally:
         db.close()
 
+def get_extraction_rules(db: Session, project: Project, task_config: dict):
+    """获取结构化提取规则：项目配置优先，其次为文章类型配置，都未配置时使用内置规则"""
+    if task_config.get('extraction_rules') is not None:
+        return task_config['extraction_rules']
+    article_type = db.query(ArticleType).filter(ArticleType.id == project.article_type_id).first()
+    if article_type and article_type.config:
+        rules = article_type.config.get("tasks", {}).get("extract_structured_data", {}).get("extraction_rules")
+        if rules is not None:
+            return rules
+    return None
+
+def find_review_for_extraction(db: Session, article_id: int) -> Optional[AIReviewReport]:
+    """查找用于结构化提取的审阅报告：优先文章的活跃报告，否则取最新的报告"""
+    article = db.query(Article).filter(Article.id == article_id).first()
+    if not article:
+        return None
+    ai_review = None
+    if article.active_ai_review_report_id:
+        ai_review = db.query(AIReviewReport).filter(
+            AIReviewReport.id == article.active_ai_review_report_id
+        ).first()
+    if not ai_review:
+        ai_review = db.query(AIReviewReport).filter(
+            AIReviewReport.article_id == article_id
+        ).order_by(AIReviewReport.created_at.desc()).first()
+    return ai_review
+
+def batch_extract_structured_data_task(task_id: int, article_ids):
+    """在一次模型调用中为多篇文章提取结构化数据
+
+    先复用单篇提取的缓存，其余报告打包为一次请求；批量请求失败、结果中缺少或无法解析的文章逐篇重新提取。
+    仍有文章未能提取时，已提取的文章照常保存，任务标记为失败并在日志中列出这些文章。
+    """
+    db = SessionLocal()
+    task = None
+    try:
+        task = db.query(JobTask).filter(JobTask.id == task_id).first()
+        if not task:
+            raise Exception("Task not found")
+
+        task.status = JobStatus.PROCESSING
+        task.progress = 0
+        task.logs = f"【开始】开始批量提取 {len(article_ids)} 篇文章的结构化数据...\n"
+        db.commit()
+
+        job = db.query(Job).filter(Job.id == task.job_id).first()
+        project = db.query(Project).filter(Project.id == job.project_id).first() if job else None
+        if not project:
+            error_msg = "错误：找不到项目信息"
+            task.logs += f"【错误】{error_msg}\n"
+            raise Exception(error_msg)
+
+        task_config = get_task_config('extract_structured_data', project.config)
+        extraction_prompt = task_config.get('extraction_prompt') or DEFAULT_EXTRACTION_PROMPT
+        model = task_config.get('model') or get_default_model_for_task('extract_structured_data')
+        available_models = get_available_models_for_task('extract_structured_data')
+        if available_models and model not in available_models:
+            task.logs += f"【警告】指定模型 {model} 不可用，切换为: {available_models[0]}\n"
+            model = available_models[0]
+        temperature = task_config.get('temperature', 0.7)
+        max_tokens = task_config.get('max_tokens', 4000)
+        use_cache = task_config.get('use_response_cache', True)
+        usage = LLMUsage()
+        task.logs += f"【信息】使用模型: {model}\n"
+        db.commit()
+
+        # 收集各文章的审阅报告
+        reviews = {}
+        for article_id in article_ids:
+            ai_review = find_review_for_extraction(db, article_id)
+            if ai_review and ai_review.source_data:
+                reviews[article_id] = ai_review
+            else:
+                task.logs += f"【警告】文章 {article_id} 没有审阅报告内容，跳过\n"
+
+        # 先按规则提取，规则确定全部字段的文章不再调用模型
+        rule_results = {}
+        completed_by_rules = {}
+        if task_config.get('rule_extraction_enabled', True):
+            rules = get_extraction_rules(db, project, task_config)
+            for article_id, ai_review in reviews.items():
+                rule_data, missing_fields = extract_with_rules(ai_review.source_data, rules)
+                if rule_data and not missing_fields:
+                    completed_by_rules[article_id] = rule_data
+                elif rule_data:
+                    rule_results[article_id] = rule_data
+            for article_id, rule_data in completed_by_rules.items():
+                reviews[article_id].structured_data = rule_data
+            if completed_by_rules:
+                task.logs += f"【规则】{len(completed_by_rules)} 篇文章按规则提取到全部字段，跳过模型调用\n"
+
+        # 与单篇提取使用相同的缓存键，命中的文章不再调用模型
+        results = {}
+        cache_keys = {}
+        for article_id, ai_review in reviews.items():
+            if article_id in completed_by_rules:
+                continue
+            messages = build_extraction_messages(extraction_prompt, ai_review.source_data)
+            cache_keys[article_id] = make_cache_key(model, messages, temperature, max_tokens)
+            cached = llm_cache.get(cache_keys[article_id]) if use_cache else None
+            if cached is not None:
+                results[article_id] = cached
+        pending = [article_id for article_id in reviews if article_id not in results and article_id not in completed_by_rules]
+        if results:
+            task.logs += f"【缓存】{len(results)} 篇文章命中模型响应缓存\n"
+        task.progress = 10
+        db.commit()
+
+        if pending and hold_task_for_open_circuits(db, task, get_model_chain_for_task('extract_structured_data', model, task_config)):
+            return
+
+        retry_ids = pending
+        if len(pending) > 1:
+            try:
+                messages = build_batch_extraction_messages(
+                    build_extraction_system_prompt(extraction_prompt),
+                    [(article_id, reviews[article_id].source_data) for article_id in pending]
+                )
+                # 批量请求不截断，超出预算时直接改为逐篇提取
+                messages, prompt_tokens, _ = apply_token_budget(model, messages, dict(task_config, over_budget_policy=POLICY_REFUSE))
+                task.logs += f"【批量】{len(pending)} 篇文章合并为一次请求，提示词约 {prompt_tokens} token\n"
+                db.commit()
+                content, won_model = call_extraction_model(
+                    db, task, model, messages, prompt_tokens,
+                    task_config.get('batch_max_tokens', max_tokens), task_config, usage
+                )
+                batch_results = split_batch_response(content, pending)
+                unparsed_ids = []
+                for article_id, item in batch_results.items():
+                    if parse_structured_data(item)[1]:
+                        unparsed_ids.append(article_id)
+                        continue
+                    results[article_id] = item
+                    if use_cache and won_model == model:
+                        llm_cache.put(cache_keys[article_id], model, item)
+                retry_ids = [article_id for article_id in pending if article_id not in results]
+                missing_count = len(retry_ids) - len(unparsed_ids)
+                if missing_count:
+                    task.logs += f"【警告】批量结果中缺少 {missing_count} 篇文章，改为逐篇提取\n"
+                if unparsed_ids:
+                    task.logs += f"【警告】批量结果中 {len(unparsed_ids)} 篇文章的YAML无法解析（文章ID: {', '.join(map(str, unparsed_ids))}），改为逐篇提取\n"
+            except Exception as e:
+                task.logs += f"【警告】批量提取失败: {str(e)}，改为逐篇提取\n"
+            task.progress = 50
+            db.commit()
+
+        failed_ids = []
+        for done, article_id in enumerate(retry_ids, start=1):
+            if not check_job_task_status(db, task):
+                task.logs += "【中止】任务已暂停或取消\n"
+                db.commit()
+                return
+            try:
+                messages = build_extraction_messages(extraction_prompt, reviews[article_id].source_data)
+                messages, prompt_tokens, _ = apply_token_budget(model, messages, task_config)
+                content, won_model = call_extraction_model(
+                    db, task, model, messages, prompt_tokens, max_tokens, task_config, usage
+                )
+                results[article_id] = content
+                if use_cache and won_model == model:
+                    llm_cache.put(cache_keys[article_id], model, content)
+            except Exception as e:
+                failed_ids.append(article_id)
+                task.logs += f"【错误】文章 {article_id} 提取失败: {str(e)}\n"
+            task.progress = 50 + int(40 * done / len(retry_ids))
+            db.commit()
+
+        # 保存各文章的结构化数据，模型提取失败的文章保留规则提取到的部分字段
+        for article_id in failed_ids:
+            if article_id in rule_results:
+                reviews[article_id].structured_data = rule_results[article_id]
+        unparsed_ids = []
+        for article_id, content in results.items():
+            structured_data, parse_error = parse_structured_data(content)
+            if parse_error:
+                unparsed_ids.append(article_id)
+                task.logs += f"【警告】文章 {article_id} 的YAML解析失败：{parse_error}，将使用原始文本\n"
+            reviews[article_id].structured_data = merge_structured_data(structured_data, rule_results.get(article_id, {}))
+        usage.save_to(task)
+        db.commit()
+
+        if not check_job_task_status(db, task):
+            task.logs += "【中止】任务已暂停或取消\n"
+            db.commit()
+            return
+
+        # 部分文章没有得到结构化数据时任务失败，便于用户发现并重试；已提取的文章不受影响
+        incomplete_ids = failed_ids + unparsed_ids
+        if incomplete_ids:
+            saved_count = len(results) + len(completed_by_rules) - len(unparsed_ids)
+            raise Exception(
+                f"{len(incomplete_ids)} 篇文章未能提取结构化数据（文章ID: {', '.join(map(str, incomplete_ids))}），"
+                f"其余 {saved_count} 篇已保存"
+            )
+        task.status = JobStatus.COMPLETED
+        task.progress = 100
+        task.logs += f"【完成】已保存 {len(results) + len(completed_by_rules)} 篇文章的结构化数据\n"
+        db.commit()
+
+    except Exception as e:
+        print(f"Error extracting structured data in batch: {str(e)}")
+        if task:
+            task.status = JobStatus.FAILED
+            task.logs += f"【错误】批量提取失败: {str(e)}\n"
+            db.commit()
+        raise
+    finally:
+        db.close()
+
 # 获取完整的模型配置
 def get_model_config():
     """获取完整的模型配置"""
@@ -0,0 +1,193 @@
+"""模型调用的token预算和用量统计
+
+调用前估算提示词的token数，超出项目配置的预算时按策略截断或拒绝，避免请求在模型端
+才失败；调用后记录实际的提示词和输出token数、首个token的等待时间和总耗时，
+保存到JobTask和AIReviewReport上用于项目级的用量统计。
+
+在任务配置（可被项目配置覆盖）中设置：
+    max_prompt_tokens   提示词的token上限，0表示不限制
+    over_budget_policy  超出上限时的处理：truncate 截断最后一条用户消息；refuse 拒绝调用
+"""
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from litellm import token_counter
+
+from .llm_governor import estimate_message_tokens, estimate_text_tokens
+
+POLICY_TRUNCATE = "truncate"
+POLICY_REFUSE = "refuse"
+
+TRUNCATION_NOTICE = "\n\n（内容超出模型输入预算，以下部分已截断）"
+
+class TokenBudgetExceeded(Exception):
+    """提示词超出token预算且策略为拒绝"""
+    pass
+
+def count_message_tokens(model: str, messages: List[Dict]) -> int:
+    """计算消息的token数，无法使用分词器时退回粗略估算"""
+    try:
+        return token_counter(model=model, messages=messages)
+    except Exception:
+        return estimate_message_tokens(messages)
+
+def count_text_tokens(model: str, text: str) -> int:
+    """计算文本的token数，无法使用分词器时退回粗略估算"""
+    if not text:
+        return 0
+    try:
+        return token_counter(model=model, text=text)
+    except Exception:
+        return estimate_text_tokens(text)
+
+def apply_token_budget(model: str, messages: List[Dict], task_config: Dict) -> Tuple[List[Dict], int, bool]:
+    """按任务配置的预算检查提示词
+
+    Returns:
+        (可发送的消息, 提示词token数, 是否被截断)
+
+    Raises:
+        TokenBudgetExceeded: 超出预算且策略为refuse，或截断后仍无法满足预算
+    """
+    prompt_tokens = count_message_tokens(model, messages)
+    limit = int(task_config.get("max_prompt_tokens") or 0)
+    if limit <= 0 or prompt_tokens <= limit:
+        return messages, prompt_tokens, False
+
+    policy = task_config.get("over_budget_policy", POLICY_TRUNCATE)
+    if policy != POLICY_TRUNCATE:
+        raise TokenBudgetExceeded(f"提示词约 {prompt_tokens} token，超出预算 {limit} token")
+
+    # 只截断最后一条用户消息，系统提示词中的评审要求保持完整
+    index = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=None)
+    if index is None or not isinstance(messages[index].get("content"), str):
+        raise TokenBudgetExceeded(f"提示词约 {prompt_tokens} token，超出预算 {limit} token且无法截断")
+    content = messages[index]["content"]
+    other_tokens = prompt_tokens - count_text_tokens(model, content)
+    available = limit - other_tokens - count_text_tokens(model, TRUNCATION_NOTICE)
+    if available <= 0:
+        raise TokenBudgetExceeded(f"提示词中不可截断的部分已超出预算 {limit} token")
+
+    # 按比例截断，分词结果与字符数不成严格比例，超出时继续缩短
+    keep = int(len(content) * available / max(1, prompt_tokens - other_tokens))
+    while True:
+        truncated = list(messages)
+        truncated[index] = dict(messages[index], content=content[:keep] + TRUNCATION_NOTICE)
+        prompt_tokens = count_message_tokens(model, truncated)
+        if prompt_tokens <= limit or keep == 0:
+            return truncated, prompt_tokens, True
+        keep = int(keep * 0.9)
+
+class LLMUsage:
+    """累计一个任务中所有模型调用的用量
+
+    首个token时间从第一次调用开始计到第一个输出token到达，总耗时从第一次调用开始计到
+    最后一次调用结束；map阶段的并发调用在线程中记录，因此需要加锁。
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.calls = 0
+        self._started_at: Optional[float] = None
+        self._first_token_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            if self._started_at is None:
+                self._started_at = now
+        return now
+
+    def _first_token(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._first_token_at is None:
+                self._first_token_at = now
+
+    def _finish(self, prompt_tokens: int, completion_tokens: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.calls += 1
+            self._finished_at = max(self._finished_at or now, now)
+
+    @staticmethod
+    def _reported(usage, field: str) -> Optional[int]:
+        value = getattr(usage, field, None) if usage is not None else None
+        return value if isinstance(value, int) else None
+
+    def completion(self, client, model: str, messages: List[Dict], prompt_tokens: Optional[int] = None, **kwargs):
+        """调用非流式接口并记录用量，优先使用模型返回的usage"""
+        self._start()
+        response = client.completion(model=model, messages=messages, **kwargs)
+        self._first_token()
+        usage = getattr(response, "usage", None)
+        content = response.choices[0].message.content or ""
+        self._finish(
+            self._reported(usage, "prompt_tokens") or prompt_tokens or count_message_tokens(model, messages),
+            self._reported(usage, "completion_tokens") or count_text_tokens(model, content)
+        )
+        return response
+
+    def stream(self, client, model: str, messages: List[Dict], prompt_tokens: Optional[int] = None, **kwargs) -> Iterable:
+        """调用流式接口并在读取完毕后记录用量
+
+        返回的生成器逐块产出响应，流中带有usage时使用模型报告的数值，否则按输出内容计数。
+        """
+        self._start()
+        response = client.completion(model=model, messages=messages, stream=True, **kwargs)
+        parts = []
+        usage = None
+        for chunk in response:
+            usage = getattr(chunk, "usage", None) or usage
+            delta = getattr(chunk.choices[0], "delta", None) if chunk.choices else None
+            content = getattr(delta, "content", None)
+            if isinstance(content, str) and content:
+                self._first_token()
+                parts.append(content)
+            yield chunk
+        self._finish(
+            self._reported(usage, "prompt_tokens") or prompt_tokens or count_message_tokens(model, messages),
+            self._reported(usage, "completion_tokens") or count_text_tokens(model, "".join(parts))
+        )
+
+    @property
+    def time_to_first_token_ms(self) -> Optional[int]:
+        if self._started_at is None or self._first_token_at is None:
+            return None
+        return int((self._first_token_at - self._started_at) * 1000)
+
+    @property
+    def latency_ms(self) -> Optional[int]:
+        if self._started_at is None or self._finished_at is None:
+            return None
+        return int((self._finished_at - self._started_at) * 1000)
+
+    def save_to(self, task, report=None, accumulate_report: bool = False) -> None:
+        """把用量写到任务和审阅报告上
+
+        Args:
+            task: 写入用量的JobTask
+            report: 同时写入的AIReviewReport
+            accumulate_report: 为True时token数累加到报告已有的用量上（如结构化提取），
+                首个token时间和总耗时只记录审阅任务的数值
+        """
+        task.prompt_tokens = self.prompt_tokens
+        task.completion_tokens = self.completion_tokens
+        task.time_to_first_token_ms = self.time_to_first_token_ms
+        task.llm_latency_ms = self.latency_ms
+        if report is None:
+            return
+        if accumulate_report:
+            report.prompt_tokens = (report.prompt_tokens or 0) + self.prompt_tokens
+            report.completion_tokens = (report.completion_tokens or 0) + self.completion_tokens
+        else:
+            report.prompt_tokens = self.prompt_tokens
+            report.completion_tokens = self.completion_tokens
+            report.time_to_first_token_ms = self.time_to_first_token_ms
+            report.llm_latency_ms = self.latency_ms
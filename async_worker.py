@@ -0,0 +1,42 @@
+import os
+import signal
+import asyncio
+from sqlalchemy import create_engine
+from app.database import SessionLocal, SQLALCHEMY_DATABASE_URL
+from app.tasks import redis_conn, task_queues, MODEL_CONFIG, llm_client
+from app.queues import ASYNC_QUEUE_NAMES, get_queue_weights
+from app.async_worker import AsyncTaskWorker
+
+# 设置MacOS上的fork安全环境变量
+os.environ['OBJC_DISABLE_INITIALIZE_FORK_SAFETY'] = 'YES'
+
+# 只监听LLM类任务的异步队列，出队顺序与进程型worker一样按权重轮转
+listen = ASYNC_QUEUE_NAMES
+
+async def main():
+    async_config = MODEL_CONFIG.get("async_worker", {})
+    concurrency = async_config.get("concurrency", 32)
+
+    # 每个执行中的任务会同时持有多个数据库会话，连接池需要随并发数扩大
+    SessionLocal.configure(bind=create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args={"check_same_thread": False, "timeout": 30},
+        pool_size=concurrency * 2,
+        max_overflow=concurrency
+    ))
+
+    worker = AsyncTaskWorker(
+        [task_queues[name] for name in listen],
+        connection=redis_conn,
+        llm_client=llm_client,
+        concurrency=concurrency,
+        weights=get_queue_weights(MODEL_CONFIG.get("queues", {})),
+        dequeue_timeout=async_config.get("dequeue_timeout_seconds", 5)
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.request_stop)
+    await worker.run()
+
+if __name__ == '__main__':
+    asyncio.run(main())
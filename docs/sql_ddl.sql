@@ -57,6 +57,10 @@ CREATE TABLE ai_review_reports (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     status VARCHAR DEFAULT 'pending',  -- pending, processing, completed, failed
     structured_data JSON,  -- 结构化的数据
+    prompt_tokens INTEGER,  -- 审阅和结构化提取消耗的提示词token数
+    completion_tokens INTEGER,  -- 审阅和结构化提取消耗的输出token数
+    time_to_first_token_ms INTEGER,  -- 审阅时首个输出token的等待时间（毫秒）
+    llm_latency_ms INTEGER,  -- 审阅的模型调用总耗时（毫秒）
     FOREIGN KEY (article_id) REFERENCES articles (id),
     FOREIGN KEY (job_id) REFERENCES jobs (id)
 );
@@ -71,6 +75,7 @@ CREATE TABLE jobs (
     progress INTEGER,
     logs TEXT,
     parallelism INTEGER DEFAULT 1,  -- 并行度设置
+    source VARCHAR DEFAULT 'api',  -- 任务来源，决定使用的优先级队列
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (project_id) REFERENCES projects (id)
@@ -81,15 +86,38 @@ CREATE TABLE job_tasks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     job_id INTEGER NOT NULL,
     task_type VARCHAR NOT NULL,  -- process_upload, convert_to_markdown, process_with_llm, process_ai_review, extract_structured_data
-    status VARCHAR NOT NULL,  -- pending, processing, paused, completed, failed, cancelled
+    status VARCHAR NOT NULL,  -- pending, claimed, processing, paused, completed, failed, cancelled
     progress INTEGER,
     logs TEXT,
     article_id INTEGER,
     params JSON,  -- 存储任务参数
+    depends_on_id INTEGER,  -- 前置任务ID
+    claim_token VARCHAR,  -- 最近一次分发的令牌
+    lease_expires_at TIMESTAMP,  -- 租约到期时间
+    attempts INTEGER DEFAULT 0,  -- 已开始执行的次数
+    prompt_tokens INTEGER,  -- 模型调用消耗的提示词token数
+    completion_tokens INTEGER,  -- 模型调用消耗的输出token数
+    time_to_first_token_ms INTEGER,  -- 首个输出token的等待时间（毫秒）
+    llm_latency_ms INTEGER,  -- 模型调用总耗时（毫秒）
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (job_id) REFERENCES jobs (id),
-    FOREIGN KEY (article_id) REFERENCES articles (id)
+    FOREIGN KEY (article_id) REFERENCES articles (id),
+    FOREIGN KEY (depends_on_id) REFERENCES job_tasks (id)
+);
+
+-- 创建文档转换缓存表
+CREATE TABLE conversion_cache (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cache_key VARCHAR NOT NULL UNIQUE,  -- 文件内容哈希、转换类型和相关配置的哈希
+    file_hash VARCHAR NOT NULL,  -- 文件内容的SHA-256
+    conversion_type VARCHAR NOT NULL,  -- simple, advanced, hybrid
+    config JSON,  -- 参与缓存键计算的转换配置
+    markdown TEXT NOT NULL,
+    size INTEGER NOT NULL,  -- Markdown的字节数
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP  -- 最近一次写入或命中的时间，按此淘汰
 );
 
 -- 添加索引以优化查询性能
@@ -109,4 +137,6 @@ CREATE INDEX idx_jobs_status ON jobs (status);
 CREATE INDEX idx_job_tasks_job_id ON job_tasks (job_id);
 CREATE INDEX idx_job_tasks_article_id ON job_tasks (article_id);
 CREATE INDEX idx_job_tasks_status ON job_tasks (status);
-CREATE INDEX idx_job_tasks_task_type ON job_tasks (task_type); 
\ No newline at end of file
+CREATE INDEX idx_job_tasks_task_type ON job_tasks (task_type); 
+CREATE INDEX idx_job_tasks_depends_on_id ON job_tasks (depends_on_id);
+CREATE INDEX idx_conversion_cache_file_hash ON conversion_cache (file_hash);
@@ -121,6 +121,7 @@ const ArticleTypeConfigForm = ({
             >
               <Select.Option value="simple">简单模式（默认）</Select.Option>
               <Select.Option value="advanced">高级模式（支持OCR和图片描述）</Select.Option>
+              <Select.Option value="hybrid">混合模式（仅对扫描页OCR）</Select.Option>
             </Select>
           </Form.Item>
           
@@ -189,6 +189,7 @@ const Jobs = () => {
   const getStatusTag = (status) => {
     const statusMap = {
       pending: { text: '等待中', color: 'gold' },
+      claimed: { text: '已分发', color: 'cyan' },
       processing: { text: '运行中', color: 'blue' },
       completed: { text: '已完成', color: 'green' },
       failed: { text: '失败', color: 'red' },
@@ -294,7 +295,7 @@ const Jobs = () => {
                 重试
               </Button>
             )}
-            {task.status === 'processing' && (
+            {(task.status === 'claimed' || task.status === 'processing') && (
               <Button
                 type="link"
                 size="small"
@@ -320,7 +321,7 @@ const Jobs = () => {
                 启动
               </Button>
             )}
-            {(task.status === 'pending' || task.status === 'processing' || task.status === 'paused') && (
+            {(task.status === 'pending' || task.status === 'claimed' || task.status === 'processing' || task.status === 'paused') && (
               <Button
                 type="link"
                 size="small"
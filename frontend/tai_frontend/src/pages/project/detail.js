@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { Card, Table, Button, Input, Form, Upload, Tabs, Space, Switch, Alert, Divider, Collapse, Select, InputNumber } from 'antd';
-import { UploadOutlined, EyeOutlined, DeleteOutlined, DownloadOutlined } from '@ant-design/icons';
+import { UploadOutlined, EyeOutlined, DeleteOutlined, DownloadOutlined, SyncOutlined } from '@ant-design/icons';
 import { message, App } from 'antd';
 import request from '../../utils/request';
 import config from '../../config';
@@ -303,6 +303,7 @@ const ProjectDetail = () => {
               >
                 <Select.Option value="simple">简单模式（默认）</Select.Option>
                 <Select.Option value="advanced">高级模式（支持OCR和图片描述）</Select.Option>
+                <Select.Option value="hybrid">混合模式（仅对扫描页OCR）</Select.Option>
               </Select>
             </Form.Item>
             
@@ -606,6 +607,17 @@ const ProjectDetail = () => {
     }
   };
 
+  // 重新提取项目中所有文章的结构化数据
+  const handleReExtractAll = async () => {
+    try {
+      await request.post(`/projects/${id}/re-extract-structured-data`);
+      messageApi.success('已创建重新提取任务，可在任务管理中查看进度');
+    } catch (error) {
+      console.error('重新提取结构化数据失败:', error);
+      messageApi.error('重新提取结构化数据失败');
+    }
+  };
+
   const items = [
     {
       key: '1',
@@ -619,6 +631,13 @@ const ProjectDetail = () => {
               </Button>
             </Upload>
             <Space>
+              <Button
+                icon={<SyncOutlined />}
+                onClick={handleReExtractAll}
+                disabled={articles.length === 0}
+              >
+                重新提取全部
+              </Button>
               <Button
                 icon={<DownloadOutlined />}
                 onClick={() => handleExportCSV(true)}
@@ -0,0 +1 @@
+OBJC_DISABLE_INITIALIZE_FORK_SAFETY=YES python async_worker.py
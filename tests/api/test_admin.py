@@ -0,0 +1,67 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+@pytest.mark.api
+class TestAdminAPI:
+    """系统管理API测试类"""
+
+    @patch("app.tasks.metrics.snapshot")
+    def test_get_metrics(self, mock_snapshot, client: TestClient, admin_token_headers):
+        """测试管理员查看运行指标"""
+        mock_snapshot.return_value = {"reaper.requeued": 2, "reaper.requeued:process_with_llm": 2}
+
+        response = client.get("/admin/metrics", headers=admin_token_headers)
+
+        assert response.status_code == 200
+        assert response.json()["reaper.requeued"] == 2
+
+    def test_get_metrics_requires_admin(self, client: TestClient, user_token_headers):
+        """测试普通用户无法查看运行指标"""
+        response = client.get("/admin/metrics", headers=user_token_headers)
+        assert response.status_code == 403
+
+    @patch("app.tasks.circuit_breaker.snapshot")
+    def test_get_circuit_breakers(self, mock_snapshot, client: TestClient, admin_token_headers):
+        """测试管理员查看模型熔断状态"""
+        mock_snapshot.return_value = [{"model_id": "deepseek/deepseek-chat", "state": "open", "retry_after_seconds": 42.0}]
+
+        response = client.get("/admin/circuit-breakers", headers=admin_token_headers)
+
+        assert response.status_code == 200
+        assert response.json()[0]["state"] == "open"
+        # 配置中声明的模型都会列出
+        assert "deepseek/deepseek-chat" in mock_snapshot.call_args[0][0]
+
+    def test_get_circuit_breakers_requires_admin(self, client: TestClient, user_token_headers):
+        """测试普通用户无法查看熔断状态"""
+        response = client.get("/admin/circuit-breakers", headers=user_token_headers)
+        assert response.status_code == 403
+
+    def test_invalidate_conversion_cache(self, client: TestClient, admin_token_headers, db, test_article, tmp_path):
+        """测试按文章失效和清空文档转换缓存"""
+        from app import models
+        from app.conversion_cache import file_content_hash, save_conversion
+        attachment = tmp_path / "thesis.txt"
+        attachment.write_text("正文", encoding="utf-8")
+        test_article.attachments = [{"path": str(attachment), "is_active": True}]
+        db.commit()
+        save_conversion(db, "k1", file_content_hash(str(attachment)), {"conversion_type": "simple"}, "# 正文")
+        save_conversion(db, "k2", "other", {"conversion_type": "simple"}, "# 其他")
+
+        response = client.get("/admin/conversion-cache", headers=admin_token_headers)
+        assert response.status_code == 200
+        assert response.json()["entries"] == 2
+
+        response = client.delete(f"/admin/conversion-cache?article_id={test_article.id}", headers=admin_token_headers)
+        assert response.status_code == 200
+        assert response.json() == {"deleted": 1}
+
+        response = client.delete("/admin/conversion-cache", headers=admin_token_headers)
+        assert response.json() == {"deleted": 1}
+        assert db.query(models.ConversionCacheEntry).count() == 0
+
+    def test_invalidate_conversion_cache_requires_admin(self, client: TestClient, user_token_headers):
+        """测试普通用户无法清空文档转换缓存"""
+        response = client.delete("/admin/conversion-cache", headers=user_token_headers)
+        assert response.status_code == 403
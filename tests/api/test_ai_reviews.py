@@ -23,7 +23,7 @@ def test_ai_review(db, test_article):
 class TestAIReviewAPI:
     """AI审阅API测试类"""
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_create_article_review(self, mock_enqueue, client: TestClient, user_token_headers, test_article):
         """测试创建文章审阅任务"""
         response = client.post(
@@ -38,7 +38,7 @@ class TestAIReviewAPI:
         # 验证任务是否入队
         assert mock_enqueue.called
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_extract_article_structured_data(self, mock_enqueue, client: TestClient, user_token_headers, test_article, test_ai_review):
         """测试提取文章结构化数据"""
         response = client.post(
@@ -53,6 +53,40 @@ class TestAIReviewAPI:
         # 验证任务是否入队
         assert mock_enqueue.called
     
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    def test_re_extract_project_structured_data(self, mock_enqueue, client: TestClient, user_token_headers, db, test_project, test_article, test_ai_review):
+        """测试项目级重新提取把有审阅报告的文章合并为批量任务"""
+        from app import models
+        other = models.Article(name="另一篇文章", attachments=[], project_id=test_project.id)
+        no_review = models.Article(name="未审阅文章", attachments=[], project_id=test_project.id)
+        db.add_all([other, no_review])
+        db.commit()
+        db.add(models.AIReviewReport(article_id=other.id, source_data="另一份报告", status="completed"))
+        db.commit()
+
+        response = client.post(
+            f"/projects/{test_project.id}/re-extract-structured-data",
+            headers=user_token_headers
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "pending"
+        assert len(data["tasks"]) == 1
+        assert data["tasks"][0]["task_type"] == "extract_structured_data"
+        assert data["tasks"][0]["params"] == {"article_ids": [test_article.id, other.id]}
+        assert mock_enqueue.called
+
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    def test_re_extract_project_without_reviews(self, mock_enqueue, client: TestClient, user_token_headers, test_project, test_article):
+        """测试项目中没有审阅报告时拒绝重新提取"""
+        response = client.post(
+            f"/projects/{test_project.id}/re-extract-structured-data",
+            headers=user_token_headers
+        )
+        assert response.status_code == 400
+        assert not mock_enqueue.called
+
     def test_create_ai_review(self, client: TestClient, user_token_headers, test_article):
         """测试直接创建AI审阅报告"""
         response = client.post(
@@ -38,7 +38,7 @@ def test_job(db, test_project):
 class TestJobAPI:
     """任务API测试类"""
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_create_job(self, mock_enqueue, client: TestClient, user_token_headers, test_project):
         """测试创建任务"""
         response = client.post(
@@ -101,7 +101,7 @@ class TestJobAPI:
         
         assert response.status_code == 404
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_job_action(self, mock_enqueue, client: TestClient, user_token_headers, test_job):
         """测试任务操作(暂停/恢复/取消/重试)"""
         # 测试暂停
@@ -114,6 +114,7 @@ class TestJobAPI:
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == JobStatus.PAUSED.value
+        assert all(task["status"] == JobStatus.PAUSED.value for task in data["tasks"])
         
         # 测试恢复
         response = client.post(
@@ -126,6 +127,64 @@ class TestJobAPI:
         data = response.json()
         assert data["status"] == JobStatus.PENDING.value
     
+    def test_pause_job_pauses_every_active_task(self, client: TestClient, user_token_headers, test_job, db):
+        """测试暂停Job时暂停所有待执行、已分发和执行中的任务，已完成的任务保持不变"""
+        from app import models
+        statuses = [JobStatus.CLAIMED, JobStatus.PROCESSING, JobStatus.COMPLETED]
+        db.add_all([
+            models.JobTask(job_id=test_job.id, task_type=JobTaskType.PROCESS_WITH_LLM, status=status, progress=0)
+            for status in statuses
+        ])
+        db.commit()
+
+        response = client.post(
+            f"/jobs/{test_job.id}/action",
+            json={"action": JobAction.PAUSE.value},
+            headers=user_token_headers
+        )
+
+        assert response.status_code == 200
+        task_statuses = sorted(task["status"] for task in response.json()["tasks"])
+        assert task_statuses == sorted([JobStatus.PAUSED.value] * 3 + [JobStatus.COMPLETED.value])
+    
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    @patch("app.tasks.circuit_breaker")
+    @patch("app.tasks.get_job_queue")
+    @patch("app.tasks.SlotPool")
+    def test_resume_single_task_after_job_pause(self, mock_slot_pool, mock_get_queue, mock_circuit_breaker,
+                                                mock_enqueue, client: TestClient, user_token_headers, test_job, db):
+        """测试暂停Job后单独恢复的任务会被调度器分发，其余任务保持暂停"""
+        from app import models, tasks
+        db.add(models.JobTask(job_id=test_job.id, task_type=JobTaskType.PROCESS_AI_REVIEW, status=JobStatus.PENDING, progress=0))
+        db.commit()
+        mock_slot_pool.return_value.limit = 8
+        mock_slot_pool.return_value.in_use.return_value = 0
+        mock_slot_pool.return_value.acquire.return_value = True
+        mock_circuit_breaker.held_task_ids.return_value = set()
+
+        response = client.post(
+            f"/jobs/{test_job.id}/action",
+            json={"action": JobAction.PAUSE.value},
+            headers=user_token_headers
+        )
+        assert response.status_code == 200
+        first_id, second_id = sorted(task["id"] for task in response.json()["tasks"])
+
+        response = client.post(
+            f"/jobs/{test_job.id}/tasks/{first_id}/action",
+            json={"action": JobAction.RESUME.value},
+            headers=user_token_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["status"] != JobStatus.PAUSED.value
+
+        dispatched = tasks.dispatch_runnable_tasks(db)
+        assert [task.id for task in dispatched] == [first_id]
+        task_id, _ = mock_get_queue.return_value.enqueue.call_args.kwargs["args"]
+        assert task_id == first_id
+        db.expire_all()
+        assert db.query(models.JobTask).filter(models.JobTask.id == second_id).one().status == JobStatus.PAUSED
+    
     def test_get_job_tasks(self, client: TestClient, user_token_headers, test_job):
         """测试获取任务下的子任务列表"""
         response = client.get(f"/jobs/{test_job.id}/tasks", headers=user_token_headers)
@@ -150,7 +209,7 @@ class TestJobAPI:
         assert data["id"] == task_id
         assert data["job_id"] == test_job.id
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_update_job(self, mock_enqueue, client: TestClient, user_token_headers, test_job):
         """测试更新任务"""
         response = client.put(
@@ -163,7 +222,7 @@ class TestJobAPI:
         data = response.json()
         assert data["name"] == "更新后的任务名称"
     
-    @patch("app.main.task_queue.enqueue")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
     def test_cancel_all_jobs(self, mock_enqueue, client: TestClient, user_token_headers, test_job):
         """测试取消所有任务"""
         response = client.post("/jobs/cancel-all", headers=user_token_headers)
@@ -138,4 +138,34 @@ class TestProjectAPI:
         assert response.status_code == 200
         assert response.headers["Content-Type"] == "text/csv; charset=utf-8"
         assert "attachment; filename=" in response.headers["Content-Disposition"]
-    
\ No newline at end of file
+    
+    def test_project_llm_usage(self, client: TestClient, user_token_headers, db, test_project, test_article):
+        """测试按任务类型汇总项目的模型用量"""
+        from app import models
+        from app.schemas import JobStatus, JobTaskType
+        job = models.Job(project_id=test_project.id, name="审阅", status=JobStatus.COMPLETED)
+        db.add(job)
+        db.commit()
+        db.add_all([
+            models.JobTask(job_id=job.id, article_id=test_article.id, task_type=JobTaskType.PROCESS_WITH_LLM, status=JobStatus.COMPLETED,
+                           prompt_tokens=1000, completion_tokens=500, time_to_first_token_ms=300, llm_latency_ms=9000),
+            models.JobTask(job_id=job.id, article_id=test_article.id, task_type=JobTaskType.PROCESS_WITH_LLM, status=JobStatus.COMPLETED,
+                           prompt_tokens=2000, completion_tokens=700, time_to_first_token_ms=500, llm_latency_ms=11000),
+            models.JobTask(job_id=job.id, article_id=test_article.id, task_type=JobTaskType.EXTRACT_STRUCTURED_DATA, status=JobStatus.COMPLETED,
+                           prompt_tokens=600, completion_tokens=50, time_to_first_token_ms=2000, llm_latency_ms=2000),
+            models.JobTask(job_id=job.id, article_id=test_article.id, task_type=JobTaskType.CONVERT_TO_MARKDOWN, status=JobStatus.COMPLETED)
+        ])
+        db.commit()
+
+        response = client.get(f"/projects/{test_project.id}/llm-usage", headers=user_token_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["prompt_tokens"] == 3600
+        assert data["completion_tokens"] == 1250
+        assert data["total_tokens"] == 4850
+        usage = {item["task_type"]: item for item in data["by_task_type"]}
+        assert set(usage) == {"process_with_llm", "extract_structured_data"}
+        assert usage["process_with_llm"]["task_count"] == 2
+        assert usage["process_with_llm"]["avg_time_to_first_token_ms"] == 400
+        assert usage["process_with_llm"]["avg_latency_ms"] == 10000
@@ -0,0 +1,56 @@
+import time
+import asyncio
+import threading
+import pytest
+from unittest.mock import MagicMock
+from app.async_worker import AsyncTaskWorker
+from app.llm_client import LLMClient
+
+def _queue(name):
+    queue = MagicMock()
+    queue.name = name
+    return queue
+
+@pytest.mark.unit
+class TestAsyncTaskWorker:
+    """异步worker测试"""
+
+    def test_runs_tasks_concurrently(self):
+        """测试多个等待模型响应的任务在同一进程中并发执行"""
+        client = LLMClient()
+        worker = AsyncTaskWorker([_queue("async-high"), _queue("async-bulk")], MagicMock(), client, concurrency=4)
+
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0, "done": 0}
+
+        def perform():
+            # 执行期间LLM调用入口已绑定到worker的事件循环
+            assert client.is_async
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.2)
+            with lock:
+                state["running"] -= 1
+                state["done"] += 1
+
+        jobs = []
+        for i in range(8):
+            job = MagicMock()
+            job.perform.side_effect = perform
+            jobs.append((job, _queue("async-high")))
+
+        def dequeue():
+            if jobs:
+                return jobs.pop(0)
+            worker.request_stop()
+            return None
+
+        worker._dequeue = dequeue
+        started = time.monotonic()
+        asyncio.run(worker.run())
+
+        assert state["done"] == 8
+        assert state["peak"] == 4
+        assert time.monotonic() - started < 8 * 0.2
+        assert not client.is_async
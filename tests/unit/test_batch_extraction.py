@@ -0,0 +1,25 @@
+import pytest
+from app.batch_extraction import build_batch_extraction_messages, split_batch_response
+
+@pytest.mark.unit
+class TestBatchExtraction:
+    """批量结构化提取测试"""
+
+    def test_build_messages(self):
+        """测试每份报告带有编号标记"""
+        messages = build_batch_extraction_messages("提取评分", [(3, "报告三"), (7, "报告七")])
+        assert messages[0]["content"].startswith("提取评分")
+        assert "<<<报告 3>>>\n报告三" in messages[1]["content"]
+        assert "<<<报告 7>>>\n报告七" in messages[1]["content"]
+
+    def test_split_response(self):
+        """测试按编号拆分结果，忽略未请求的编号和空结果"""
+        content = (
+            "好的，结果如下：\n"
+            "<<<结果 3>>>\n```yaml\nfinal_score: 85\n```\n"
+            "<<<结果 9>>>\n```yaml\nfinal_score: 10\n```\n"
+            "<<<结果 7>>>\n\n"
+            "<<< 结果 5 >>>\ngrade: 良好\n"
+        )
+        results = split_batch_response(content, [3, 5, 7])
+        assert results == {3: "```yaml\nfinal_score: 85\n```", 5: "grade: 良好"}
@@ -0,0 +1,57 @@
+import pytest
+from app.chunked_review import split_markdown, plan_review_chunks, build_map_messages, build_reduce_messages
+
+DOCUMENT = """# 第一章 绪论
+
+项目背景。
+
+## 1.1 需求分析
+
+```python
+# 代码中的注释不是标题
+print("hello")
+```
+
+# 第二章 设计
+
+设计过程。
+"""
+
+@pytest.mark.unit
+class TestChunkedReview:
+    """长文档分段审阅测试"""
+
+    def test_split_on_headings(self):
+        """测试按标题切分，代码块中的#行不切分"""
+        chunks = split_markdown(DOCUMENT, max_tokens=28)
+        assert "".join(chunks) == DOCUMENT
+        assert chunks[0].startswith("# 第一章")
+        assert any(c.startswith("## 1.1 需求分析") and "代码中的注释" in c for c in chunks)
+        assert chunks[-1].startswith("# 第二章")
+
+    def test_merge_small_sections(self):
+        """测试预算内的相邻章节合并为一个片段"""
+        assert split_markdown(DOCUMENT, max_tokens=10000) == [DOCUMENT]
+
+    def test_split_oversized_section(self):
+        """测试超出预算的章节按段落和长度切分"""
+        text = "# 标题\n\n" + "甲" * 30 + "\n\n" + "乙" * 30 + "\n"
+        chunks = split_markdown(text, max_tokens=10)
+        assert "".join(chunks) == text
+        assert all(len(c) <= 20 for c in chunks)
+
+    def test_plan_review_chunks(self):
+        """测试按审阅模式决定是否分段"""
+        assert plan_review_chunks(DOCUMENT, {"review_mode": "auto", "chunk_max_tokens": 10000}) == [DOCUMENT]
+        assert plan_review_chunks(DOCUMENT, {"review_mode": "single", "chunk_max_tokens": 28}) == [DOCUMENT]
+        assert len(plan_review_chunks(DOCUMENT, {"review_mode": "auto", "chunk_max_tokens": 28})) == 3
+        assert len(plan_review_chunks(DOCUMENT, {"review_mode": "chunked", "chunk_max_tokens": 30})) > 1
+
+    def test_build_messages(self):
+        """测试构建map和reduce消息"""
+        map_messages = build_map_messages("片段", 2, 3)
+        assert "第2部分（共3部分）" in map_messages[0]["content"]
+        assert map_messages[1]["content"] == "片段"
+        reduce_messages = build_reduce_messages("评分标准", ["笔记一", "笔记二"])
+        assert reduce_messages[0]["content"] == "评分标准"
+        assert reduce_messages[1]["content"].index("笔记一") < reduce_messages[1]["content"].index("笔记二")
@@ -0,0 +1,208 @@
+import pytest
+from unittest.mock import patch
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+class FakeRedis:
+    """熔断器用到的Redis哈希、集合和有序集合命令的进程内替身"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.zsets = {}
+
+    def hgetall(self, key):
+        return {k.encode(): str(v).encode() for k, v in self.hashes.get(key, {}).items()}
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        data = self.hashes.setdefault(key, {})
+        if field is not None:
+            data[field] = value
+        data.update(mapping or {})
+
+    def hincrby(self, key, field, amount=1):
+        data = self.hashes.setdefault(key, {})
+        data[field] = int(data.get(field, 0)) + amount
+        return data[field]
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return {m.encode() for m in self.sets.get(key, set())}
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrangebyscore(self, key, low, high):
+        low = float(low)
+        high = float(high)
+        return [m.encode() for m, score in self.zsets.get(key, {}).items() if low <= score <= high]
+
+    def zrem(self, key, member):
+        member = member.decode() if isinstance(member, bytes) else member
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+SETTINGS = {
+    "circuit_breaker": {
+        "window_seconds": 60,
+        "min_calls": 4,
+        "failure_rate_threshold": 0.5,
+        "slow_call_seconds": 10,
+        "open_seconds": 30,
+        "half_open_probes": 1,
+        "probe_timeout_seconds": 100
+    }
+}
+
+class Clock:
+    """可手动推进的时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    clock = Clock()
+    with patch("app.circuit_breaker.time.time", side_effect=clock.time):
+        yield clock
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(FakeRedis(), SETTINGS)
+
+def fail(breaker, model="m"):
+    with pytest.raises(RuntimeError):
+        with breaker.admit(model) as call:
+            call.call(lambda: (_ for _ in ()).throw(RuntimeError("提供方故障")))
+
+def succeed(breaker, model="m"):
+    with breaker.admit(model) as call:
+        return call.call(lambda: "ok")
+
+def state_of(breaker, model="m"):
+    return breaker._load(model)["state"]
+
+@pytest.mark.unit
+class TestCircuitBreaker:
+    """按模型熔断器测试"""
+
+    def test_trips_on_failure_rate(self, breaker):
+        """测试窗口内失败率达到阈值时打开"""
+        succeed(breaker)
+        fail(breaker)
+        fail(breaker)
+        assert state_of(breaker) == STATE_CLOSED  # 调用数未达到min_calls
+        fail(breaker)
+        assert state_of(breaker) == STATE_OPEN
+        with pytest.raises(CircuitOpenError):
+            succeed(breaker)
+        # 其他模型不受影响
+        assert succeed(breaker, "other") == "ok"
+
+    def test_window_resets(self, breaker, clock):
+        """测试超过时间窗口后重新计数"""
+        fail(breaker)
+        fail(breaker)
+        fail(breaker)
+        clock.now += 61
+        fail(breaker)
+        assert state_of(breaker) == STATE_CLOSED
+
+    def test_slow_calls_count_as_failures(self, breaker):
+        """测试耗时超过阈值的调用计为失败"""
+        for _ in range(4):
+            breaker.record_success("m", 11)
+        assert state_of(breaker) == STATE_OPEN
+
+    def test_half_open_probe_closes(self, breaker, clock):
+        """测试冷却后放行一个探测请求，成功后关闭"""
+        for _ in range(4):
+            fail(breaker)
+        assert breaker.retry_after(["m"]) == pytest.approx(30)
+        clock.now += 31
+        assert breaker.retry_after(["m"]) is None
+        with breaker.admit("m") as probe:
+            assert probe.probe
+            assert state_of(breaker) == STATE_HALF_OPEN
+            # 探测名额已满，其他调用仍被拒绝
+            with pytest.raises(CircuitOpenError):
+                with breaker.admit("m"):
+                    pass
+            probe.call(lambda: "ok")
+        assert state_of(breaker) == STATE_CLOSED
+
+    def test_half_open_probe_failure_reopens(self, breaker, clock):
+        """测试探测请求失败后重新打开"""
+        for _ in range(4):
+            fail(breaker)
+        clock.now += 31
+        fail(breaker)
+        assert state_of(breaker) == STATE_OPEN
+        assert breaker.retry_after(["m"]) == pytest.approx(30)
+
+    def test_unfinished_probe_releases_slot(self, breaker, clock):
+        """测试探测请求未产生结果时归还探测名额"""
+        for _ in range(4):
+            fail(breaker)
+        clock.now += 31
+        stream = iter(["a", "b"])
+        with breaker.admit("m") as probe:
+            watched = probe.watch(stream)
+        assert breaker._load("m")["probes"] == 0
+        watched.close()
+        assert succeed(breaker) == "ok"
+
+    def test_stream_records_first_chunk(self, breaker):
+        """测试流式调用在收到第一个响应块时记录成功，之前的异常记为失败"""
+        def broken():
+            raise RuntimeError("断开")
+            yield
+
+        for _ in range(4):
+            with breaker.admit("m") as call:
+                with pytest.raises(RuntimeError):
+                    list(call.watch(broken()))
+        assert state_of(breaker) == STATE_OPEN
+
+        with breaker.admit("other") as call:
+            assert list(call.watch(iter(["a", "b"]))) == ["a", "b"]
+        assert breaker._load("other")["calls"] == 1
+
+    def test_retry_after_requires_whole_chain(self, breaker):
+        """测试只有回退链上的模型全部熔断时才需要等待"""
+        for _ in range(4):
+            fail(breaker, "a")
+        assert breaker.retry_after(["a", "b"]) is None
+        for _ in range(4):
+            fail(breaker, "b")
+        assert breaker.retry_after(["a", "b"]) == pytest.approx(30)
+
+    def test_held_tasks(self, breaker, clock):
+        """测试暂缓分发的任务到期后只被取出一次"""
+        breaker.hold_task(7, 20)
+        assert breaker.held_task_ids() == {7}
+        assert breaker.pop_due_tasks() == []
+        clock.now += 21
+        assert breaker.held_task_ids() == set()
+        assert breaker.pop_due_tasks() == [7]
+        assert breaker.pop_due_tasks() == []
+
+    def test_disabled(self, clock):
+        """测试关闭后不拦截也不记录"""
+        breaker = CircuitBreaker(FakeRedis(), {"circuit_breaker": {"enabled": False, "min_calls": 1}})
+        fail(breaker)
+        assert succeed(breaker) == "ok"
+        assert breaker.redis.hashes == {}
+
+    def test_snapshot(self, breaker):
+        """测试状态快照包含配置中的模型和调用过的模型"""
+        for _ in range(4):
+            fail(breaker, "a")
+        snapshot = {item["model_id"]: item for item in breaker.snapshot(["b"])}
+        assert snapshot["a"]["state"] == STATE_OPEN
+        assert snapshot["a"]["trips"] == 1
+        assert "提供方故障" in snapshot["a"]["last_error"]
+        assert snapshot["b"]["state"] == STATE_CLOSED
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import Base, ConversionCacheEntry
+from app.conversion_cache import (
+    file_content_hash,
+    conversion_cache_config,
+    make_conversion_cache_key,
+    get_cached_conversion,
+    save_conversion,
+    invalidate_conversions,
+    conversion_cache_stats
+)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.mark.unit
+class TestConversionCache:
+    """文档转换缓存测试"""
+
+    def test_cache_key(self, tmp_path):
+        """测试缓存键由文件内容、转换类型和相关配置决定"""
+        path = tmp_path / "a.pdf"
+        path.write_bytes(b"%PDF-1.4 content")
+        file_hash = file_content_hash(str(path))
+        advanced = {"enable_image_description": True, "image_description_model": "vision/a", "max_images": 20, "logger": print}
+        key = make_conversion_cache_key(file_hash, conversion_cache_config("advanced", ".PDF", advanced))
+        # 不相关的配置项不影响缓存键
+        assert key == make_conversion_cache_key(file_hash, conversion_cache_config("advanced", ".pdf", dict(advanced, logger=None)))
+        assert key != make_conversion_cache_key(file_hash, conversion_cache_config("advanced", ".pdf", dict(advanced, image_description_model="vision/b")))
+        assert key != make_conversion_cache_key(file_hash, conversion_cache_config("simple", ".pdf", advanced))
+        path.write_bytes(b"%PDF-1.4 changed")
+        assert file_content_hash(str(path)) != file_hash
+
+    def test_hybrid_key_uses_resolved_ocr_engine(self, monkeypatch):
+        """测试混合转换的缓存键使用实际会采用的OCR引擎，配置Mistral密钥后不再命中tesseract的结果"""
+        monkeypatch.delenv("MISTRAL_API_KEY", raising=False)
+        monkeypatch.setattr("app.file_converter.MISTRAL_AVAILABLE", True)
+        auto = {"hybrid_min_text_chars": 50, "hybrid_ocr_engine": "auto"}
+        without_key = conversion_cache_config("hybrid", ".pdf", auto)
+        assert without_key["ocr_engine"] == "tesseract"
+        assert without_key == conversion_cache_config("hybrid", ".pdf", dict(auto, hybrid_ocr_engine="tesseract"))
+
+        monkeypatch.setenv("MISTRAL_API_KEY", "test-key")
+        with_key = conversion_cache_config("hybrid", ".pdf", auto)
+        assert with_key["ocr_engine"] == "mistral"
+        assert make_conversion_cache_key("h", with_key) != make_conversion_cache_key("h", without_key)
+
+    def test_get_and_save(self, db):
+        """测试写入后命中并累计命中次数"""
+        config = conversion_cache_config("simple", ".txt", {})
+        assert get_cached_conversion(db, "k1") is None
+        save_conversion(db, "k1", "h1", config, "# 正文")
+        assert get_cached_conversion(db, "k1") == "# 正文"
+        assert get_cached_conversion(db, "k1") == "# 正文"
+        assert conversion_cache_stats(db) == {"entries": 1, "total_size": len("# 正文".encode("utf-8")), "hits": 2}
+
+    def test_lru_eviction(self, db):
+        """测试超过大小上限时淘汰最久未使用的条目"""
+        config = conversion_cache_config("simple", ".txt", {})
+        max_size_mb = 250 / 1024 / 1024
+        save_conversion(db, "k1", "h1", config, "a" * 100, max_size_mb=max_size_mb)
+        save_conversion(db, "k2", "h2", config, "b" * 100, max_size_mb=max_size_mb)
+        get_cached_conversion(db, "k1")
+        save_conversion(db, "k3", "h3", config, "c" * 100, max_size_mb=max_size_mb)
+        assert get_cached_conversion(db, "k2") is None
+        assert get_cached_conversion(db, "k1") == "a" * 100
+        assert get_cached_conversion(db, "k3") == "c" * 100
+
+    def test_invalidate(self, db):
+        """测试按文件失效和清空缓存"""
+        save_conversion(db, "k1", "h1", conversion_cache_config("simple", ".pdf", {}), "简单")
+        save_conversion(db, "k2", "h1", conversion_cache_config("advanced", ".pdf", {}), "高级")
+        save_conversion(db, "k3", "h2", conversion_cache_config("simple", ".pdf", {}), "其他")
+        assert invalidate_conversions(db, "h1") == 2
+        assert db.query(ConversionCacheEntry).count() == 1
+        assert invalidate_conversions(db) == 1
+        assert db.query(ConversionCacheEntry).count() == 0
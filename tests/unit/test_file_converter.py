@@ -1,5 +1,7 @@
 import pytest
 import os
+import threading
+import time
 from unittest.mock import patch, MagicMock, mock_open
 from app.file_converter import (
     is_allowed_file,
@@ -81,7 +83,143 @@ class TestFileConverter:
         # 验证结果
         assert result == "Page 1 content\nPage 2 content\n"
         mock_pdf_reader.assert_called_once_with("test.pdf")
+
+    @patch("app.file_converter.ProcessPoolExecutor")
+    @patch("app.file_converter.PdfReader")
+    def test_extract_text_from_pdf_small_file_is_serial(self, mock_pdf_reader, mock_executor):
+        """测试页数少于阈值时串行提取，不启动进程池"""
+        pages = [MagicMock() for _ in range(3)]
+        for i, page in enumerate(pages):
+            page.extract_text.return_value = f"Page {i + 1}"
+        mock_pdf_reader.return_value.pages = pages
+
+        result = extract_text_from_pdf("test.pdf", {"pdf_parallel_min_pages": 10, "pdf_workers": 4})
+
+        assert result == "Page 1\nPage 2\nPage 3\n"
+        mock_executor.assert_not_called()
+
+    def test_iter_pdf_page_texts_parallel_keeps_page_order(self, tmp_path):
+        """测试并行提取时按页码顺序产出，与串行结果一致"""
+        from pypdf import PdfWriter
+        from app.file_converter import iter_pdf_page_texts
+
+        pdf_path = tmp_path / "blank.pdf"
+        writer = PdfWriter()
+        for _ in range(12):
+            writer.add_blank_page(width=200, height=200)
+        with open(pdf_path, "wb") as f:
+            writer.write(f)
+
+        calls = []
+        def fake_range(file_path, start, end):
+            calls.append((start, end))
+            return [f"第{i + 1}页" for i in range(start, end)]
+
+        class InlineExecutor:
+            """在当前进程中执行提交的任务"""
+            def __init__(self, max_workers):
+                self.max_workers = max_workers
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                return False
+            def submit(self, func, *args):
+                future = MagicMock()
+                future.result.return_value = func(*args)
+                return future
+
+        with patch("app.file_converter.ProcessPoolExecutor", InlineExecutor), \
+                patch("app.file_converter._extract_pdf_page_range", side_effect=fake_range):
+            texts = list(iter_pdf_page_texts(str(pdf_path), {"pdf_parallel_min_pages": 10, "pdf_workers": 2}))
+
+        assert texts == [f"第{i + 1}页" for i in range(12)]
+        assert len(calls) > 1
+        assert calls[0][0] == 0 and calls[-1][1] == 12
+
+    @patch("app.file_converter.PdfReader")
+    def test_iter_pdf_page_texts_falls_back_to_serial(self, mock_pdf_reader):
+        """测试进程池失败时从尚未产出的页开始串行提取"""
+        pages = [MagicMock() for _ in range(4)]
+        for i, page in enumerate(pages):
+            page.extract_text.return_value = f"Page {i + 1}"
+        mock_pdf_reader.return_value.pages = pages
+        from app.file_converter import iter_pdf_page_texts
+
+        first = MagicMock()
+        first.result.return_value = ["Page 1", "Page 2"]
+        broken = MagicMock()
+        broken.result.side_effect = RuntimeError("进程池已损坏")
+        executor = MagicMock()
+        executor.__enter__.return_value.submit.side_effect = [first, broken]
+
+        with patch("app.file_converter.ProcessPoolExecutor", return_value=executor):
+            texts = list(iter_pdf_page_texts("test.pdf", {"pdf_parallel_min_pages": 2, "pdf_workers": 2}))
+
+        assert texts == ["Page 1", "Page 2", "Page 3", "Page 4"]
     
+    def test_classify_pdf_pages(self):
+        """测试按文本层的非空白字符数识别扫描页"""
+        from app.file_converter import classify_pdf_pages
+        texts = ["正文" * 30, "", "  12 \n", "x" * 10]
+        assert classify_pdf_pages(texts, min_text_chars=20) == [1, 2, 3]
+        assert classify_pdf_pages(texts, min_text_chars=5) == [1, 2]
+
+    @patch("app.file_converter._ocr_pages_with_mistral")
+    @patch("app.file_converter._ocr_pages_with_tesseract")
+    @patch("app.file_converter.iter_pdf_page_texts")
+    def test_convert_pdf_hybrid_only_ocrs_scanned_pages(self, mock_iter, mock_tesseract, mock_mistral, monkeypatch):
+        """测试混合转换只对扫描页OCR，并按页码顺序合并"""
+        from app.file_converter import convert_pdf_hybrid
+        monkeypatch.delenv("MISTRAL_API_KEY", raising=False)
+        mock_iter.return_value = iter(["第一页" * 20, "", "第三页" * 20, " 4 "])
+        mock_tesseract.return_value = {1: "扫描页二", 3: "扫描页四"}
+        logs = []
+
+        result = convert_pdf_hybrid("test.pdf", {"hybrid_min_text_chars": 10, "logger": logs.append})
+
+        assert result == f"{'第一页' * 20}\n扫描页二\n{'第三页' * 20}\n扫描页四\n"
+        mock_tesseract.assert_called_once_with("test.pdf", [1, 3], None)
+        mock_mistral.assert_not_called()
+        assert "共 4 页，2 页使用文本层，2 页需要OCR" in logs
+
+    @patch("app.file_converter.MISTRAL_AVAILABLE", True)
+    @patch("app.file_converter._ocr_pages_with_mistral")
+    @patch("app.file_converter._ocr_pages_with_tesseract")
+    @patch("app.file_converter.iter_pdf_page_texts")
+    def test_convert_pdf_hybrid_falls_back_to_tesseract(self, mock_iter, mock_tesseract, mock_mistral, monkeypatch):
+        """测试Mistral OCR失败时改用tesseract，全部失败时通过配置告知调用方"""
+        from app.file_converter import convert_pdf_hybrid
+        monkeypatch.setenv("MISTRAL_API_KEY", "test-key")
+        mock_mistral.side_effect = RuntimeError("服务不可用")
+        mock_tesseract.return_value = {0: "扫描页"}
+        mock_iter.return_value = iter(["", "正文" * 30])
+
+        config = {"logger": lambda msg: None}
+        assert convert_pdf_hybrid("test.pdf", config) == f"扫描页\n{'正文' * 30}\n"
+        mock_mistral.assert_called_once_with("test.pdf", [0], "test-key")
+        assert "ocr_error" not in config
+        assert config["ocr_engine"] == "tesseract"
+
+        mock_tesseract.side_effect = RuntimeError("未安装tesseract")
+        mock_iter.return_value = iter(["", "正文" * 30])
+        assert convert_pdf_hybrid("test.pdf", config) == f"\n{'正文' * 30}\n"
+        assert "服务不可用" in config["ocr_error"] and "未安装tesseract" in config["ocr_error"]
+
+    def test_ocr_pages_with_tesseract_reads_embedded_images(self, tmp_path):
+        """测试tesseract识别扫描页中嵌入的整页图片"""
+        from PIL import Image as PILImage
+        from app.file_converter import _ocr_pages_with_tesseract
+
+        pdf_path = tmp_path / "scanned.pdf"
+        PILImage.new("RGB", (60, 40), "white").save(pdf_path, "PDF")
+
+        with patch("app.file_converter.pytesseract") as mock_pytesseract:
+            mock_pytesseract.image_to_string.return_value = " 识别文本 \n"
+            result = _ocr_pages_with_tesseract(str(pdf_path), [0], lang="chi_sim+eng")
+
+        assert result == {0: "识别文本"}
+        assert mock_pytesseract.image_to_string.call_args.kwargs == {"lang": "chi_sim+eng"}
+
     @patch("app.file_converter.Image")
     @patch("app.file_converter.pytesseract")
     def test_extract_text_from_image(self, mock_pytesseract, mock_image):
@@ -139,7 +277,7 @@ class TestFileConverter:
         # 验证结果
         assert result == "Extracted PDF content"
         mock_is_allowed.assert_called_once_with("test.pdf")
-        mock_extract_pdf.assert_called_once_with("test.pdf")
+        mock_extract_pdf.assert_called_once_with("test.pdf", None)
     
     @patch("app.file_converter.is_allowed_file")
     @patch("app.file_converter.os.path.splitext")
@@ -240,4 +378,74 @@ class TestAdvancedMarkdownConverter:
             assert "![image1](image1)" not in result
             assert "![image1](path/to/image1.png)" in result
             assert "![image2](image2)" not in result
-            assert "![image2](path/to/image2.jpg)" in result 
\ No newline at end of file
+            assert "![image2](path/to/image2.jpg)" in result 
+    @patch("app.file_converter.os.environ.get", return_value="test_api_key")
+    @patch("app.file_converter.MISTRAL_AVAILABLE", True)
+    @patch("app.file_converter.IMAGE_DESCRIPTION_AVAILABLE", True)
+    def test_generate_image_descriptions_concurrently(self, mock_environ_get):
+        """测试并发描述图片，结果保持原始顺序且超出上限的图片被跳过"""
+        converter = AdvancedMarkdownConverter({"image_description_concurrency": 3, "max_images": 4, "logger": lambda msg: None})
+        started = threading.Barrier(3, timeout=5)
+
+        def describe(img_path, model_params, log=None):
+            # 前三张图片必须同时进行才能通过屏障，且越靠前的图片完成得越晚
+            index = int(img_path[-1])
+            if index < 3:
+                started.wait()
+                time.sleep(0.05 * (3 - index))
+            return f"描述{index}"
+
+        images = {f"img-{i}": {"path": f"/tmp/img{i}"} for i in range(6)}
+        with patch.object(converter, "_generate_single_image_description", side_effect=describe):
+            descriptions = converter.generate_image_descriptions(images)
+
+        assert list(descriptions) == [f"img-{i}" for i in range(6)]
+        assert descriptions["img-0"] == "描述0"
+        assert descriptions["img-3"] == "描述3"
+        assert descriptions["img-5"] == "[图片描述已跳过: 超过处理上限]"
+
+    @patch("app.file_converter.os.environ.get", return_value="test_api_key")
+    @patch("app.file_converter.MISTRAL_AVAILABLE", True)
+    @patch("app.file_converter.time.sleep")
+    def test_describe_image_retries_with_backoff(self, mock_sleep, mock_environ_get):
+        """测试失败后按指数退避加抖动重试，全部失败时返回失败说明"""
+        converter = AdvancedMarkdownConverter({
+            "image_description_max_retries": 4,
+            "image_description_retry_base_seconds": 2,
+            "image_description_retry_max_seconds": 5
+        })
+        with patch.object(converter, "_generate_single_image_description", side_effect=RuntimeError("模型不可用")):
+            description, log_lines, succeeded = converter._describe_image_with_retries("img-1", "/tmp/img1", {})
+
+        assert not succeeded
+        assert description.startswith("[图片描述失败: 在4次尝试后仍然失败")
+        delays = [c.args[0] for c in mock_sleep.call_args_list]
+        assert len(delays) == 3
+        assert 1 <= delays[0] <= 2
+        assert 2 <= delays[1] <= 4
+        assert 2.5 <= delays[2] <= 5
+        assert any("最终失败" in line for line in log_lines)
+
+    @patch("app.file_converter.os.environ.get", return_value="test_api_key")
+    @patch("app.file_converter.MISTRAL_AVAILABLE", True)
+    @patch("app.file_converter.IMAGE_DESCRIPTION_AVAILABLE", True)
+    def test_image_description_cache(self, mock_environ_get, tmp_path):
+        """测试重复图片只调用一次模型，第二次转换全部命中缓存"""
+        from app.llm_cache import LLMResponseCache
+        for name, content in [("a", b"logo"), ("b", b"chart"), ("c", b"logo")]:
+            (tmp_path / f"{name}.png").write_bytes(content)
+        images = {name: {"path": str(tmp_path / f"{name}.png")} for name in "abc"}
+        logs = []
+        cache = LLMResponseCache(str(tmp_path / "cache.db"))
+        converter = AdvancedMarkdownConverter({"image_description_cache": cache, "logger": logs.append})
+
+        with patch.object(converter, "_generate_single_image_description", side_effect=lambda path, params, log=None: f"描述 {os.path.basename(path)}") as mock_describe:
+            descriptions = converter.generate_image_descriptions(images)
+            assert mock_describe.call_count == 2
+            assert descriptions == {"a": "描述 a.png", "b": "描述 b.png", "c": "描述 a.png"}
+            assert any("缓存命中 0/3" in line and "重复图片 1 张" in line for line in logs)
+
+            logs.clear()
+            assert converter.generate_image_descriptions(images) == descriptions
+            assert mock_describe.call_count == 2
+            assert any("缓存命中 3/3 张 (100%)" in line for line in logs)
@@ -0,0 +1,24 @@
+import pytest
+from app.fused_review import FUSED_MARKER, build_fused_prompt, split_fused_output
+
+@pytest.mark.unit
+class TestFusedReview:
+    """审阅与结构化提取融合模式测试"""
+
+    def test_build_prompt(self):
+        """测试在审阅提示词后追加提取要求"""
+        prompt = build_fused_prompt("评分标准", "提取final_score\n")
+        assert prompt.startswith("评分标准")
+        assert FUSED_MARKER in prompt
+        assert prompt.endswith("提取final_score")
+
+    def test_split_output(self):
+        """测试拆分报告和结构化数据"""
+        review, trailer = split_fused_output(f"审阅报告\n\n{FUSED_MARKER}\n```yaml\nfinal_score: 80\n```\n")
+        assert review == "审阅报告"
+        assert trailer == "```yaml\nfinal_score: 80\n```"
+
+    def test_split_without_marker(self):
+        """测试没有标记时原样返回报告"""
+        assert split_fused_output("审阅报告") == ("审阅报告", None)
+        assert split_fused_output(f"审阅报告\n{FUSED_MARKER}\n") == ("审阅报告", None)
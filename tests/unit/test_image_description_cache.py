@@ -0,0 +1,41 @@
+from io import BytesIO
+import pytest
+from PIL import Image
+from app.image_description_cache import image_content_hash, image_perceptual_hash, make_image_cache_keys
+
+def _png(size=(64, 48), quality_shift=0):
+    """生成左暗右亮的渐变图片"""
+    image = Image.new("L", size)
+    image.putdata([min(255, x * 255 // size[0] + quality_shift) for y in range(size[1]) for x in range(size[0])])
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.mark.unit
+class TestImageDescriptionCache:
+    """图片描述缓存键测试"""
+
+    def test_content_hash_keys(self):
+        """测试相同图片和模型得到相同的键，模型或提示词不同时键不同"""
+        data = _png()
+        keys = make_image_cache_keys(data, "vision/model", "描述图片")
+        assert len(keys) == 1
+        assert keys == make_image_cache_keys(data, "vision/model", "描述图片")
+        assert keys != make_image_cache_keys(data, "other/model", "描述图片")
+        assert keys != make_image_cache_keys(data, "vision/model", "新的提示词")
+        assert image_content_hash(data) != image_content_hash(_png(quality_shift=1))
+
+    def test_perceptual_hash_matches_resized_image(self):
+        """测试缩放后的同一张图片感知哈希相同，内容哈希不同"""
+        original = _png()
+        resized = _png(size=(128, 96))
+        assert image_perceptual_hash(original) == image_perceptual_hash(resized)
+        original_keys = make_image_cache_keys(original, "vision/model", "描述图片", perceptual=True)
+        resized_keys = make_image_cache_keys(resized, "vision/model", "描述图片", perceptual=True)
+        assert original_keys[0] != resized_keys[0]
+        assert original_keys[1] == resized_keys[1]
+
+    def test_perceptual_hash_invalid_image(self):
+        """测试无法解码的数据只生成内容哈希键"""
+        assert image_perceptual_hash(b"not an image") is None
+        assert len(make_image_cache_keys(b"not an image", "vision/model", "描述图片", perceptual=True)) == 1
@@ -0,0 +1,47 @@
+import pytest
+from app.llm_cache import LLMResponseCache, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "请审阅"}]
+
+@pytest.mark.unit
+class TestLLMResponseCache:
+    """LLM响应缓存测试"""
+
+    def test_cache_key(self):
+        """测试缓存键随模型和参数变化"""
+        key = make_cache_key("m", MESSAGES, 0.7, 100)
+        assert key == make_cache_key("m", [dict(m) for m in MESSAGES], 0.7, 100)
+        assert key != make_cache_key("other", MESSAGES, 0.7, 100)
+        assert key != make_cache_key("m", MESSAGES, 0.2, 100)
+        assert key != make_cache_key("m", MESSAGES, 0.7, 200)
+        assert key != make_cache_key("m", MESSAGES, 0.7, 100, options={"review_mode": "chunked"})
+        assert make_cache_key("m", MESSAGES, 0.7, 100, options={"review_mode": "chunked"}) != make_cache_key(
+            "m", MESSAGES, 0.7, 100, options={"review_mode": "single"}
+        )
+
+    def test_get_and_put(self, tmp_path):
+        """测试写入后可以读取"""
+        cache = LLMResponseCache(str(tmp_path / "cache.db"))
+        assert cache.get("k") is None
+        cache.put("k", "m", "审阅结果")
+        assert cache.get("k") == "审阅结果"
+
+    def test_lru_eviction(self, tmp_path):
+        """测试超过大小上限时淘汰最久未使用的条目"""
+        cache = LLMResponseCache(str(tmp_path / "cache.db"), max_size_mb=25 / (1024 * 1024))
+        cache.put("a", "m", "x" * 10)
+        cache.put("b", "m", "y" * 10)
+        # 访问a后b成为最久未使用的条目
+        assert cache.get("a") is not None
+        cache.put("c", "m", "z" * 10)
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+
+    def test_disabled(self, tmp_path):
+        """测试关闭时不读写缓存"""
+        cache = LLMResponseCache(str(tmp_path / "cache.db"), enabled=False)
+        cache.put("k", "m", "审阅结果")
+        assert cache.get("k") is None
+        assert not (tmp_path / "cache.db").exists()
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from app.llm_client import LLMClient
+from app.mock_llm import MockLLMProvider
+
+class FakeStream:
+    """模拟 litellm.acompletion 返回的异步流"""
+
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(0)
+            yield chunk
+        if self.error:
+            raise self.error
+
+@pytest.fixture
+def event_loop_thread():
+    """在后台线程中运行事件循环，模拟异步worker"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+@pytest.mark.unit
+class TestLLMClient:
+    """LLM调用入口测试"""
+
+    @patch("app.llm_client.completion")
+    def test_sync_mode_uses_completion(self, mock_completion):
+        """测试未绑定事件循环时直接同步调用"""
+        client = LLMClient()
+        client.completion(model="m", messages=[])
+        mock_completion.assert_called_once_with(model="m", messages=[])
+
+    def test_async_mode_streams_through_loop(self, event_loop_thread):
+        """测试绑定事件循环后通过acompletion流式读取"""
+        async def fake_acompletion(**kwargs):
+            assert kwargs["stream"] is True
+            return FakeStream(["a", "b", "c"])
+
+        client = LLMClient()
+        client.attach_loop(event_loop_thread)
+        with patch("app.llm_client.acompletion", side_effect=fake_acompletion):
+            assert list(client.completion(model="m", messages=[], stream=True)) == ["a", "b", "c"]
+
+    def test_async_mode_non_stream(self, event_loop_thread):
+        """测试绑定事件循环后的非流式调用"""
+        async def fake_acompletion(**kwargs):
+            return "response"
+
+        client = LLMClient()
+        client.attach_loop(event_loop_thread)
+        with patch("app.llm_client.acompletion", side_effect=fake_acompletion):
+            assert client.completion(model="m", messages=[]) == "response"
+
+    def test_async_mode_stream_error(self, event_loop_thread):
+        """测试事件循环中的异常在读取线程中抛出"""
+        async def fake_acompletion(**kwargs):
+            return FakeStream(["a"], error=RuntimeError("断开"))
+
+        client = LLMClient()
+        client.attach_loop(event_loop_thread)
+        with patch("app.llm_client.acompletion", side_effect=fake_acompletion):
+            received = []
+            with pytest.raises(RuntimeError):
+                for chunk in client.completion(model="m", messages=[], stream=True):
+                    received.append(chunk)
+        assert received == ["a"]
+
+    @patch("app.llm_client.completion")
+    def test_mock_model_does_not_call_litellm(self, mock_completion):
+        """测试mock/开头的模型由模拟模型响应"""
+        client = LLMClient(MockLLMProvider({"fast": {"time_to_first_token_ms": 0, "tokens_per_second": 0}}))
+        response = client.completion(model="mock/fast", messages=[{"role": "user", "content": "你好"}], max_tokens=50)
+        assert response.choices[0].message.content
+        mock_completion.assert_not_called()
+
+    def test_mock_model_streams_through_loop(self, event_loop_thread):
+        """测试异步模式下模拟模型同样通过事件循环流式输出"""
+        client = LLMClient(MockLLMProvider({"fast": {"time_to_first_token_ms": 0, "tokens_per_second": 0}}))
+        client.attach_loop(event_loop_thread)
+        with patch("app.llm_client.acompletion") as mock_acompletion:
+            chunks = list(client.completion(model="mock/fast", messages=[{"role": "user", "content": "你好"}], stream=True, max_tokens=40))
+        mock_acompletion.assert_not_called()
+        assert "".join(c.choices[0].delta.content or "" for c in chunks).endswith("分")
+        assert chunks[-1].usage.completion_tokens == 40
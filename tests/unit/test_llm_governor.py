@@ -0,0 +1,69 @@
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+from app.llm_governor import LLMGovernor, estimate_message_tokens
+
+MODEL_CONFIG = {
+    "models": [
+        {"id": "local/model", "name": "本地模型", "max_concurrency": 1},
+        {"id": "free/model", "name": "免费模型", "requests_per_minute": 20, "tokens_per_minute": 100000},
+        {"id": "paid/model", "name": "付费模型"}
+    ]
+}
+
+@pytest.mark.unit
+class TestLLMGovernor:
+    """模型配额调度器测试"""
+
+    def test_estimate_message_tokens(self):
+        """测试token估算包含文本、图片和最大输出"""
+        messages = [
+            {"role": "system", "content": "a" * 100},
+            {"role": "user", "content": [
+                {"type": "text", "text": "b" * 20},
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,xxx"}}
+            ]}
+        ]
+        assert estimate_message_tokens(messages, 500) == 60 + 1000 + 500
+
+    def test_get_model_limits(self):
+        """测试读取模型声明的限制"""
+        governor = LLMGovernor(MagicMock(), MODEL_CONFIG)
+        assert governor.get_model_limits("local/model") == {
+            "requests_per_minute": 0, "tokens_per_minute": 0, "max_concurrency": 1
+        }
+        assert governor.get_model_limits("free/model")["requests_per_minute"] == 20
+        assert governor.get_model_limits("unknown/model") == {
+            "requests_per_minute": 0, "tokens_per_minute": 0, "max_concurrency": 0
+        }
+
+    def test_unlimited_model_skips_redis(self):
+        """测试未声明限制的模型不访问Redis"""
+        redis_conn = MagicMock()
+        governor = LLMGovernor(redis_conn, MODEL_CONFIG)
+
+        with governor.acquire("paid/model", 1000) as permit:
+            assert permit.model_id == "paid/model"
+            assert permit.wait_seconds >= 0
+
+        assert not redis_conn.register_script.called
+        assert not redis_conn.zrem.called
+
+    @patch("app.llm_governor.SlotPool")
+    def test_concurrency_slot_renewed_during_call(self, mock_slot_pool):
+        """测试调用耗时超过租约时由心跳续约并发槽位，调用结束后释放且不再续约"""
+        slot_pool = mock_slot_pool.return_value
+        slot_pool.acquire.return_value = True
+        slot_pool.renew.return_value = True
+        governor = LLMGovernor(MagicMock(), {**MODEL_CONFIG, "llm_governor": {"concurrency_lease_seconds": 0.3}})
+
+        with governor.acquire("local/model", 1000):
+            time.sleep(0.35)
+            assert slot_pool.renew.call_count >= 2
+
+        holder = slot_pool.acquire.call_args.args[0]
+        slot_pool.renew.assert_called_with(holder)
+        slot_pool.release.assert_called_once_with(holder)
+        renew_count = slot_pool.renew.call_count
+        time.sleep(0.2)
+        assert slot_pool.renew.call_count == renew_count
@@ -0,0 +1,97 @@
+import random
+import time
+import litellm
+import pytest
+from app.fused_review import FUSED_MARKER, build_fused_prompt, split_fused_output
+from app.batch_extraction import build_batch_extraction_messages, split_batch_response
+from app.rule_extraction import extract_with_rules
+from app.mock_llm import MockLLMProvider, is_mock_model, synthesize_content
+
+INSTANT = {"time_to_first_token_ms": 0, "jitter": 0, "tokens_per_second": 0}
+
+@pytest.mark.unit
+class TestMockLLM:
+    """本地模拟模型测试"""
+
+    def test_is_mock_model(self):
+        """测试按前缀识别模拟模型"""
+        assert is_mock_model("mock/fast")
+        assert not is_mock_model("deepseek/deepseek-chat")
+        assert not is_mock_model(None)
+
+    def test_profile_defaults(self):
+        """测试未配置的项使用默认值"""
+        provider = MockLLMProvider({"fast": {"tokens_per_second": 500}})
+        profile = provider.get_profile("mock/fast")
+        assert profile["tokens_per_second"] == 500
+        assert profile["error_rate"] == 0.0
+        assert provider.get_profile("mock/unknown")["tokens_per_second"] == 100
+
+    def test_review_output_matches_rules(self):
+        """测试审阅输出可被规则提取评分和等级"""
+        provider = MockLLMProvider({"fast": INSTANT})
+        response = provider.completion("mock/fast", [{"role": "user", "content": "请审阅"}], max_tokens=300)
+        content = response.choices[0].message.content
+        data, missing = extract_with_rules(content)
+        assert missing == []
+        assert 55 <= data["final_score"] <= 95
+        assert response.usage.completion_tokens == len(content) <= 300
+
+    def test_stream_timing(self):
+        """测试首个token时间和输出速度"""
+        provider = MockLLMProvider({"fast": {"time_to_first_token_ms": 100, "jitter": 0, "tokens_per_second": 400, "output_tokens": 80, "chunk_tokens": 20}})
+        started = time.monotonic()
+        stream = provider.completion("mock/fast", [{"role": "user", "content": "请审阅"}], stream=True)
+        first = next(stream)
+        first_token = time.monotonic() - started
+        rest = list(stream)
+        total = time.monotonic() - started
+        assert first.choices[0].delta.content
+        assert 0.09 <= first_token < 0.2
+        # 其余60个token按每秒400个输出
+        assert total - first_token >= 0.14
+        assert rest[-1].choices[0].finish_reason == "stop"
+        assert rest[-1].usage.completion_tokens == 80
+
+    def test_tail_latency(self):
+        """测试长尾请求使用长尾首token时间"""
+        provider = MockLLMProvider({"slow": {"tail_probability": 1.0, "tail_time_to_first_token_ms": 5000}})
+        assert provider._first_token_seconds(provider.get_profile("mock/slow")) == 5.0
+
+    def test_error_injection(self):
+        """测试按概率注入429和503错误"""
+        messages = [{"role": "user", "content": "你好"}]
+        with pytest.raises(litellm.RateLimitError):
+            MockLLMProvider({"x": dict(INSTANT, rate_limit_rate=1.0)}).completion("mock/x", messages)
+        with pytest.raises(litellm.ServiceUnavailableError):
+            MockLLMProvider({"x": dict(INSTANT, error_rate=1.0)}).completion("mock/x", messages, stream=True)
+        provider = MockLLMProvider({"x": dict(INSTANT, error_rate=0.5)}, rng=random.Random(1))
+        failures = 0
+        for _ in range(200):
+            try:
+                provider.completion("mock/x", messages, max_tokens=10)
+            except litellm.ServiceUnavailableError:
+                failures += 1
+        assert 60 < failures < 140
+
+    def test_vision_output(self):
+        """测试图片消息返回图片描述"""
+        messages = [{"role": "user", "content": [
+            {"type": "text", "text": "请描述这张图片"},
+            {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}
+        ]}]
+        content = synthesize_content(messages, 50)
+        assert "图" in content and "评分" not in content
+
+    def test_extraction_formats(self):
+        """测试结构化提取、批量提取和融合模式的输出格式"""
+        yaml_output = synthesize_content([{"role": "system", "content": "以YAML格式返回"}, {"role": "user", "content": "报告"}], 100)
+        assert yaml_output.startswith("```yaml\nfinal_score:")
+
+        batch = build_batch_extraction_messages("以YAML格式返回", [(3, "报告A"), (7, "报告B")])
+        assert set(split_batch_response(synthesize_content(batch, 100), [3, 7])) == {3, 7}
+
+        fused = [{"role": "system", "content": build_fused_prompt("请审阅", "以YAML格式返回")}, {"role": "user", "content": "文章"}]
+        review, trailer = split_fused_output(synthesize_content(fused, 200))
+        assert FUSED_MARKER not in review
+        assert trailer.startswith("```yaml")
@@ -0,0 +1,78 @@
+import threading
+import time
+import pytest
+from app.model_fallback import HedgedCall
+
+def _stream(items, delay=0.0, fail=None, closed=None):
+    """按顺序产出响应块的生成器，可在开始前等待或抛出异常"""
+    def open_stream():
+        try:
+            time.sleep(delay)
+            if fail:
+                raise fail
+            for item in items:
+                yield item
+        finally:
+            if closed is not None:
+                closed.set()
+    return open_stream
+
+@pytest.mark.unit
+class TestHedgedCall:
+    """模型回退链和对冲请求测试"""
+
+    def test_primary_wins(self):
+        """测试主模型正常时只调用主模型"""
+        opened = []
+        streams = {"a": _stream(["x", "y"]), "b": _stream(["z"])}
+
+        def open_stream(model):
+            opened.append(model)
+            return streams[model]()
+
+        call = HedgedCall(["a", "b"], open_stream, hedge_after_seconds=5).start()
+        assert call.model == "a"
+        assert list(call) == ["x", "y"]
+        assert opened == ["a"]
+
+    def test_fallback_on_error(self):
+        """测试主模型出错时换用下一个模型"""
+        attempts = []
+        streams = {"a": _stream([], fail=RuntimeError("down")), "b": _stream(["z"])}
+        call = HedgedCall(["a", "b"], lambda m: streams[m](), on_attempt=lambda m, r: attempts.append((m, r))).start()
+        assert call.model == "b"
+        assert list(call) == ["z"]
+        assert attempts == [("a", "primary"), ("b", "fallback")]
+
+    def test_all_models_fail(self):
+        """测试所有模型都失败时抛出最后一个异常"""
+        streams = {"a": _stream([], fail=RuntimeError("a")), "b": _stream([], fail=ValueError("b"))}
+        with pytest.raises(ValueError):
+            HedgedCall(["a", "b"], lambda m: streams[m]()).start()
+
+    def test_hedge_on_slow_first_token(self):
+        """测试首个token迟迟未到时对冲请求胜出，慢请求被取消"""
+        closed = threading.Event()
+        streams = {
+            # 只含角色信息的块不算首个token
+            "a": _stream(["", "slow"], delay=0.3, closed=closed),
+            "b": _stream(["", "fast"], delay=0.01)
+        }
+        attempts = []
+        call = HedgedCall(
+            ["a", "b"],
+            lambda m: streams[m](),
+            hedge_after_seconds=0.05,
+            is_first_token=lambda chunk: chunk != "",
+            on_attempt=lambda m, r: attempts.append((m, r))
+        ).start()
+        assert call.model == "b"
+        assert list(call) == ["", "fast"]
+        assert attempts == [("a", "primary"), ("b", "hedge")]
+        assert closed.wait(2)
+
+    def test_empty_stream_wins(self):
+        """测试没有输出就结束的请求也视为完成"""
+        call = HedgedCall(["a"], lambda m: iter([])).start()
+        assert call.model == "a"
+        assert list(call) == []
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import MagicMock
+from rq import Queue
+from app.queues import (
+    resolve_queue_name,
+    resolve_task_queue_name,
+    get_queue_weights,
+    WeightedWorker,
+    QUEUE_HIGH,
+    QUEUE_NORMAL,
+    QUEUE_BULK,
+    SOURCE_ARTICLE_REVIEW,
+    SOURCE_AUTO_REVIEW,
+    SOURCE_PROJECT_EXTRACT
+)
+
+@pytest.mark.unit
+class TestQueues:
+    """优先级队列测试"""
+
+    def test_resolve_queue_name(self):
+        """测试按Job来源选择队列"""
+        assert resolve_queue_name(SOURCE_ARTICLE_REVIEW, {}) == QUEUE_HIGH
+        assert resolve_queue_name(SOURCE_AUTO_REVIEW, {}) == QUEUE_BULK
+        assert resolve_queue_name(None, {}) == QUEUE_NORMAL
+        # 项目级重新提取属于批量任务
+        assert resolve_queue_name(SOURCE_PROJECT_EXTRACT, {}) == QUEUE_BULK
+        # 配置可以覆盖默认映射，未知队列回退到normal
+        assert resolve_queue_name(SOURCE_AUTO_REVIEW, {"routes": {"auto_review": "high"}}) == QUEUE_HIGH
+        assert resolve_queue_name(SOURCE_AUTO_REVIEW, {"routes": {"auto_review": "missing"}}) == QUEUE_NORMAL
+
+    def test_resolve_task_queue_name(self):
+        """测试启用异步worker后LLM类任务进入异步队列"""
+        async_config = {"enabled": True, "task_types": ["process_with_llm"]}
+        assert resolve_task_queue_name(SOURCE_AUTO_REVIEW, "process_with_llm", {}, async_config) == "async-bulk"
+        assert resolve_task_queue_name(SOURCE_AUTO_REVIEW, "convert_to_markdown", {}, async_config) == QUEUE_BULK
+        assert resolve_task_queue_name(SOURCE_AUTO_REVIEW, "process_with_llm", {}, {"enabled": False}) == QUEUE_BULK
+
+    def test_weighted_worker_order(self):
+        """测试worker按权重轮转优先检查的队列"""
+        connection = MagicMock()
+        queues = [Queue(name, connection=connection) for name in [QUEUE_HIGH, QUEUE_NORMAL, QUEUE_BULK]]
+        worker = WeightedWorker(
+            queues,
+            connection=connection,
+            weights=get_queue_weights({"weights": {"high": 6, "normal": 3, "bulk": 1}})
+        )
+
+        leads = []
+        for _ in range(10):
+            leads.append(worker._ordered_queues[0].name)
+            # 本轮优先队列之后的队列保持优先级顺序
+            rest = [q.name for q in worker._ordered_queues[1:]]
+            assert rest == [n for n in [QUEUE_HIGH, QUEUE_NORMAL, QUEUE_BULK] if n != leads[-1]]
+            worker.reorder_queues(reference_queue=None)
+
+        assert leads.count(QUEUE_HIGH) == 6
+        assert leads.count(QUEUE_NORMAL) == 3
+        assert leads.count(QUEUE_BULK) == 1
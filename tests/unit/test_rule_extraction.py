@@ -0,0 +1,54 @@
+import pytest
+from app.rule_extraction import extract_with_rules, merge_structured_data
+
+REVIEW_INLINE = """1. 论文总体评价
+论文围绕温室监控系统展开……
+
+5. 评价等级（优秀，良好，及格，不及格）：**良好**
+6. 最终评分（百分制）：82分
+"""
+
+REVIEW_HEADINGS = """## 5. 评价等级
+
+不及格
+
+## 6. 最终评分
+
+**55.5**
+"""
+
+@pytest.mark.unit
+class TestRuleExtraction:
+    """规则提取测试"""
+
+    def test_inline_values(self):
+        """测试同一行中的评分和等级"""
+        data, missing = extract_with_rules(REVIEW_INLINE)
+        assert data == {"final_score": 82, "grade": "良好"}
+        assert missing == []
+
+    def test_values_on_next_line(self):
+        """测试标题下一行的评分和等级"""
+        data, missing = extract_with_rules(REVIEW_HEADINGS)
+        assert data == {"final_score": 55.5, "grade": "不及格"}
+        assert missing == []
+
+    def test_conflicting_or_invalid_values(self):
+        """测试多个不一致的值或超出范围的值视为不确定"""
+        text = "评价等级：优秀\n……\n评价等级：良好\n最终评分：150"
+        data, missing = extract_with_rules(text)
+        assert data == {}
+        assert missing == ["final_score", "grade"]
+
+    def test_custom_rules(self):
+        """测试使用自定义规则"""
+        rules = [{"field": "plagiarism", "patterns": [r"查重率[：:]\s*(\d+)%"], "type": "integer", "min": 0, "max": 100}]
+        data, missing = extract_with_rules("查重率：8%", rules)
+        assert data == {"plagiarism": 8}
+        assert missing == []
+
+    def test_merge(self):
+        """测试规则提取的字段优先于模型结果"""
+        assert merge_structured_data({"final_score": 80, "comment": "好"}, {"final_score": 82}) == {"final_score": 82, "comment": "好"}
+        assert merge_structured_data("原始文本", {"grade": "良好"}) == {"grade": "良好", "raw_text": "原始文本"}
+        assert merge_structured_data({"a": 1}, {}) == {"a": 1}
@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models import Base, User, ArticleType, Article, Project, Job, JobTask, AIReviewReport
+from app.schemas import JobStatus, JobTaskType
+from app.stream_writer import StreamFlushWriter
+
+@pytest.fixture
+def db():
+    """创建包含一个审阅报告和任务的内存数据库"""
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user = User(username="owner", hashed_password="x")
+    session.add(user)
+    session.commit()
+    article_type = ArticleType(name="论文", config={}, owner_id=user.id)
+    session.add(article_type)
+    session.commit()
+    project = Project(name="项目", config={}, owner_id=user.id, article_type_id=article_type.id)
+    session.add(project)
+    session.commit()
+    article = Article(name="文章", attachments=[], project_id=project.id)
+    job = Job(project_id=project.id, name="审阅", status=JobStatus.PROCESSING)
+    session.add_all([article, job])
+    session.commit()
+    session.add_all([
+        AIReviewReport(article_id=article.id, job_id=job.id, source_data="旧内容"),
+        JobTask(job_id=job.id, article_id=article.id, task_type=JobTaskType.PROCESS_WITH_LLM, status=JobStatus.PROCESSING, logs="")
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+def _report_and_task(db):
+    return db.query(AIReviewReport).first(), db.query(JobTask).first()
+
+@pytest.mark.unit
+class TestStreamFlushWriter:
+    """流式输出合并写入测试"""
+
+    def test_flush_by_size(self, db):
+        """测试缓存达到字节阈值时写入增量"""
+        report, task = _report_and_task(db)
+        writer = StreamFlushWriter(db, report.id, task.id, flush_interval_ms=60000, flush_bytes=4)
+        writer.reset()
+        writer.append("ab")
+        assert _report_and_task(db)[0].source_data == ""
+        writer.append("cd")
+        writer.append("e")
+        report, task = _report_and_task(db)
+        assert report.source_data == "abcd"
+        assert task.logs == "【更新】收到内容: 4字符\n"
+        writer.flush()
+        assert _report_and_task(db)[0].source_data == "abcde"
+        assert writer.content == "abcde"
+
+    def test_flush_by_interval(self, db):
+        """测试超过时间间隔后写入增量"""
+        report, task = _report_and_task(db)
+        writer = StreamFlushWriter(db, report.id, task.id, flush_interval_ms=500, flush_bytes=4096)
+        writer.reset()
+        with patch("app.stream_writer.time.monotonic", return_value=writer._last_flush + 1):
+            writer.append("增量")
+        assert _report_and_task(db)[0].source_data == "增量"
+
+    def test_flush_without_pending_is_noop(self, db):
+        """测试没有缓存内容时不写入"""
+        report, task = _report_and_task(db)
+        writer = StreamFlushWriter(db, report.id, task.id)
+        writer.append("")
+        writer.flush()
+        report, task = _report_and_task(db)
+        assert report.source_data == "旧内容"
+        assert task.logs == ""
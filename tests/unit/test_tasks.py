@@ -0,0 +1,1191 @@
+import zipfile
+from datetime import datetime, timedelta
+import pytest
+import time
+from unittest.mock import patch, MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.models import Base, User, ArticleType, Article, Project, Job, JobTask, AIReviewReport
+from app.schemas import UserRole, JobStatus, JobTaskType
+from app import tasks
+
+@pytest.fixture
+def session_factory():
+    """创建共享连接的内存数据库，便于被测函数自行打开会话"""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with patch("app.tasks.SessionLocal", factory):
+        yield factory
+    Base.metadata.drop_all(engine)
+
+class FakeSlotPool:
+    """进程内的槽位池替身，代替Redis中的槽位计数"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.holders = set()
+
+    def acquire(self, holder):
+        if holder not in self.holders and len(self.holders) >= self.limit:
+            return False
+        self.holders.add(holder)
+        return True
+
+    def release(self, holder):
+        self.holders.discard(holder)
+
+    def renew(self, holder):
+        return holder in self.holders
+
+    def in_use(self):
+        return len(self.holders)
+
+@pytest.fixture(autouse=True)
+def slot_pools():
+    """以进程内槽位池替换Redis槽位池，按槽位池名称共享"""
+    pools = {}
+
+    def get_pool(redis_conn, name, limit=1, lease_seconds=1800):
+        pool = pools.setdefault(name, FakeSlotPool(limit))
+        pool.limit = limit
+        return pool
+
+    with patch("app.tasks.SlotPool", side_effect=get_pool):
+        yield pools
+
+@pytest.fixture(autouse=True)
+def redis_conn():
+    """替换调度去重使用的Redis连接"""
+    with patch("app.tasks.redis_conn", MagicMock()) as conn:
+        yield conn
+
+@pytest.fixture(autouse=True)
+def circuit_breaker():
+    """替换熔断器，默认不拦截调用"""
+    breaker = MagicMock()
+    breaker.retry_after.return_value = None
+    breaker.held_task_ids.return_value = set()
+    breaker.admit.return_value.__enter__.return_value.call.side_effect = lambda func, *args, **kwargs: func(*args, **kwargs)
+    breaker.admit.return_value.__enter__.return_value.watch.side_effect = lambda items: items
+    with patch("app.tasks.circuit_breaker", breaker):
+        yield breaker
+
+def _release_everywhere(slot_pools, holder):
+    for pool in slot_pools.values():
+        pool.release(holder)
+
+def _create_review_job(session_factory, username="owner", role=UserRole.NORMAL, article_count=2, parallelism=1):
+    """为指定角色的用户创建包含完整审阅流水线的Job"""
+    session = session_factory()
+    user = User(username=username, hashed_password="x", role=role)
+    session.add(user)
+    session.commit()
+    article_type = ArticleType(name=f"{username}的论文", is_public=True, config={}, owner_id=user.id)
+    session.add(article_type)
+    session.commit()
+    project = Project(name="项目", config={}, owner_id=user.id, article_type_id=article_type.id)
+    session.add(project)
+    session.commit()
+    articles = [Article(name=f"文章{i}", attachments=[], project_id=project.id) for i in range(article_count)]
+    session.add_all(articles)
+    session.commit()
+
+    job = Job(project_id=project.id, name="审阅", status=JobStatus.PENDING, parallelism=parallelism)
+    session.add(job)
+    session.commit()
+
+    job_tasks = []
+    for article in articles:
+        for task_type in reversed(tasks.PIPELINE_STAGE_ORDER):
+            job_tasks.append(JobTask(
+                job_id=job.id,
+                task_type=task_type,
+                status=JobStatus.PENDING,
+                article_id=article.id
+            ))
+    session.add_all(job_tasks)
+    session.flush()
+    tasks.link_task_dependencies(job_tasks)
+    session.commit()
+    job_id = job.id
+    session.close()
+    return job_id
+
+@pytest.fixture
+def review_job(session_factory):
+    """创建包含两篇文章完整审阅流水线的Job"""
+    return _create_review_job(session_factory)
+
+def _tasks_of(session_factory, job_id):
+    session = session_factory()
+    result = session.query(JobTask).filter(JobTask.job_id == job_id).order_by(JobTask.id).all()
+    session.close()
+    return result
+
+@pytest.mark.unit
+class TestScheduler:
+    """任务调度测试"""
+
+    def test_link_task_dependencies(self, session_factory, review_job):
+        """测试同一文章的任务按流水线顺序串联"""
+        job_tasks = _tasks_of(session_factory, review_job)
+        for article_id in {t.article_id for t in job_tasks}:
+            chain = {t.task_type: t for t in job_tasks if t.article_id == article_id}
+            assert chain[JobTaskType.CONVERT_TO_MARKDOWN].depends_on_id is None
+            assert chain[JobTaskType.PROCESS_WITH_LLM].depends_on_id == chain[JobTaskType.CONVERT_TO_MARKDOWN].id
+            assert chain[JobTaskType.EXTRACT_STRUCTURED_DATA].depends_on_id == chain[JobTaskType.PROCESS_WITH_LLM].id
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_dispatches_only_runnable_tasks(self, mock_get_queue, session_factory, review_job):
+        """测试调度器只分发前置依赖已满足的任务且不再定时轮询"""
+        tasks.schedule_job_tasks(review_job)
+
+        assert mock_get_queue.return_value.enqueue.call_count == 1
+        assert not mock_get_queue.return_value.enqueue_in.called
+        dispatched_id = mock_get_queue.return_value.enqueue.call_args.kwargs["args"][0]
+        dispatched = next(t for t in _tasks_of(session_factory, review_job) if t.id == dispatched_id)
+        assert dispatched.task_type == JobTaskType.CONVERT_TO_MARKDOWN
+        assert dispatched.status == JobStatus.CLAIMED
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_cancels_tasks_after_failed_dependency(self, mock_get_queue, session_factory, review_job):
+        """测试前置任务失败后，后续任务被取消"""
+        session = session_factory()
+        convert = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.CONVERT_TO_MARKDOWN
+        ).order_by(JobTask.id).first()
+        convert.status = JobStatus.FAILED
+        failed_article_id = convert.article_id
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(review_job)
+
+        for t in _tasks_of(session_factory, review_job):
+            if t.article_id == failed_article_id and t.task_type != JobTaskType.CONVERT_TO_MARKDOWN:
+                assert t.status == JobStatus.CANCELLED
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_completes_job(self, mock_get_queue, session_factory, review_job):
+        """测试所有任务结束后更新Job状态"""
+        session = session_factory()
+        session.query(JobTask).filter(JobTask.job_id == review_job).update({"status": JobStatus.COMPLETED})
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(review_job)
+
+        session = session_factory()
+        job = session.query(Job).filter(Job.id == review_job).first()
+        assert job.status == JobStatus.COMPLETED
+        session.close()
+        assert not mock_get_queue.return_value.enqueue.called
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_honors_parallelism(self, mock_get_queue, session_factory, review_job, slot_pools):
+        """测试调度器按并行度同时推进不同文章的流水线"""
+        session = session_factory()
+        session.query(Job).filter(Job.id == review_job).update({"parallelism": 4})
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(review_job)
+
+        # 每篇文章只有转换任务可以执行，后续阶段需要等待前置任务完成
+        dispatch_args = [c.kwargs["args"] for c in mock_get_queue.return_value.enqueue.call_args_list]
+        dispatched_ids = [args[0] for args in dispatch_args]
+        dispatched = [t for t in _tasks_of(session_factory, review_job) if t.id in dispatched_ids]
+        assert len(dispatched) == 2
+        assert {t.task_type for t in dispatched} == {JobTaskType.CONVERT_TO_MARKDOWN}
+        assert len({t.article_id for t in dispatched}) == 2
+
+        # 第一篇文章转换完成并释放槽位后，其LLM任务立即可以执行
+        session = session_factory()
+        first = session.query(JobTask).filter(JobTask.id == dispatched_ids[0]).first()
+        first.status = JobStatus.COMPLETED
+        session.commit()
+        session.close()
+        _release_everywhere(slot_pools, dispatch_args[0][1])
+        mock_get_queue.return_value.reset_mock()
+
+        tasks.schedule_job_tasks(review_job)
+
+        next_id = mock_get_queue.return_value.enqueue.call_args.kwargs["args"][0]
+        next_task = next(t for t in _tasks_of(session_factory, review_job) if t.id == next_id)
+        assert next_task.task_type == JobTaskType.PROCESS_WITH_LLM
+        assert next_task.depends_on_id == dispatched_ids[0]
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_waits_for_free_slot(self, mock_get_queue, session_factory, review_job, slot_pools):
+        """测试槽位被其他worker占用时不分发任务"""
+        tasks.get_job_slot_pool(review_job, 1).acquire("other-worker-task")
+
+        tasks.schedule_job_tasks(review_job)
+
+        assert not mock_get_queue.return_value.enqueue.called
+        assert all(t.status == JobStatus.PENDING for t in _tasks_of(session_factory, review_job))
+
+    @patch("app.tasks.get_job_queue")
+    def test_dispatch_resumed_task_in_paused_job(self, mock_get_queue, session_factory, review_job):
+        """测试已暂停Job中被单独恢复的任务照常分发，其余暂停的任务不分发"""
+        session = session_factory()
+        session.query(Job).filter(Job.id == review_job).update({"status": JobStatus.PAUSED, "parallelism": 4})
+        session.query(JobTask).filter(JobTask.job_id == review_job).update({"status": JobStatus.PAUSED})
+        resumed = session.query(JobTask).filter(
+            JobTask.job_id == review_job, JobTask.depends_on_id.is_(None)
+        ).order_by(JobTask.id).first()
+        resumed.status = JobStatus.PENDING
+        session.commit()
+        resumed_id = resumed.id
+
+        dispatched = tasks.dispatch_runnable_tasks(session)
+        session.close()
+        assert [t.id for t in dispatched] == [resumed_id]
+        assert mock_get_queue.return_value.enqueue.call_count == 1
+
+    @patch("app.tasks.get_job_queue")
+    def test_schedule_does_not_dispatch_twice(self, mock_get_queue, session_factory, review_job):
+        """测试重复调度不会再次分发已认领的任务"""
+        session = session_factory()
+        session.query(Job).filter(Job.id == review_job).update({"parallelism": 4})
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(review_job)
+        tasks.schedule_job_tasks(review_job)
+
+        dispatched_ids = [c.kwargs["args"][0] for c in mock_get_queue.return_value.enqueue.call_args_list]
+        assert len(dispatched_ids) == 2
+        assert len(set(dispatched_ids)) == 2
+
+    @patch("app.tasks.schedule_job_tasks")
+    @patch("app.tasks.convert_to_markdown_task")
+    @patch("app.tasks.get_job_queue")
+    def test_execute_task_runs_claim_once(self, mock_get_queue, mock_convert, mock_schedule, session_factory, review_job):
+        """测试同一次分发被重复投递时任务只执行一次"""
+        session = session_factory()
+        tasks.dispatch_runnable_tasks(session)
+        session.close()
+        task_id, token = mock_get_queue.return_value.enqueue.call_args.kwargs["args"]
+
+        tasks.execute_task(task_id, "stale-token")
+        assert not mock_convert.called
+
+        tasks.execute_task(task_id, token)
+        tasks.execute_task(task_id, token)
+        assert mock_convert.call_count == 1
+
+    @patch("app.tasks.get_job_queue")
+    def test_enqueue_schedule_deduplicated(self, mock_get_queue, redis_conn):
+        """测试同一Job已有排队中的调度请求时不重复入队"""
+        job = Job(id=1, source="api")
+        redis_conn.set.return_value = True
+        tasks.enqueue_schedule_job_tasks(job)
+        redis_conn.set.return_value = None
+        tasks.enqueue_schedule_job_tasks(job)
+
+        assert mock_get_queue.return_value.enqueue.call_count == 1
+        assert redis_conn.set.call_args.kwargs["nx"] is True
+
+    @patch("app.tasks.get_job_queue")
+    def test_enqueue_schedule_failure_clears_dedupe_key(self, mock_get_queue, redis_conn):
+        """测试调度请求入队失败时清除去重标记，后续请求可以重新入队"""
+        job = Job(id=1, source="api")
+        redis_conn.set.return_value = True
+        mock_get_queue.return_value.enqueue.side_effect = ConnectionError("Redis不可用")
+
+        with pytest.raises(ConnectionError):
+            tasks.enqueue_schedule_job_tasks(job)
+
+        redis_conn.delete.assert_called_once_with(tasks.get_schedule_request_key(job.id))
+
+@pytest.mark.unit
+class TestFairShare:
+    """跨用户公平调度测试"""
+
+    @patch("app.tasks.get_job_queue")
+    def test_role_caps_owner_concurrency(self, mock_get_queue, session_factory):
+        """测试普通用户的并发受角色上限限制，与Job并行度无关"""
+        job_id = _create_review_job(session_factory, article_count=5, parallelism=10)
+
+        tasks.schedule_job_tasks(job_id)
+
+        # 默认配置中普通用户最多同时执行2个任务
+        assert mock_get_queue.return_value.enqueue.call_count == 2
+
+    @patch("app.tasks.get_job_queue")
+    @patch("app.tasks.get_scheduler_config")
+    def test_global_slots_shared_by_role_weight(self, mock_scheduler_config, mock_get_queue, session_factory):
+        """测试全局槽位不足时按角色权重分配，先提交的大批量任务不会独占"""
+        mock_scheduler_config.return_value = {"max_in_flight_tasks": 3}
+        bulk_job = _create_review_job(session_factory, "bulk_user", UserRole.NORMAL, article_count=10, parallelism=10)
+        vip_job = _create_review_job(session_factory, "vip_user", UserRole.VIP, article_count=10, parallelism=10)
+
+        tasks.schedule_job_tasks(bulk_job)
+
+        dispatched_ids = [c.kwargs["args"][0] for c in mock_get_queue.return_value.enqueue.call_args_list]
+        session = session_factory()
+        job_ids = [session.query(JobTask).filter(JobTask.id == i).first().job_id for i in dispatched_ids]
+        session.close()
+        # VIP权重为2，普通用户为1
+        assert job_ids.count(vip_job) == 2
+        assert job_ids.count(bulk_job) == 1
+
+    @patch("app.tasks.get_job_queue")
+    def test_finished_job_releases_slots_to_other_owners(self, mock_get_queue, session_factory):
+        """测试一个Job结束后，其释放的槽位立即分发给其他用户的Job"""
+        finished_job = _create_review_job(session_factory, "first", article_count=1)
+        waiting_job = _create_review_job(session_factory, "second", article_count=1)
+        session = session_factory()
+        session.query(JobTask).filter(JobTask.job_id == finished_job).update({"status": JobStatus.COMPLETED})
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(finished_job)
+
+        dispatched_id = mock_get_queue.return_value.enqueue.call_args.kwargs["args"][0]
+        assert dispatched_id in [t.id for t in _tasks_of(session_factory, waiting_job)]
+
+    @patch("app.tasks.get_job_queue")
+    def test_ownerless_job_releases_owner_slot(self, mock_get_queue, session_factory, slot_pools):
+        """测试项目没有所有者时，分发和释放使用同一个所有者槽位池"""
+        job_id = _create_review_job(session_factory, article_count=1)
+        session = session_factory()
+        project_id = session.query(Job).filter(Job.id == job_id).first().project_id
+        session.query(Project).filter(Project.id == project_id).update({"owner_id": None})
+        session.commit()
+        session.close()
+
+        tasks.schedule_job_tasks(job_id)
+
+        task_id, token = mock_get_queue.return_value.enqueue.call_args.kwargs["args"]
+        assert slot_pools["owner:None"].in_use() == 1
+        tasks.release_task_slots(token, job_id, None)
+        assert slot_pools["owner:None"].in_use() == 0
+        assert slot_pools["global"].in_use() == 0
+
+    @patch("app.tasks.get_job_queue")
+    @patch("app.tasks.get_scheduler_config")
+    def test_dispatch_skips_scan_when_global_slots_full(self, mock_scheduler_config, mock_get_queue, session_factory, circuit_breaker):
+        """测试全局槽位已满时不扫描待执行任务"""
+        mock_scheduler_config.return_value = {"max_in_flight_tasks": 1}
+        _create_review_job(session_factory, article_count=3, parallelism=3)
+        tasks.get_global_slot_pool().acquire("other-worker-task")
+
+        session = session_factory()
+        assert tasks.dispatch_runnable_tasks(session) == []
+        session.close()
+
+        assert not circuit_breaker.held_task_ids.called
+        assert not mock_get_queue.return_value.enqueue.called
+
+@pytest.mark.unit
+class TestUploadIngestion:
+    """上传文件批量入库测试"""
+
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    @patch("app.tasks.get_task_config")
+    def test_zip_upload_creates_single_batch_review_job(self, mock_task_config, mock_schedule, session_factory, tmp_path, monkeypatch):
+        """测试ZIP中的文件按批写入，并共用一个自动批阅Job"""
+        monkeypatch.chdir(tmp_path)
+        mock_task_config.return_value = {"batch_size": 2, "review_parallelism": 4}
+        zip_path = tmp_path / "papers.zip"
+        with zipfile.ZipFile(zip_path, "w") as zf:
+            for i in range(5):
+                zf.writestr(f"paper{i}.txt", f"内容{i}")
+            zf.writestr("ignored.exe", "x")
+
+        session = session_factory()
+        user = User(username="uploader", hashed_password="x", role=UserRole.NORMAL)
+        session.add(user)
+        session.commit()
+        article_type = ArticleType(name="论文", is_public=True, config={}, owner_id=user.id)
+        session.add(article_type)
+        session.commit()
+        project = Project(name="项目", config={}, owner_id=user.id, article_type_id=article_type.id, auto_approve=True)
+        session.add(project)
+        session.commit()
+        upload_job = Job(project_id=project.id, name="Upload papers.zip", status=JobStatus.PROCESSING)
+        session.add(upload_job)
+        session.commit()
+        upload_task = JobTask(job_id=upload_job.id, task_type=JobTaskType.PROCESS_UPLOAD, status=JobStatus.PENDING)
+        session.add(upload_task)
+        session.commit()
+        upload_task_id, project_id, upload_job_id = upload_task.id, project.id, upload_job.id
+        session.close()
+
+        tasks.process_upload_task(upload_task_id, str(zip_path), project_id)
+
+        session = session_factory()
+        assert session.query(JobTask).filter(JobTask.id == upload_task_id).first().status == JobStatus.COMPLETED
+        assert session.query(Article).filter(Article.project_id == project_id).count() == 5
+        review_jobs = session.query(Job).filter(Job.id != upload_job_id).all()
+        assert len(review_jobs) == 1
+        assert review_jobs[0].parallelism == 4
+        review_tasks = session.query(JobTask).filter(JobTask.job_id == review_jobs[0].id).all()
+        assert len(review_tasks) == 15
+        assert sum(1 for t in review_tasks if t.depends_on_id is None) == 5
+        session.close()
+        # 第一批写入后和最后一批写入后各调度一次
+        assert mock_schedule.call_count == 2
+
+@pytest.mark.unit
+class TestTaskLeases:
+    """任务租约与回收测试"""
+
+    def _expire(self, session_factory, job_id, task_type, attempts=1):
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == job_id,
+            JobTask.task_type == task_type
+        ).order_by(JobTask.id).first()
+        task.status = JobStatus.PROCESSING
+        task.claim_token = "dead-worker"
+        task.attempts = attempts
+        task.lease_expires_at = datetime.utcnow() - timedelta(seconds=5)
+        session.commit()
+        task_id = task.id
+        session.close()
+        return task_id
+
+    def _get(self, session_factory, task_id):
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        session.close()
+        return task
+
+    @patch("app.tasks.metrics")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    def test_reaper_requeues_orphaned_task(self, mock_schedule, mock_metrics, session_factory, review_job, slot_pools):
+        """测试worker失联后任务按策略重新排队并释放槽位"""
+        task_id = self._expire(session_factory, review_job, JobTaskType.CONVERT_TO_MARKDOWN)
+        tasks.get_job_slot_pool(review_job, 1).acquire("dead-worker")
+
+        assert tasks.reap_expired_task_leases() == 1
+
+        task = self._get(session_factory, task_id)
+        assert task.status == JobStatus.PENDING
+        assert task.claim_token is None
+        assert "【回收】" in task.logs
+        assert slot_pools[f"job:{review_job}"].in_use() == 0
+        mock_metrics.incr.assert_any_call("reaper.requeued")
+        mock_metrics.incr.assert_any_call("reaper.requeued:convert_to_markdown")
+        assert mock_schedule.call_count == 1
+
+    @patch("app.tasks.metrics")
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    def test_reaper_fails_after_max_attempts(self, mock_schedule, mock_metrics, session_factory, review_job):
+        """测试达到最大执行次数后任务标记为失败"""
+        task_id = self._expire(session_factory, review_job, JobTaskType.PROCESS_WITH_LLM, attempts=2)
+
+        tasks.reap_expired_task_leases()
+
+        assert self._get(session_factory, task_id).status == JobStatus.FAILED
+        mock_metrics.incr.assert_any_call("reaper.failed:process_with_llm")
+
+    @patch("app.tasks.enqueue_schedule_job_tasks")
+    def test_reaper_ignores_live_lease(self, mock_schedule, session_factory, review_job):
+        """测试租约未过期的任务不会被回收"""
+        task_id = self._expire(session_factory, review_job, JobTaskType.CONVERT_TO_MARKDOWN)
+        session = session_factory()
+        session.query(JobTask).filter(JobTask.id == task_id).update({
+            "lease_expires_at": datetime.utcnow() + timedelta(seconds=60)
+        })
+        session.commit()
+        session.close()
+
+        assert tasks.reap_expired_task_leases() == 0
+        assert self._get(session_factory, task_id).status == JobStatus.PROCESSING
+
+    def test_renew_task_lease(self, session_factory, review_job):
+        """测试只有持有当前分发令牌的worker能够续约"""
+        task_id = self._expire(session_factory, review_job, JobTaskType.CONVERT_TO_MARKDOWN)
+
+        assert not tasks.renew_task_lease(task_id, "other-token", review_job, None, 120)
+        assert tasks.renew_task_lease(task_id, "dead-worker", review_job, None, 120)
+        assert self._get(session_factory, task_id).lease_expires_at > datetime.utcnow()
+
+@pytest.mark.unit
+class TestResponseCache:
+    """模型响应缓存接入测试"""
+
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    def test_review_uses_cached_response(self, mock_cache, mock_client, session_factory, review_job):
+        """测试命中缓存时不调用模型并在日志中记录"""
+        mock_cache.get.return_value = "缓存的审阅结果"
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        assert not mock_client.completion.called
+        assert not mock_cache.put.called
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert "【缓存】" in task.logs
+        assert report.source_data == "缓存的审阅结果"
+        session.close()
+
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_review_cache_key_includes_review_settings(self, mock_task_config, mock_cache, mock_client, session_factory, review_job):
+        """测试审阅模式、分段配置或融合模式不同时使用不同的缓存键"""
+        mock_cache.get.return_value = "缓存的审阅结果"
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        base_config = {"model": "deepseek/deepseek-chat", "review_mode": "single", "chunk_max_tokens": 6000}
+        configs = [
+            base_config,
+            dict(base_config),
+            {**base_config, "review_mode": "chunked"},
+            {**base_config, "chunk_max_tokens": 3000},
+            {**base_config, "map_prompt": "逐段记录问题"},
+        ]
+        for config in configs:
+            mock_task_config.return_value = config
+            tasks.process_with_llm_task(task_id, article_id)
+
+        keys = [call.args[0] for call in mock_cache.get.call_args_list]
+        assert len(keys) == len(configs)
+        assert keys[0] == keys[1]
+        assert len(set(keys)) == len(configs) - 1
+        assert not mock_client.completion.called
+
+def _stream_chunk(content):
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = content
+    return chunk
+
+@pytest.mark.unit
+class TestStreamPersistence:
+    """流式输出写入测试"""
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_review_stream_is_coalesced(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试流式输出合并写入，重新审阅时不保留旧内容"""
+        mock_task_config.return_value = {"stream_flush_interval_ms": 60000, "stream_flush_bytes": 12}
+        mock_cache.get.return_value = None
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_client.completion.return_value = iter([_stream_chunk(c) for c in ["审", "阅", "", "结", "果", "完成"]])
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文", source_data="旧内容"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert report.source_data == "审阅结果完成"
+        # 每个汉字3字节，前四个块合并为一次写入，剩余内容在结束时写入
+        assert task.logs.count("【更新】") == 2
+        assert "【更新】收到内容: 4字符" in task.logs
+        assert "【信息】模型配额排队等待 0.00 秒" in task.logs
+        # 记录本次调用的用量
+        assert task.prompt_tokens > 0 and task.completion_tokens > 0
+        assert report.prompt_tokens == task.prompt_tokens
+        assert task.llm_latency_ms is not None
+        session.close()
+
+@pytest.mark.unit
+class TestChunkedReview:
+    """长文档分段审阅接入测试"""
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_long_document_map_reduce(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试长文档分段并发审阅后汇总生成报告"""
+        mock_task_config.return_value = {"prompt": "评分标准", "review_mode": "auto", "chunk_max_tokens": 12, "map_fan_out": 2}
+        mock_cache.get.return_value = None
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+
+        def completion(**kwargs):
+            if kwargs.get("stream"):
+                return iter([_stream_chunk("汇总报告")])
+            response = MagicMock()
+            response.choices[0].message.content = "笔记:" + kwargs["messages"][1]["content"].split("\n")[0]
+            return response
+        mock_client.completion.side_effect = completion
+
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        text = "# 第一章\n" + "甲" * 15 + "\n# 第二章\n" + "乙" * 15 + "\n"
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text=text))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        reduce_call = [c for c in mock_client.completion.call_args_list if c.kwargs.get("stream")]
+        assert len(reduce_call) == 1
+        reduce_messages = reduce_call[0].kwargs["messages"]
+        assert reduce_messages[0]["content"] == "评分标准"
+        assert reduce_messages[1]["content"].index("笔记:# 第一章") < reduce_messages[1]["content"].index("笔记:# 第二章")
+        assert mock_client.completion.call_count == 3
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert "分为 2 部分" in task.logs
+        assert report.source_data == "汇总报告"
+        session.close()
+
+@pytest.mark.unit
+class TestModelFallback:
+    """模型回退链接入测试"""
+
+    def test_model_chain(self):
+        """测试回退链以选定模型开头并去重"""
+        chain = tasks.get_model_chain_for_task("process_with_llm", "deepseek/deepseek-chat", {"fallback_models": ["deepseek/deepseek-chat", "deepseek/deepseek-reason", "unknown/model"]})
+        assert chain == ["deepseek/deepseek-chat", "deepseek/deepseek-reason"]
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    def test_extraction_does_not_hedge(self, mock_client, mock_governor, session_factory, review_job):
+        """测试非流式的结构化提取即使配置了对冲阈值也只在出错时回退，慢响应不会引发对冲请求"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+
+        def completion(**kwargs):
+            time.sleep(0.1)
+            response = MagicMock()
+            response.choices[0].message.content = f"```yaml\nmodel: {kwargs['model']}\n```"
+            return response
+        mock_client.completion.side_effect = completion
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.job_id == review_job).first()
+        task.logs = ""
+        content, won_model = tasks.call_extraction_model(
+            session, task, "deepseek/deepseek-reason", [{"role": "user", "content": "报告"}], 10, 100,
+            {"hedge_after_seconds": 0.01, "fallback_models": ["openrouter/qwen/qwq-32b:free"]},
+            tasks.LLMUsage()
+        )
+        session.close()
+
+        assert won_model == "deepseek/deepseek-reason"
+        assert mock_client.completion.call_count == 1
+        assert "对冲" not in task.logs
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_reasoning_stream_does_not_hedge(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试推理模型先输出reasoning_content时视为已产出首个token，正文较晚到达也不发起对冲请求"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_task_config.return_value = {
+            "model": "openrouter/qwen/qwq-32b:free",
+            "fallback_models": ["deepseek/deepseek-chat"],
+            "hedge_after_seconds": 0.05
+        }
+        mock_cache.get.return_value = None
+
+        def reasoning_stream():
+            chunk = _stream_chunk(None)
+            chunk.choices[0].delta.reasoning_content = "思考中"
+            yield chunk
+            time.sleep(0.3)
+            yield _stream_chunk("审阅结果")
+        mock_client.completion.side_effect = lambda **kwargs: reasoning_stream()
+
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert mock_client.completion.call_count == 1
+        assert "对冲" not in task.logs
+        assert report.source_data == "审阅结果"
+        session.close()
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_review_falls_back_on_error(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试主模型出错时由回退模型完成审阅，且不写入主模型的缓存"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_task_config.return_value = {"model": "deepseek/deepseek-chat", "fallback_models": ["deepseek/deepseek-reason"]}
+        mock_cache.get.return_value = None
+
+        def completion(**kwargs):
+            if kwargs["model"] == "deepseek/deepseek-chat":
+                raise RuntimeError("服务不可用")
+            return iter([_stream_chunk("回退结果")])
+        mock_client.completion.side_effect = completion
+
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert "【模型】回退请求: deepseek/deepseek-reason" in task.logs
+        assert "由 deepseek/deepseek-reason 生成" in task.logs
+        assert report.source_data == "回退结果"
+        assert not mock_cache.put.called
+        session.close()
+
+@pytest.mark.unit
+class TestBatchExtraction:
+    """批量结构化提取任务测试"""
+
+    def _create_batch_task(self, session_factory, review_job):
+        session = session_factory()
+        article_ids = [t.article_id for t in session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.article_id).all()]
+        for i, article_id in enumerate(article_ids):
+            session.add(AIReviewReport(article_id=article_id, job_id=review_job, source_data=f"报告{i}"))
+        task = JobTask(job_id=review_job, task_type=JobTaskType.EXTRACT_STRUCTURED_DATA, status=JobStatus.CLAIMED, params={"article_ids": article_ids})
+        session.add(task)
+        session.commit()
+        task_id = task.id
+        session.close()
+        return task_id, article_ids
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_batch_with_missing_item_fallback(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试批量结果中缺少的文章逐篇重新提取"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_task_config.return_value = {"fallback_models": []}
+        mock_cache.get.return_value = None
+        task_id, (first, second) = self._create_batch_task(session_factory, review_job)
+
+        def completion(**kwargs):
+            response = MagicMock()
+            if "<<<报告" in kwargs["messages"][1]["content"]:
+                response.choices[0].message.content = f"<<<结果 {first}>>>\n```yaml\nfinal_score: 90\ngrade: 优秀\n```\n"
+            else:
+                response.choices[0].message.content = "```yaml\nfinal_score: 70\ngrade: 及格\n```"
+            return response
+        mock_client.completion.side_effect = completion
+
+        tasks.batch_extract_structured_data_task(task_id, [first, second])
+
+        assert mock_client.completion.call_count == 2
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        reports = {r.article_id: r for r in session.query(AIReviewReport).all()}
+        assert task.status == JobStatus.COMPLETED
+        assert "合并为一次请求" in task.logs
+        assert "缺少 1 篇文章" in task.logs
+        assert reports[first].structured_data == {"final_score": 90, "grade": "优秀"}
+        assert reports[second].structured_data == {"final_score": 70, "grade": "及格"}
+        session.close()
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_failed_batch_falls_back_to_single_calls(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试批量请求失败时逐篇提取"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_task_config.return_value = {"fallback_models": []}
+        mock_cache.get.return_value = None
+        task_id, article_ids = self._create_batch_task(session_factory, review_job)
+
+        def completion(**kwargs):
+            if "<<<报告" in kwargs["messages"][1]["content"]:
+                raise RuntimeError("批量请求超时")
+            response = MagicMock()
+            response.choices[0].message.content = "final_score: 80"
+            return response
+        mock_client.completion.side_effect = completion
+
+        tasks.batch_extract_structured_data_task(task_id, article_ids)
+
+        assert mock_client.completion.call_count == 3
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert "批量提取失败" in task.logs
+        assert all(r.structured_data == {"final_score": 80} for r in session.query(AIReviewReport).all())
+        session.close()
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    @patch("app.tasks.get_task_config")
+    def test_unparsable_items_retried_and_failures_reported(self, mock_task_config, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试批量结果中无法解析的文章逐篇重试，仍失败的文章列入日志并使任务失败"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_task_config.return_value = {"fallback_models": []}
+        mock_cache.get.return_value = None
+        task_id, (first, second) = self._create_batch_task(session_factory, review_job)
+
+        def completion(**kwargs):
+            response = MagicMock()
+            content = kwargs["messages"][1]["content"]
+            if "<<<报告" in content:
+                response.choices[0].message.content = (
+                    f"<<<结果 {first}>>>\n```yaml\nfinal_score: 90\n```\n"
+                    f"<<<结果 {second}>>>\n```yaml\nfinal_score: [90\n```\n"
+                )
+            else:
+                raise RuntimeError("服务不可用")
+            return response
+        mock_client.completion.side_effect = completion
+
+        with pytest.raises(Exception):
+            tasks.batch_extract_structured_data_task(task_id, [first, second])
+
+        # 无法解析的文章单独重试一次
+        assert mock_client.completion.call_count == 2
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        reports = {r.article_id: r for r in session.query(AIReviewReport).all()}
+        assert task.status == JobStatus.FAILED
+        assert "YAML无法解析" in task.logs
+        assert f"文章ID: {second}" in task.logs
+        assert "其余 1 篇已保存" in task.logs
+        assert reports[first].structured_data == {"final_score": 90}
+        assert reports[second].structured_data is None
+        session.close()
+
+    @patch("app.tasks.batch_extract_structured_data_task")
+    @patch("app.tasks.schedule_job_tasks")
+    def test_execute_task_dispatches_batch(self, mock_schedule, mock_batch, session_factory, review_job):
+        """测试带有文章列表参数的提取任务按批量方式执行"""
+        task_id, article_ids = self._create_batch_task(session_factory, review_job)
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        task.claim_token = "token"
+        session.commit()
+        session.close()
+
+        tasks.execute_task(task_id, "token")
+
+        mock_batch.assert_called_once_with(task_id, article_ids)
+
+@pytest.mark.unit
+class TestRuleExtraction:
+    """规则提取接入测试"""
+
+    def _create_extract_task(self, session_factory, review_job, source_data):
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.EXTRACT_STRUCTURED_DATA
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, source_data=source_data))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+        return task_id, article_id
+
+    @patch("app.tasks.llm_client")
+    def test_rules_skip_model(self, mock_client, session_factory, review_job):
+        """测试规则提取到全部字段时不调用模型"""
+        task_id, article_id = self._create_extract_task(session_factory, review_job, "5. 评价等级：优秀\n6. 最终评分：92")
+
+        tasks.extract_structured_data_task(task_id, article_id)
+
+        assert not mock_client.completion.called
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert task.status == JobStatus.COMPLETED
+        assert "【规则】" in task.logs
+        assert report.structured_data == {"final_score": 92, "grade": "优秀"}
+        session.close()
+
+    @patch("app.tasks.llm_governor")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.llm_cache")
+    def test_model_fills_missing_fields(self, mock_cache, mock_client, mock_governor, session_factory, review_job):
+        """测试规则无法确定的字段由模型提取，规则字段优先"""
+        mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+        mock_cache.get.return_value = None
+        mock_client.completion.return_value.choices[0].message.content = "```yaml\nfinal_score: 60\ngrade: 及格\n```"
+        task_id, article_id = self._create_extract_task(session_factory, review_job, "5. 评价等级：良好\n6. 总体尚可")
+
+        tasks.extract_structured_data_task(task_id, article_id)
+
+        assert mock_client.completion.called
+        session = session_factory()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        assert report.structured_data == {"final_score": 60, "grade": "良好"}
+        session.close()
+
+@pytest.mark.unit
+class TestFusedReview:
+    """审阅与结构化提取融合模式接入测试"""
+
+    def _run_review(self, session_factory, review_job, output, **config):
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        with patch("app.tasks.llm_governor") as mock_governor, \
+             patch("app.tasks.llm_cache") as mock_cache, \
+             patch("app.tasks.llm_client") as mock_client, \
+             patch("app.tasks.get_task_config", return_value=dict({"prompt": "评分标准", "fused_extraction": True, "fallback_models": []}, **config)):
+            mock_governor.acquire.return_value.__enter__.return_value.wait_seconds = 0.0
+            mock_cache.get.return_value = None
+            mock_client.completion.return_value = iter([_stream_chunk(output)])
+            tasks.process_with_llm_task(task_id, article_id)
+            assert "===结构化数据===" in mock_client.completion.call_args.kwargs["messages"][0]["content"]
+
+        session = session_factory()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == article_id).first()
+        extract_task = session.query(JobTask).filter(JobTask.depends_on_id == task_id).first()
+        result = (report.source_data, report.structured_data, extract_task.status, extract_task.logs)
+        session.close()
+        return result
+
+    def test_trailer_fills_structured_data(self, session_factory, review_job):
+        """测试解析报告末尾的结构化数据并跳过提取任务"""
+        source_data, structured_data, extract_status, extract_logs = self._run_review(
+            session_factory, review_job, "审阅报告正文\n===结构化数据===\n```yaml\nfinal_score: 88\ngrade: 良好\n```"
+        )
+        assert source_data == "审阅报告正文"
+        assert structured_data == {"final_score": 88, "grade": "良好"}
+        assert extract_status == JobStatus.COMPLETED
+        assert "【融合】" in extract_logs
+
+    def test_rule_fields_take_precedence_over_trailer(self, session_factory, review_job):
+        """测试启用规则提取时规则确定的字段优先于融合输出"""
+        output = "审阅报告正文\n5. 评价等级：良好\n===结构化数据===\n```yaml\nfinal_score: 88\ngrade: 优秀\n```"
+        _, structured_data, _, _ = self._run_review(session_factory, review_job, output)
+        assert structured_data == {"final_score": 88, "grade": "良好"}
+
+    def test_trailer_used_as_is_when_rules_disabled(self, session_factory, review_job):
+        """测试关闭规则提取时完全采用融合输出"""
+        output = "审阅报告正文\n5. 评价等级：良好\n===结构化数据===\n```yaml\nfinal_score: 88\ngrade: 优秀\n```"
+        _, structured_data, _, _ = self._run_review(session_factory, review_job, output, rule_extraction_enabled=False)
+        assert structured_data == {"final_score": 88, "grade": "优秀"}
+
+    def test_invalid_trailer_keeps_extract_task(self, session_factory, review_job):
+        """测试结构化数据解析失败时保留提取任务"""
+        source_data, structured_data, extract_status, _ = self._run_review(
+            session_factory, review_job, "审阅报告正文\n===结构化数据===\n: : 不是YAML ["
+        )
+        assert source_data == "审阅报告正文"
+        assert structured_data is None
+        assert extract_status == JobStatus.PENDING
+
+@pytest.mark.unit
+class TestCircuitBreakerHold:
+    """熔断暂缓分发测试"""
+
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.get_task_config")
+    def test_review_held_when_chain_open(self, mock_task_config, mock_client, session_factory, review_job, circuit_breaker):
+        """测试回退链全部熔断时任务放回待执行而不调用模型"""
+        mock_task_config.return_value = {"model": "deepseek/deepseek-chat", "fallback_models": ["deepseek/deepseek-reason"]}
+        circuit_breaker.retry_after.return_value = 30.0
+
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        task.status = JobStatus.PROCESSING
+        task.claim_token = "token"
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id, article_id = task.id, task.article_id
+        session.close()
+
+        tasks.process_with_llm_task(task_id, article_id)
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        assert task.status == JobStatus.PENDING
+        assert task.claim_token is None
+        assert "【熔断】" in task.logs
+        circuit_breaker.retry_after.assert_called_once_with(["deepseek/deepseek-chat", "deepseek/deepseek-reason"])
+        circuit_breaker.hold_task.assert_called_once_with(task_id, 30.0)
+        assert not mock_client.completion.called
+        session.close()
+
+    @patch("app.tasks.schedule_job_tasks")
+    @patch("app.tasks.llm_client")
+    @patch("app.tasks.get_task_config")
+    def test_hold_does_not_consume_attempts(self, mock_task_config, mock_client, mock_schedule, session_factory, review_job, circuit_breaker):
+        """测试因熔断暂缓的执行不计入任务的执行次数"""
+        mock_task_config.return_value = {"model": "deepseek/deepseek-chat", "fallback_models": []}
+        circuit_breaker.retry_after.return_value = 30.0
+
+        session = session_factory()
+        task = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.PROCESS_WITH_LLM
+        ).order_by(JobTask.id).first()
+        task.attempts = 1
+        session.add(AIReviewReport(article_id=task.article_id, job_id=review_job, processed_attachment_text="正文"))
+        session.commit()
+        task_id = task.id
+        session.close()
+
+        for i in range(3):
+            session = session_factory()
+            session.query(JobTask).filter(JobTask.id == task_id).update({"status": JobStatus.CLAIMED, "claim_token": f"token-{i}"})
+            session.commit()
+            session.close()
+            tasks.execute_task(task_id, f"token-{i}")
+
+        session = session_factory()
+        task = session.query(JobTask).filter(JobTask.id == task_id).first()
+        assert task.status == JobStatus.PENDING
+        assert task.attempts == 1
+        assert task.logs.count("【熔断】") == 1
+        assert not mock_client.completion.called
+        session.close()
+
+    @patch("app.tasks.get_job_queue")
+    def test_dispatch_skips_held_tasks(self, mock_get_queue, session_factory, review_job, circuit_breaker):
+        """测试暂缓期内的任务不被分发，到期后重新调度所在Job"""
+        first = next(t for t in _tasks_of(session_factory, review_job) if t.task_type == JobTaskType.CONVERT_TO_MARKDOWN)
+        circuit_breaker.held_task_ids.return_value = {first.id}
+
+        session = session_factory()
+        dispatched = tasks.dispatch_runnable_tasks(session)
+        session.close()
+        assert first.id not in [t.id for t in dispatched]
+        assert dispatched
+
+        circuit_breaker.pop_due_tasks.return_value = [first.id]
+        with patch("app.tasks.enqueue_schedule_job_tasks") as mock_enqueue:
+            assert tasks.release_held_tasks() == 1
+        assert mock_enqueue.call_args[0][0].id == review_job
+
+@pytest.mark.unit
+class TestConversionCache:
+    """文档转换缓存接入测试"""
+
+    @patch("app.tasks.convert_file_to_markdown", return_value="# 转换结果")
+    @patch("app.tasks.get_task_config", return_value={"conversion_type": "simple"})
+    def test_second_job_reuses_conversion(self, mock_task_config, mock_convert, session_factory, review_job, tmp_path):
+        """测试同一文件的第二次转换命中缓存，不再调用转换函数"""
+        attachment = tmp_path / "thesis.txt"
+        attachment.write_text("正文", encoding="utf-8")
+        session = session_factory()
+        convert_tasks = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.CONVERT_TO_MARKDOWN
+        ).order_by(JobTask.id).all()
+        for task in convert_tasks:
+            task.article.attachments = [{"path": str(attachment), "is_active": True}]
+        session.commit()
+        targets = [(task.id, task.article_id) for task in convert_tasks]
+        session.close()
+
+        for task_id, article_id in targets:
+            tasks.convert_to_markdown_task(task_id, article_id)
+
+        assert mock_convert.call_count == 1
+        session = session_factory()
+        second = session.query(JobTask).filter(JobTask.id == targets[1][0]).first()
+        report = session.query(AIReviewReport).filter(AIReviewReport.article_id == targets[1][1]).first()
+        assert second.status == JobStatus.COMPLETED
+        assert "【缓存】命中文档转换缓存" in second.logs
+        assert report.processed_attachment_text == "# 转换结果"
+        session.close()
+
+    @patch("app.tasks.get_task_config", return_value={"conversion_type": "hybrid"})
+    def test_ocr_failure_is_not_cached(self, mock_task_config, session_factory, review_job, tmp_path):
+        """测试混合转换中扫描页OCR失败时记录警告且不缓存结果"""
+        attachment = tmp_path / "thesis.pdf"
+        attachment.write_bytes(b"%PDF-1.4 scanned")
+        session = session_factory()
+        convert_tasks = session.query(JobTask).filter(
+            JobTask.job_id == review_job,
+            JobTask.task_type == JobTaskType.CONVERT_TO_MARKDOWN
+        ).order_by(JobTask.id).all()
+        for task in convert_tasks:
+            task.article.attachments = [{"path": str(attachment), "is_active": True}]
+        session.commit()
+        targets = [(task.id, task.article_id) for task in convert_tasks]
+        session.close()
+
+        def fake_convert(file_path, conversion_type, config):
+            assert conversion_type == "hybrid"
+            config["logger"]("共 2 页，1 页使用文本层，1 页需要OCR")
+            config["ocr_error"] = "tesseract: 未安装"
+            return "第一页\n\n"
+
+        with patch("app.tasks.convert_file_to_markdown", side_effect=fake_convert) as mock_convert:
+            for task_id, article_id in targets:
+                tasks.convert_to_markdown_task(task_id, article_id)
+
+        assert mock_convert.call_count == 2
+        session = session_factory()
+        first = session.query(JobTask).filter(JobTask.id == targets[0][0]).first()
+        assert "【详细】共 2 页，1 页使用文本层，1 页需要OCR" in first.logs
+        assert "【警告】扫描页OCR失败" in first.logs
+        session.close()
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import MagicMock
+from app.token_usage import LLMUsage, TokenBudgetExceeded, apply_token_budget, count_message_tokens, TRUNCATION_NOTICE
+
+MODEL = "deepseek/deepseek-chat"
+
+def _messages(length):
+    return [
+        {"role": "system", "content": "请审阅以下论文"},
+        {"role": "user", "content": "论文内容" * length}
+    ]
+
+def _chunk(content, usage=None):
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = content
+    chunk.usage = usage
+    return chunk
+
+@pytest.mark.unit
+class TestTokenBudget:
+    """提示词预算测试"""
+
+    def test_within_budget(self):
+        """测试预算内的消息原样返回"""
+        messages = _messages(10)
+        result, tokens, truncated = apply_token_budget(MODEL, messages, {"max_prompt_tokens": 10000})
+        assert result is messages
+        assert tokens == count_message_tokens(MODEL, messages)
+        assert not truncated
+
+    def test_no_limit(self):
+        """测试预算为0时不限制"""
+        _, _, truncated = apply_token_budget(MODEL, _messages(5000), {"max_prompt_tokens": 0})
+        assert not truncated
+
+    def test_truncate(self):
+        """测试超出预算时截断用户消息，系统提示词保持不变"""
+        messages = _messages(5000)
+        result, tokens, truncated = apply_token_budget(MODEL, messages, {"max_prompt_tokens": 500})
+        assert truncated
+        assert tokens <= 500
+        assert result[0] == messages[0]
+        assert result[1]["content"].endswith(TRUNCATION_NOTICE)
+        assert messages[1]["content"] == "论文内容" * 5000
+
+    def test_refuse(self):
+        """测试策略为refuse时拒绝调用"""
+        with pytest.raises(TokenBudgetExceeded):
+            apply_token_budget(MODEL, _messages(5000), {"max_prompt_tokens": 500, "over_budget_policy": "refuse"})
+
+@pytest.mark.unit
+class TestLLMUsage:
+    """模型用量统计测试"""
+
+    def test_completion_uses_reported_usage(self):
+        """测试非流式调用优先使用模型返回的用量"""
+        client = MagicMock()
+        client.completion.return_value.usage.prompt_tokens = 120
+        client.completion.return_value.usage.completion_tokens = 30
+        usage = LLMUsage()
+        usage.completion(client, MODEL, _messages(10), 100, max_tokens=50)
+        assert (usage.prompt_tokens, usage.completion_tokens, usage.calls) == (120, 30, 1)
+        assert usage.time_to_first_token_ms is not None
+        assert usage.latency_ms is not None
+
+    def test_stream_counts_output(self):
+        """测试流式调用在没有用量信息时按输出内容计数"""
+        client = MagicMock()
+        client.completion.return_value = iter([_chunk("审阅"), _chunk(""), _chunk("结果")])
+        usage = LLMUsage()
+        chunks = list(usage.stream(client, MODEL, _messages(10), 100, max_tokens=50))
+        assert len(chunks) == 3
+        assert client.completion.call_args.kwargs["stream"] is True
+        assert usage.prompt_tokens == 100
+        assert usage.completion_tokens > 0
+        assert usage.calls == 1
+
+    def test_save_to(self):
+        """测试审阅任务覆盖报告用量，结构化提取累加token数"""
+        usage = LLMUsage()
+        usage.prompt_tokens, usage.completion_tokens = 100, 20
+        task, report = MagicMock(), MagicMock(prompt_tokens=500, completion_tokens=50, llm_latency_ms=8000)
+        usage.save_to(task, report, accumulate_report=True)
+        assert (report.prompt_tokens, report.completion_tokens, report.llm_latency_ms) == (600, 70, 8000)
+        usage.save_to(task, report)
+        assert (task.prompt_tokens, report.prompt_tokens, report.completion_tokens) == (100, 100, 20)
@@ -1,15 +1,34 @@
 import os
-from redis import Redis
-from rq import Worker, Queue
+import time
+import logging
+import threading
+from app.tasks import redis_conn, task_queues, MODEL_CONFIG, run_lease_reaper, release_held_tasks
+from app.queues import QUEUE_NAMES, get_queue_weights, WeightedWorker
 
 # 设置MacOS上的fork安全环境变量
 os.environ['OBJC_DISABLE_INITIALIZE_FORK_SAFETY'] = 'YES'
 
-listen = ['default']
+# 按优先级从高到低监听各队列，出队顺序按 [queues.weights] 加权轮转
+listen = QUEUE_NAMES
 
-redis_conn = Redis()
+def reaper_loop(interval_seconds):
+    """定期回收租约过期的任务，多个worker之间通过Redis锁保证每个周期只执行一次"""
+    while True:
+        try:
+            run_lease_reaper()
+        except Exception as e:
+            logging.error(f"租约回收失败: {str(e)}")
+        try:
+            # 熔断暂缓期已结束的任务重新调度
+            release_held_tasks()
+        except Exception as e:
+            logging.error(f"重新调度熔断暂缓的任务失败: {str(e)}")
+        time.sleep(interval_seconds)
 
 if __name__ == '__main__':
-    queues = [Queue(name, connection=redis_conn) for name in listen]
-    worker = Worker(queues, connection=redis_conn)
+    reaper_interval = MODEL_CONFIG.get("scheduler", {}).get("leases", {}).get("reaper_interval_seconds", 30)
+    threading.Thread(target=reaper_loop, args=(reaper_interval,), name="lease-reaper", daemon=True).start()
+
+    queues = [task_queues[name] for name in listen]
+    worker = WeightedWorker(queues, connection=redis_conn, weights=get_queue_weights(MODEL_CONFIG.get("queues", {})))
     worker.work()